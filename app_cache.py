@@ -0,0 +1,426 @@
+import functools
+import io
+import os
+import sqlite3
+import textwrap
+
+import numpy as np
+import streamlit as st
+
+from competitive_market import CompetitiveMarket
+from event_log import EventAnalytics
+from leaderboard import CACHE_TTL as LEADERBOARD_CACHE_TTL, get_leaderboard
+from market_model import (
+    DESIGN_COLUMNS, evaluate_scenarios, market_segments, profit_distribution, profit_surface, solve_optimal_designs, solve_price
+)
+
+# Cached data and resources for the Streamlit app.
+# The app script is re-executed on every rerun, and decorating a cached function there
+# re-reads its source each time, which costs more than most of these helpers save.
+# Defined in this imported module they are decorated once per process.
+# pandas and PIL are imported by the helpers that use them, not at start-up.
+
+# Live competitive market for one round of a class session, shared by every session in
+# this process that joins with the same class code. Submissions are also saved in the
+# leaderboard store, so a market evicted from this cache is rebuilt with all of them.
+@st.cache_resource(max_entries=1024)
+def class_market(code, round_number):
+    market = CompetitiveMarket()
+    try:
+        for player, design in get_leaderboard().class_submissions(code, round_number):
+            market.submit(player, *design)
+    except (OSError, sqlite3.Error):
+        pass
+    return market
+
+# Submit a student's design to a class market round and save it for rebuilds.
+# `design` is a DESIGN_COLUMNS tuple; returns the student's outcome in the market.
+def submit_class_design(code, round_number, player, design):
+    result = class_market(code, round_number).submit(player, *design)
+    try:
+        get_leaderboard().record_submission(code, round_number, player, design)
+    except (OSError, sqlite3.Error):
+        pass
+    return result
+
+# Optimal designs only change with the segment table, so solve once per checksum
+@st.cache_data
+def achievable_designs(checksum, k):
+    return solve_optimal_designs(k)
+
+# Leaderboard tables for the game-over screen, or (None, None) if the store is unavailable.
+# Shared by all sessions for a couple of seconds, like the leaderboard's own query cache.
+@st.cache_data(ttl=LEADERBOARD_CACHE_TTL)
+def leaderboard_tables(segment, n=10):
+    import pandas as pd
+
+    try:
+        leaderboard = get_leaderboard()
+        columns = {"player": "Student", "segment": "Market Segment", "profit": "Profit", "sales": "Sales"}
+        top_players = pd.DataFrame(leaderboard.top_players(n), columns=list(columns)).rename(columns=columns)
+        top_in_segment = pd.DataFrame(leaderboard.top_in_segment(segment, n), columns=list(columns)).rename(columns=columns)
+    except (OSError, sqlite3.Error):
+        return None, None
+    for table in (top_players, top_in_segment):
+        table["Profit"] = table["Profit"].map(lambda profit: f"${profit:,}")
+    return top_players, top_in_segment
+
+# Instructor analytics over the event log, shared by every session
+@st.cache_resource
+def event_analytics():
+    return EventAnalytics()
+
+# The shared analytics, after folding in only the log files written since the last refresh
+def refreshed_analytics():
+    analytics = event_analytics()
+    try:
+        analytics.refresh()
+    except OSError:
+        pass
+    return analytics
+
+# Instructor view tables for one class code ("" for students without one, None for
+# everyone): the EventAnalytics summary with its row lists as formatted frames
+def instructor_tables(class_code=None):
+    import pandas as pd
+
+    summary = refreshed_analytics().summary(class_code)
+    attempts = pd.DataFrame(summary["attempts"], columns=["Attempt", "Simulations", "Average Profit", "Profitable"])
+    attempts["Average Profit"] = attempts["Average Profit"].map(lambda profit: f"${profit:,.0f}")
+    attempts["Profitable"] = attempts["Profitable"].map(lambda share: f"{share:.0%}")
+    segments = pd.DataFrame(summary["segments"]).set_index("Segment") if summary["segments"] else pd.DataFrame()
+    segments = segments.reindex(columns=sorted(segments.columns)).fillna(0.0).map(lambda share: f"{share:.0%}")
+    improvement = pd.DataFrame(summary["improvement"], columns=["Students", "Improved", "Average Change", "Median Change"])
+    improvement["Improved"] = improvement["Improved"].map(lambda share: f"{share:.0%}")
+    for column in ("Average Change", "Median Change"):
+        improvement[column] = improvement[column].map(lambda profit: f"${profit:+,.0f}")
+    tariff_impact = pd.DataFrame(summary["tariff_impact"])
+    if len(tariff_impact):
+        tariff_impact = tariff_impact.set_index("Scenario")
+        tariff_impact["Average Change (%)"] = tariff_impact["Average Change (%)"].map(lambda change: f"{change:+.1f}%")
+    return summary["sessions"], summary["events"], attempts, segments, improvement, tariff_impact
+
+LOGO_WIDTH = 100
+
+# Static page assets, built and read from disk once per process instead of on every rerun.
+# The style block still has to be emitted on each rerun for Streamlit to keep it on the page.
+@st.cache_resource
+def static_assets():
+    from PIL import Image
+
+    css = """
+    <style>
+    /* Fix for black background on mobile */
+    body {
+        background-color: #ffffff !important;
+    }
+    .main .block-container {
+        background-color: #ffffff !important;
+    }
+    .stApp {
+        background-color: #ffffff !important;
+    }
+
+    /* Fix for text color visibility on mobile */
+    .stMarkdown, .stText, p, h1, h2, h3, h4, h5, h6, span, div, label {
+        color: #333333 !important;
+    }
+    /* Make sure sliders, inputs and other controls have visible text */
+    .stSlider label, .stNumberInput label, .stSelectbox label, .stButton label {
+        color: #333333 !important;
+    }
+    /* Make sure all input text is visible */
+    input, select, textarea {
+        color: #333333 !important;
+    }
+    /* Specifically fix the price input field */
+    .stNumberInput input, .stNumberInput .css-qrbaxs {
+        color: #333333 !important;
+        background-color: #ffffff !important;
+    }
+    /* Fix for any input field background colors */
+    .css-qrbaxs, .css-zt5igj, input[type="number"], .stNumberInput div[data-baseweb="input"] {
+        background-color: #ffffff !important;
+        color: #333333 !important;
+    }
+    /* Override Streamlit button colors */
+    .stButton button {
+        color: white !important;
+    }
+    /* Strong dark text for important elements */
+    strong, b {
+        color: #111111 !important;
+    }
+
+    .custom-container {
+        border: 2px solid #4CAF50;
+        padding: 15px;
+        border-radius: 10px;
+        background-color: #ffffff;
+        color: #000000;
+        margin-bottom: 20px;
+        max-width: 900px;
+        margin-left: auto;
+        margin-right: auto;
+    }
+    .custom-container-tariff {
+        border: 2px solid #FF5733;
+        padding: 15px;
+        border-radius: 10px;
+        background-color: #fff3e0;
+        color: #000000;
+        margin-bottom: 20px;
+        max-width: 900px;
+        margin-left: auto;
+        margin-right: auto;
+    }
+    .section-divider {
+        border-top: 1px solid #ccc;
+        margin-top: 10px;
+        padding-top: 10px;
+    }
+    .header-green {
+        color: #4CAF50;
+    }
+    .header-orange {
+        color: #FF5733;
+    }
+    .instructions-container {
+        border: 2px solid #3498db;
+        padding: 20px;
+        border-radius: 10px;
+        background-color: #e8f4f8;
+        color: #000000;
+        margin-bottom: 20px;
+        max-width: 800px;
+        margin-left: auto;
+        margin-right: auto;
+    }
+    .attempt-counter {
+        font-weight: bold;
+        color: #3498db;
+        font-size: 18px;
+        text-align: center;
+        margin: 10px 0;
+        padding: 10px;
+        background-color: #e8f4f8;
+        border-radius: 5px;
+        max-width: 900px;
+        margin-left: auto;
+        margin-right: auto;
+    }
+    .prev-attempt {
+        font-size: 14px;
+        padding: 10px;
+        background-color: #f0f0f0;
+        border-radius: 5px;
+        margin-bottom: 10px;
+    }
+    .prev-attempt summary {
+        cursor: pointer;
+        font-weight: bold;
+    }
+    .prev-attempt p {
+        margin: 6px 0 0 0;
+    }
+    .centered-header-container {
+        max-width: 900px;
+        margin-left: auto;
+        margin-right: auto;
+        display: flex;
+        align-items: center;
+        justify-content: center;
+    }
+    .centered-container {
+        max-width: 900px;
+        margin-left: auto;
+        margin-right: auto;
+    }
+    /* Significantly smaller start button on desktop with manual size control */
+    .small-button {
+        max-width: 120px !important;
+        margin: 0 auto !important;
+        display: block !important;
+    }
+    .small-button button {
+        width: 120px !important;
+        min-width: unset !important;
+        max-width: 120px !important;
+    }
+    /* Override Streamlit default button expansion */
+    div[data-testid="stButton"] {
+        width: auto !important;
+    }
+    /* Button colors */
+    .stButton button {
+        font-weight: bold;
+        color: white !important;
+    }
+    /* Primary buttons should always have white text */
+    button[kind="primary"], 
+    .stButton button[data-baseweb="button"][kind="primary"],
+    [data-testid="baseButton-primary"] {
+        color: white !important;
+    }
+    /* Red warning buttons */
+    button[kind="secondary"], 
+    .stButton button[data-baseweb="button"][kind="secondary"],
+    [data-testid="baseButton-secondary"] {
+        background-color: #FF5733 !important;
+        border-color: #FF5733 !important;
+        color: white !important;
+    }
+    .red-button button {
+        background-color: #FF5733 !important;
+        border-color: #FF5733 !important;
+        color: white !important;
+    }
+    /* Responsive design */
+    @media (max-width: 768px) {
+        .hide-on-mobile {
+            display: none !important;
+        }
+        .custom-container, .custom-container-tariff, .instructions-container {
+            padding: 10px;
+        }
+        .stButton button {
+            width: 100%;
+        }
+        .small-button {
+            max-width: 100%;
+        }
+    }
+    /* Improve settings and results layout */
+    .settings-panel {
+        background-color: #f9f9f9;
+        padding: 15px;
+        border-radius: 10px;
+        margin-bottom: 15px;
+    }
+    .results-panel {
+        margin-top: 20px;
+    }
+    .sidebar-placeholder {
+        display: none;
+    }
+    @media (min-width: 992px) {
+        .sidebar-placeholder {
+            display: block;
+            width: 100%;
+            height: 1px;
+        }
+        .results-container {
+            padding-left: 20px;
+        }
+    }
+    </style>
+    """
+    # The logo is shown at LOGO_WIDTH; scale it down here once, the same way st.image
+    # would, so Streamlit passes the bytes through instead of resizing them every rerun
+    try:
+        logo = Image.open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo.png"))
+        if logo.width > LOGO_WIDTH:
+            logo = logo.resize((LOGO_WIDTH, int(1.0 * logo.height * LOGO_WIDTH / logo.width)), resample=Image.BILINEAR)
+        buffer = io.BytesIO()
+        logo.save(buffer, format="PNG" if logo.mode in ("RGBA", "LA", "P") else "JPEG", quality=90)
+        logo = buffer.getvalue()
+    except OSError:
+        logo = None
+    return {"css": textwrap.dedent(css), "logo": logo}
+
+# Collapsible "Previous Attempts" card for one attempt record (a tuple from an AttemptLog's
+# records). A card never changes once its attempt is made, so its HTML is built once and
+# the design panel sends one markdown block per rerun instead of an expander per attempt.
+@functools.lru_cache(maxsize=4096)
+def attempt_card_html(number, record):
+    speed, aesthetics, reliability, efficiency, tech, _, segment, price, _, sales, _, _, profit = record
+    return (
+        f'<details class="prev-attempt"><summary>Attempt {number}: ${profit:,}</summary>'
+        f"<p><strong>Market:</strong> {market_segments.names[segment]}</p>"
+        f"<p><strong>Sales:</strong> {sales} units</p>"
+        f"<p><strong>Settings:</strong> Speed: {speed}, Aesthetics: {aesthetics}, Reliability: {reliability}, "
+        f"Efficiency: {efficiency}, Tech: {tech}, Price: ${price:,}</p></details>"
+    )
+
+# Break-even range and best price for a design's five features (a tuple). The answer only
+# depends on the features, so each combination is solved once per process.
+@functools.lru_cache(maxsize=4096)
+def price_solution(features):
+    return solve_price(*features)
+
+# Game-over comparison table, cached on the attempt records it summarizes
+# (an AttemptLog's records, numbered from first_number)
+@st.cache_data
+def attempts_summary_table(records, first_number, best_index):
+    import pandas as pd
+
+    summary_data = []
+    for i, record in enumerate(records.tolist()):
+        speed, aesthetics, reliability, efficiency, tech, _, segment, price, _, sales, _, _, profit = record
+        is_best = i == best_index
+        best_badge = "🏆 " if is_best else ""
+        summary_data.append({
+            "Attempt": f"{best_badge}Attempt {first_number + i}",
+            "Market Segment": market_segments.names[segment],
+            "Sales": sales,
+            "Profit": f"${profit:,}",
+            "Speed": speed,
+            "Aesthetics": aesthetics,
+            "Reliability": reliability,
+            "Efficiency": efficiency,
+            "Tech": tech,
+            "Price": f"${price:,}"
+        })
+    return pd.DataFrame(summary_data)
+
+# Scenario x attempt profit matrix for the game-over screen, plus the outcomes it was
+# built from. Designs are DESIGN_COLUMNS tuples; every attempt is evaluated against every
+# scenario in one pass, and pairs seen before come from the model's own memo.
+@st.cache_data
+def scenario_matrix(designs, scenarios, first_number=1):
+    import pandas as pd
+
+    outcomes = evaluate_scenarios(designs, scenarios)
+    matrix = pd.DataFrame(
+        [[f"${profit:,.0f}" for profit in row] for row in outcomes.profit],
+        index=pd.Index([scenario.name for scenario in scenarios], name="Scenario"),
+        columns=[f"Attempt {first_number + i}" for i in range(len(designs))]
+    )
+    matrix["Best Attempt"] = [f"Attempt {first_number + i}" for i in outcomes.profit.argmax(axis=1)]
+    return matrix, outcomes
+
+# Profit explorer sweep as a long-form frame (one row per feature level and price).
+# Keyed on the four features that stay fixed, so moving the swept feature or the price
+# to a neighbouring value reuses the cached sweep; it is shared by every session.
+@st.cache_data(max_entries=4096)
+def profit_sweep(feature, fixed):
+    import pandas as pd
+
+    design = list(fixed)
+    design.insert(DESIGN_COLUMNS.index(feature), 1)
+    surface = profit_surface(*design, feature)
+    return pd.DataFrame({
+        feature: surface.levels.repeat(len(surface.prices)),
+        "Price": np.tile(surface.prices, len(surface.levels)),
+        "Profit": surface.profit.reshape(-1),
+        "Sales": surface.sales.reshape(-1),
+        "Market Segment": surface.segments.repeat(len(surface.prices))
+    })
+
+# Editable production schedule for the multi-year panel: every year starts at `volume` cars
+@st.cache_data(max_entries=256)
+def production_schedule(years, volume):
+    import pandas as pd
+
+    return pd.DataFrame({"Year": np.arange(1, years + 1), "Production": np.full(years, volume, dtype=np.int64)})
+
+# Monte Carlo profit distribution of a design (a DESIGN_COLUMNS tuple): the summary and a
+# histogram of the draws, so only a few dozen bars are sent to the browser
+@st.cache_data(max_entries=1024)
+def profit_risk(design, bins=40):
+    import pandas as pd
+
+    distribution = profit_distribution(*design)
+    counts, edges = np.histogram(distribution.profit, bins=bins)
+    histogram = pd.DataFrame({"From": edges[:-1], "To": edges[1:], "Share": counts / distribution.draws})
+    return distribution._replace(profit=None), histogram
@@ -0,0 +1,136 @@
+import os
+import sys
+
+import numpy as np
+
+from market_model import DESIGN_COLUMNS, FEEDBACK_MESSAGES, get_feedback_tier, market_segments
+
+# Compact per-session attempt history.
+# Each attempt is one fixed-size 40-byte record in a NumPy structured array
+# instead of a design dict plus a result dict holding the feedback text; the feedback is
+# kept as its tier code and the segment as its index. Dicts in the old shape are built on
+# demand. A session keeps at most MAX_ATTEMPTS records, dropping the oldest first, so
+# practice or unlimited-attempt modes can't grow a session without bound. A value that
+# doesn't fit its field exactly (a fraction, or out of the field's range) is refused with
+# ValueError instead of being truncated or wrapped.
+MAX_ATTEMPTS = int(os.getenv("CAR_MARKET_MAX_ATTEMPTS", "100"))
+
+ATTEMPT_DTYPE = np.dtype([
+    ("speed", "u1"), ("aesthetics", "u1"), ("reliability", "u1"), ("efficiency", "u1"), ("tech", "u1"),
+    ("tier", "u1"), ("segment", "u2"), ("price", "u4"), ("cost", "u4"), ("sales", "u4"),
+    ("competitors", "i4"), ("share", "f8"), ("profit", "i8")
+])
+FEATURE_FIELDS = ATTEMPT_DTYPE.names[:5]
+
+# Segment name -> index into market_segments.names
+_segment_index = {name: index for index, name in reversed(list(enumerate(market_segments.names.tolist())))}
+
+class AttemptLog:
+    __slots__ = ("_records", "_size", "first_number", "max_attempts")
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS):
+        self.max_attempts = max(1, max_attempts)
+        self._records = np.zeros(min(4, self.max_attempts), dtype=ATTEMPT_DTYPE)
+        self._size = 0
+        # Attempt number of the oldest kept record (1-based); grows as records are evicted
+        self.first_number = 1
+
+    def __len__(self):
+        return self._size
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self._records.__sizeof__()
+
+    # Store an attempt from a design dict (DESIGN_COLUMNS) and a simulation result dict
+    def append(self, design, result):
+        values = {field: design[column] for field, column in zip(FEATURE_FIELDS, DESIGN_COLUMNS)}
+        values.update(
+            price=design["Price"], sales=result["Estimated Sales"], profit=result["Profit"], cost=result["Cost"],
+            competitors=result.get("Competitors", -1)
+        )
+        for field, value in values.items():
+            limits = np.iinfo(ATTEMPT_DTYPE[field])
+            # (NaN fails the range test)
+            if not limits.min <= value <= limits.max or value != int(value):
+                raise ValueError(f"Attempt {field} {value!r} doesn't fit the attempt log's {ATTEMPT_DTYPE[field]} field")
+        if self._size == self.max_attempts:
+            self._records[:-1] = self._records[1:]
+            self._size -= 1
+            self.first_number += 1
+        elif self._size == len(self._records):
+            extra = min(2 * len(self._records), self.max_attempts) - len(self._records)
+            self._records = np.concatenate([self._records, np.zeros(extra, dtype=ATTEMPT_DTYPE)])
+        record = self._records[self._size]
+        for field, value in values.items():
+            record[field] = value
+        record["segment"] = _segment_index[result["Best Market Segment"]]
+        record["tier"] = get_feedback_tier(result["Profit"], result["Estimated Sales"])
+        record["share"] = result.get("Market Share", 1.0)
+        self._size += 1
+
+    # Kept records, oldest first (a read-only view)
+    def records(self):
+        records = self._records[:self._size]
+        records.flags.writeable = False
+        return records
+
+    def _index(self, i):
+        if not -self._size <= i < self._size:
+            raise IndexError("attempt index out of range")
+        return i % self._size
+
+    def number(self, i):
+        return self.first_number + self._index(i)
+
+    def design(self, i):
+        record = self._records[self._index(i)]
+        design = {column: record[field].item() for field, column in zip(FEATURE_FIELDS, DESIGN_COLUMNS)}
+        design["Price"] = record["price"].item()
+        return design
+
+    # Same dict simulate_market_performance returns, plus the competitive fields if any
+    def result(self, i):
+        record = self._records[self._index(i)]
+        result = {
+            "Feedback": FEEDBACK_MESSAGES[record["tier"]],
+            "Best Market Segment": market_segments.names[record["segment"]],
+            "Estimated Sales": record["sales"].item(),
+            "Profit": record["profit"].item(),
+            "Cost": record["cost"].item()
+        }
+        if record["competitors"] >= 0:
+            result["Market Share"] = record["share"].item()
+            result["Competitors"] = record["competitors"].item()
+        return result
+
+    # Designs as DESIGN_COLUMNS tuples, oldest first
+    def design_tuples(self):
+        records = self._records[:self._size]
+        return tuple(zip(*(records[field].tolist() for field in FEATURE_FIELDS + ("price",))))
+
+    # Index of the most profitable kept attempt (the first one on ties)
+    def best_index(self):
+        return int(self._records["profit"][:self._size].argmax())
+
+# Approximate memory held by each session-state entry, in bytes, largest first.
+# Follows containers and AttemptLog records; other objects (futures, widgets) count their
+# own size only.
+def session_memory_report(state):
+    report = {}
+    for key in list(state.keys()):
+        try:
+            report[key] = _deep_sizeof(state[key], set())
+        except KeyError:
+            continue
+    return dict(sorted(report.items(), key=lambda item: item[1], reverse=True))
+
+def _deep_sizeof(value, seen):
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_sizeof(key, seen) + _deep_sizeof(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in value)
+    return size
@@ -0,0 +1,203 @@
+import argparse
+import collections
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import competitive_market
+import market_model
+import production_model
+import simulation_service
+
+# Headless command line for the market model, run as "python -m car_market_game ...".
+#   simulate designs.csv   score a CSV of designs (e.g. an LMS export) in streamed chunks
+#   compete designs.csv    clear a class session's designs as competitive markets, one per round
+#   risk designs.csv       Monte Carlo profit distribution of each design under demand uncertainty
+#   produce designs.csv    multi-year production of each design, resumable from a checkpoint file
+#   build-table            precompute the design-space lookup table
+#   serve                  local HTTP/JSON service for single and batched simulations
+RESULT_COLUMNS = ["Feedback", "Best Market Segment", "Estimated Sales", "Profit", "Cost"]
+
+# Map the input's column names onto DESIGN_COLUMNS, ignoring case and surrounding spaces
+def _design_column_names(columns):
+    wanted = {column.lower(): column for column in market_model.DESIGN_COLUMNS}
+    renames = {column: wanted[column.strip().lower()] for column in columns if column.strip().lower() in wanted}
+    missing = set(market_model.DESIGN_COLUMNS) - set(renames.values())
+    if missing:
+        raise ValueError(f"Input is missing design column(s): {', '.join(sorted(missing))}")
+    return renames
+
+# Score one chunk of designs; runs in a worker process when --workers > 1
+def simulate_chunk(chunk, renames):
+    results = market_model.simulate_market_batch(chunk.rename(columns=renames))
+    return pd.concat([chunk, results[RESULT_COLUMNS]], axis=1)
+
+def _write_chunk(frame, output, output_format, header):
+    if output_format == "jsonl":
+        frame.to_json(output, orient="records", lines=True, force_ascii=False)
+    else:
+        frame.to_csv(output, header=header, index=False)
+    output.flush()
+
+# Stream designs from `source`, fan chunks out across `workers` processes and write
+# results to `output` as soon as each chunk (in input order) is ready
+def simulate_designs(source, output, chunk_size=10000, workers=1, output_format="csv"):
+    reader = pd.read_csv(source, chunksize=chunk_size)
+    renames = None
+    rows = 0
+    header = True
+    if workers <= 1:
+        for chunk in reader:
+            renames = renames or _design_column_names(chunk.columns)
+            frame = simulate_chunk(chunk, renames)
+            _write_chunk(frame, output, output_format, header)
+            header = False
+            rows += len(frame)
+        return rows
+    # Keep a bounded number of chunks in flight so memory stays flat on huge inputs
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for chunk in reader:
+            renames = renames or _design_column_names(chunk.columns)
+            pending.append(pool.submit(simulate_chunk, chunk, renames))
+            while len(pending) >= 2 * workers or (pending and pending[0].done()):
+                frame = pending.popleft().result()
+                _write_chunk(frame, output, output_format, header)
+                header = False
+                rows += len(frame)
+        while pending:
+            frame = pending.popleft().result()
+            _write_chunk(frame, output, output_format, header)
+            header = False
+            rows += len(frame)
+    return rows
+
+# Competitive outcomes for every design in `source`; designs sharing a value in
+# `round_column` compete in the same market (all of them, if the column is absent)
+def compete_designs(source, output, round_column="Round", output_format="csv"):
+    designs = pd.read_csv(source)
+    designs = designs.rename(columns=_design_column_names(designs.columns))
+    if round_column in designs.columns:
+        results = competitive_market.clear_market_rounds(designs, round_column)
+    else:
+        results = competitive_market.clear_market(designs)
+    _write_chunk(pd.concat([designs, results], axis=1), output, output_format, True)
+    return len(designs)
+
+# Monte Carlo summaries for every design in `source`, written in input order
+def risk_designs(source, output, draws, seed, uncertainty, workers=1, output_format="csv"):
+    designs = pd.read_csv(source)
+    designs = designs.rename(columns=_design_column_names(designs.columns))
+    results = market_model.profit_distribution_batch(designs, draws, seed, uncertainty, workers)
+    _write_chunk(pd.concat([designs, results], axis=1), output, output_format, True)
+    return len(designs)
+
+# Year-by-year production of every design in `source`, one row per design and year.
+# A "Volume" column sets each design's yearly production (default `volume`). With a
+# checkpoint file, the run resumes from the years it shares with the saved run and
+# saves itself there afterwards.
+def produce_designs(source, output, years, volume, settings, checkpoint=None, output_format="csv"):
+    designs = pd.read_csv(source)
+    designs = designs.rename(columns=_design_column_names(designs.columns))
+    volumes = designs["Volume"].to_numpy() if "Volume" in designs.columns else volume
+    resume = None
+    if checkpoint is not None and os.path.exists(checkpoint):
+        resume = production_model.load_production_run(checkpoint)
+    run = production_model.simulate_production(designs, volumes, years, settings, resume)
+    if checkpoint is not None:
+        production_model.save_production_run(run, checkpoint)
+    _write_chunk(production_model.production_frame(run, designs.index), output, output_format, True)
+    if resume is not None:
+        print(f"Resumed {run.resumed} of {years} years from {checkpoint}", file=sys.stderr)
+    return len(designs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m car_market_game", description="Headless tools for the car market simulation.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    simulate = commands.add_parser("simulate", help="Score a CSV of designs (columns: " + ", ".join(market_model.DESIGN_COLUMNS) + ")")
+    simulate.add_argument("designs", help="Input CSV file, or - for stdin")
+    simulate.add_argument("-o", "--output", default="-", help="Output file, or - for stdout (default)")
+    simulate.add_argument("--format", choices=["csv", "jsonl"], default="csv", help="Output format (default: csv)")
+    simulate.add_argument("--chunk-size", type=int, default=10000, help="Designs per chunk (default: 10000)")
+    simulate.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1)")
+
+    compete = commands.add_parser("compete", help="Clear a CSV of class designs as competitive markets, one per round")
+    compete.add_argument("designs", help="Input CSV file, or - for stdin")
+    compete.add_argument("-o", "--output", default="-", help="Output file, or - for stdout (default)")
+    compete.add_argument("--format", choices=["csv", "jsonl"], default="csv", help="Output format (default: csv)")
+    compete.add_argument("--round-column", default="Round", help="Column holding each design's round (default: Round)")
+
+    defaults = market_model.Uncertainty()
+    risk = commands.add_parser("risk", help="Monte Carlo profit distribution of each design in a CSV under demand uncertainty")
+    risk.add_argument("designs", help="Input CSV file, or - for stdin")
+    risk.add_argument("-o", "--output", default="-", help="Output file, or - for stdout (default)")
+    risk.add_argument("--format", choices=["csv", "jsonl"], default="csv", help="Output format (default: csv)")
+    risk.add_argument("--draws", type=int, default=market_model.MONTE_CARLO_DRAWS, help=f"Draws per design (default: {market_model.MONTE_CARLO_DRAWS})")
+    risk.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    risk.add_argument("--size-sd", type=float, default=defaults.market_size, help=f"Relative spread of segment sizes (default: {defaults.market_size})")
+    risk.add_argument("--preference-sd", type=float, default=defaults.preferences, help=f"Spread of segment preferences in feature levels (default: {defaults.preferences})")
+    risk.add_argument("--sensitivity-sd", type=float, default=defaults.price_sensitivity, help=f"Relative spread of price sensitivity (default: {defaults.price_sensitivity})")
+    risk.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1)")
+
+    plan = production_model.ProductionSettings()
+    produce = commands.add_parser("produce", help="Simulate several years of production for each design in a CSV (optional Volume column)")
+    produce.add_argument("designs", help="Input CSV file, or - for stdin")
+    produce.add_argument("-o", "--output", default="-", help="Output file, or - for stdout (default)")
+    produce.add_argument("--format", choices=["csv", "jsonl"], default="csv", help="Output format (default: csv)")
+    produce.add_argument("--years", type=int, default=10, help="Years to simulate (default: 10)")
+    produce.add_argument("--volume", type=int, default=plan.capacity, help=f"Cars built per year when there is no Volume column (default: {plan.capacity})")
+    produce.add_argument("--capacity", type=int, default=plan.capacity, help=f"Most cars built per design per year (default: {plan.capacity})")
+    produce.add_argument("--learning-rate", type=float, default=plan.learning_rate, help=f"Unit cost multiplier per doubling of output (default: {plan.learning_rate})")
+    produce.add_argument("--learning-volume", type=int, default=plan.learning_volume, help=f"Output before costs start to fall (default: {plan.learning_volume})")
+    produce.add_argument("--holding-rate", type=float, default=plan.holding_rate, help=f"Yearly cost of an unsold car, as a share of its unit cost (default: {plan.holding_rate})")
+    produce.add_argument("--drift", type=float, default=plan.drift, help=f"Yearly spread of segment preference changes in feature levels (default: {plan.drift})")
+    produce.add_argument("--seed", type=int, default=plan.seed, help=f"Random seed for the drift (default: {plan.seed})")
+    produce.add_argument("--checkpoint", help="Resume from this .npz file if it exists, and save the run to it")
+
+    commands.add_parser("build-table", help="Precompute the design-space lookup table")
+
+    serve = commands.add_parser("serve", help="Run the local HTTP simulation service (see simulation_service.py)")
+    serve.add_argument("--host", default=simulation_service.SERVICE_HOST, help=f"Address to listen on (default: {simulation_service.SERVICE_HOST})")
+    serve.add_argument("--port", type=int, default=simulation_service.SERVICE_PORT, help=f"Port to listen on (default: {simulation_service.SERVICE_PORT})")
+    serve.add_argument("--batch-window", type=float, default=simulation_service.SERVICE_BATCH_WINDOW,
+                       help=f"Seconds to collect concurrent single requests into one batch (default: {simulation_service.SERVICE_BATCH_WINDOW})")
+
+    args = parser.parse_args(argv)
+    if args.command == "build-table":
+        print(market_model.build_design_table())
+        return 0
+    if args.command == "serve":
+        simulation_service.serve(args.host, args.port, args.batch_window)
+        return 0
+
+    started = time.perf_counter()
+    source = sys.stdin if args.designs == "-" else args.designs
+    output = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        if args.command == "compete":
+            rows = compete_designs(source, output, args.round_column, args.format)
+        elif args.command == "risk":
+            uncertainty = market_model.Uncertainty(args.size_sd, args.preference_sd, args.sensitivity_sd)
+            rows = risk_designs(source, output, args.draws, args.seed, uncertainty, args.workers, args.format)
+        elif args.command == "produce":
+            settings = production_model.ProductionSettings(
+                args.capacity, args.learning_rate, args.learning_volume, args.holding_rate, args.drift, args.seed
+            )
+            rows = produce_designs(source, output, args.years, args.volume, settings, args.checkpoint, args.format)
+        else:
+            rows = simulate_designs(source, output, args.chunk_size, args.workers, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    verb = {"simulate": "Simulated", "compete": "Cleared", "risk": "Ran Monte Carlo draws for", "produce": "Planned production for"}[args.command]
+    print(f"{verb} {rows:,} designs in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
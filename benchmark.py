@@ -0,0 +1,281 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+import pandas as pd
+
+import competitive_market
+import market_model
+import metrics
+import production_model
+
+# Repeatable benchmarks for the market model and the Streamlit app.
+#   python benchmark.py run [-o results.json]       run everything, save results as JSON
+#   python benchmark.py compare baseline.json new.json [--threshold 0.1]
+#                                                   flag benchmarks that got slower
+#   python benchmark.py imports [--scale 1.5]       check start-up import costs against budgets
+# Model micro-benchmarks report seconds per call. App benchmarks drive a full game
+# (start, three simulations, a what-if scenario, new game) through Streamlit's AppTest harness and
+# report, per click, the wall time and the time spent executing the script itself.
+# Import benchmarks time a cold import of each module in a fresh interpreter.
+BENCHMARK_DIR = os.path.join(market_model.design_table_dir(), "benchmarks")
+DEFAULT_THRESHOLD = 0.10
+
+# Start-up budget per module: (seconds for a cold import, heavy packages it must not load).
+# The app needs streamlit and numpy at start-up; pandas, PIL and requests are imported by
+# the code paths that use them (tables, the logo, image generation).
+IMPORT_BUDGETS = {
+    "market_model": (0.3, ("pandas", "streamlit", "requests")),
+    "competitive_market": (0.3, ("pandas", "streamlit", "requests")),
+    "attempt_log": (0.3, ("pandas", "streamlit", "requests")),
+    "production_model": (0.3, ("pandas", "streamlit", "requests")),
+    "car_images": (0.15, ("requests", "numpy", "streamlit")),
+    "event_log": (0.05, ("pyarrow", "numpy", "pandas", "streamlit")),
+    "app_cache": (0.8, ("pandas", "PIL", "requests", "pyarrow")),
+    "car_market_game": (0.8, ("pandas", "PIL", "requests", "pyarrow"))
+}
+_IMPORT_PROBE = "import sys, time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started); print(' '.join(sys.modules))"
+
+# Seconds per call of `func`: timeit's autorange sizes each sample to ~0.2s
+def _time_call(func, repeat):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    samples = [seconds / number for seconds in timer.repeat(repeat=repeat, number=number)]
+    return {"median": statistics.median(samples), "min": min(samples), "samples": len(samples), "unit": "s/call"}
+
+def model_benchmarks(repeat=7):
+    market_model.load_design_table()
+    rng = np.random.default_rng(0)
+    designs = pd.DataFrame(rng.integers(1, 11, size=(10000, 5)), columns=market_model.DESIGN_COLUMNS[:5])
+    designs["Price"] = rng.integers(10, 201, size=10000) * 1000
+    profits = [-20000000, -500000, -60000, -10000, 10000, 30000, 80000]
+    market = competitive_market.CompetitiveMarket()
+    for player, design in enumerate(designs[:2000].itertuples(index=False)):
+        market.submit(player, *design)
+    cases = {
+        "model.simulate_market_performance": lambda: market_model.simulate_market_performance(5, 6, 7, 6, 7, 30000),
+        "model.simulate_market_performance[off-grid]": lambda: market_model.simulate_market_performance(5.5, 6, 7, 6, 7, 30000),
+        "model.get_feedback_for_profit": lambda: [market_model.get_feedback_for_profit(profit, 100) for profit in profits],
+        "model.simulate_market_batch[10k]": lambda: market_model.simulate_market_batch(designs),
+        "model.profit_surface": lambda: market_model.profit_surface(5, 6, 7, 6, 7, "Tech"),
+        "model.profit_distribution[100k]": lambda: market_model.profit_distribution(5, 6, 7, 6, 7, 30000),
+        "competition.clear_market[10k]": lambda: competitive_market.clear_market(designs),
+        "competition.submit[2k players]": lambda: market.submit(0, 5, 6, 7, 6, 7, 30000),
+        "model.solve_optimal_designs[k=10]": lambda: market_model.solve_optimal_designs(10),
+        "production.simulate_production[10k x 10y]": lambda: production_model.simulate_production(designs, 15000, 10)
+    }
+    results = {}
+    for name, func in cases.items():
+        results[name] = _time_call(func, repeat)
+        print(f"  {name:<48} {_format_seconds(results[name]['median'])}", file=sys.stderr)
+    return results
+
+def _script_seconds():
+    series = metrics.phase_seconds.snapshot().get("rerun")
+    return series[1] if series is not None else 0.0
+
+# One full game; returns {step: (wall seconds, script seconds)}
+def _play_game(at):
+    steps = {}
+    def step(name, action):
+        script_before = _script_seconds()
+        started = time.perf_counter()
+        action()
+        steps[name] = (time.perf_counter() - started, _script_seconds() - script_before)
+    step("start_game", lambda: at.button(key="start_game_button").click().run())
+    for attempt in range(1, 4):
+        at.slider[0].set_value(attempt + 3)
+        step(f"simulate_{attempt}", lambda: [b for b in at.button if b.label == "Simulate Market"][0].click().run())
+    step("scenario", lambda: at.selectbox(key="scenario_choice").set_value("Tariff +25%").run())
+    step("new_game", lambda: at.button(key="new_game_button").click().run())
+    if at.exception:
+        raise RuntimeError(f"App raised during the benchmark: {at.exception[0].value}")
+    return steps
+
+def app_benchmarks(rounds=10):
+    from streamlit.testing.v1 import AppTest
+
+    # Keep the benchmark off the real leaderboard and the image provider
+    os.environ["CAR_MARKET_LEADERBOARD_DB"] = os.path.join(tempfile.mkdtemp(), "leaderboard.sqlite3")
+    os.environ.pop("OPENAI_API_KEY", None)
+    metrics.enable()
+    at = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "car_market_game.py"), default_timeout=60)
+    at.run()
+    _play_game(at)  # warm-up: imports, caches, design table
+    samples = {}
+    for _ in range(rounds):
+        for name, timings in _play_game(at).items():
+            samples.setdefault(name, []).append(timings)
+    results = {}
+    for name, timings in samples.items():
+        for kind, values in (("wall", [wall for wall, _ in timings]), ("script", [script for _, script in timings])):
+            results[f"app.{name}.{kind}"] = {
+                "median": statistics.median(values), "min": min(values), "samples": len(values), "unit": "s/click"
+            }
+        print(f"  app.{name:<44} {_format_seconds(results[f'app.{name}.wall']['median'])} wall, "
+              f"{_format_seconds(results[f'app.{name}.script']['median'])} script", file=sys.stderr)
+    return results
+
+# One cold import in a fresh interpreter: (seconds, top-level packages loaded, -X importtime log)
+def _import_once(module, importtime=False):
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", _IMPORT_PROBE.format(module=module)]
+    done = subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, timeout=120)
+    if done.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{done.stderr}")
+    seconds, loaded = done.stdout.splitlines()[-2:]
+    return float(seconds), {name.partition(".")[0] for name in loaded.split()}, done.stderr
+
+# The n slowest imports made directly by `module`, as (cumulative seconds, name), from its importtime log
+def _slowest_imports(module, importtime_log, n=3):
+    children = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or line.endswith("imported package"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == module:
+                return sorted(children, reverse=True)[:n]
+            children = []
+        elif depth == 1:
+            children.append((int(cumulative) / 1e6, name.strip()))
+    return []
+
+# Cold-import time of every IMPORT_BUDGETS module. Returns (results, problems), where
+# problems lists budget overruns (budgets multiplied by `scale`) and forbidden imports.
+def import_benchmarks(repeat=5, scale=1.0):
+    results, problems = {}, []
+    for module, (budget, forbidden) in IMPORT_BUDGETS.items():
+        samples = [_import_once(module)[0] for _ in range(repeat)]
+        _, loaded, importtime_log = _import_once(module, importtime=True)
+        median = statistics.median(samples)
+        results[f"import.{module}"] = {"median": median, "min": min(samples), "samples": len(samples), "unit": "s/import"}
+        slowest = ", ".join(f"{name} {_format_seconds(seconds)}" for seconds, name in _slowest_imports(module, importtime_log))
+        print(f"  import.{module:<41} {_format_seconds(median)} (budget {_format_seconds(budget * scale)}; slowest: {slowest})", file=sys.stderr)
+        if median > budget * scale:
+            problems.append(f"{module} takes {_format_seconds(median)} to import, over its {_format_seconds(budget * scale)} budget")
+        heavy = sorted(loaded.intersection(forbidden))
+        if heavy:
+            problems.append(f"{module} imports {', '.join(heavy)} at start-up")
+    return results, problems
+
+def _environment():
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    import streamlit
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "streamlit": streamlit.__version__
+    }
+
+def run(output=None, repeat=7, rounds=10, only=None):
+    results = {}
+    if only in (None, "import"):
+        print("Import benchmarks", file=sys.stderr)
+        results.update(import_benchmarks()[0])
+    if only in (None, "model"):
+        print("Model benchmarks", file=sys.stderr)
+        results.update(model_benchmarks(repeat))
+    if only in (None, "app"):
+        print("App benchmarks", file=sys.stderr)
+        results.update(app_benchmarks(rounds))
+    report = {"environment": _environment(), "results": results}
+    if output is None:
+        os.makedirs(BENCHMARK_DIR, exist_ok=True)
+        output = os.path.join(BENCHMARK_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {output}", file=sys.stderr)
+    return report
+
+# Compare medians of two result files; returns the names that slowed down by more than threshold
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    print(f"{'benchmark':<48} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in sorted(set(baseline["results"]) | set(current["results"])):
+        before = baseline["results"].get(name)
+        after = current["results"].get(name)
+        if before is None or after is None:
+            print(f"{name:<48} {'-' if before is None else _format_seconds(before['median']):>10} "
+                  f"{'-' if after is None else _format_seconds(after['median']):>10} {'n/a':>8}")
+            continue
+        change = after["median"] / before["median"] - 1 if before["median"] > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<48} {_format_seconds(before['median']):>10} {_format_seconds(after['median']):>10} {change:>+8.1%}{flag}")
+    return regressions
+
+def _format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python benchmark.py", description="Benchmarks for the car market model and app.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and save the results as JSON")
+    run_parser.add_argument("-o", "--output", help=f"Results file (default: a new file in {BENCHMARK_DIR})")
+    run_parser.add_argument("--only", choices=["import", "model", "app"], help="Run only the import, model or app benchmarks")
+    run_parser.add_argument("--repeat", type=int, default=7, help="Samples per model benchmark (default: 7)")
+    run_parser.add_argument("--rounds", type=int, default=10, help="Games played by the app benchmark (default: 10)")
+    run_parser.add_argument("--baseline", help="Compare against this results file when done")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown, e.g. 0.1 for 10%% (default: 0.1)")
+
+    compare_parser = commands.add_parser("compare", help="Compare two results files and flag regressions")
+    compare_parser.add_argument("baseline", help="Results file to compare against")
+    compare_parser.add_argument("current", help="Results file to check")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown, e.g. 0.1 for 10%% (default: 0.1)")
+
+    imports_parser = commands.add_parser("imports", help="Check cold-import times and heavy imports against IMPORT_BUDGETS")
+    imports_parser.add_argument("--repeat", type=int, default=5, help="Imports timed per module (default: 5)")
+    imports_parser.add_argument("--scale", type=float, default=1.0, help="Multiply every time budget, for slower machines (default: 1.0)")
+
+    args = parser.parse_args(argv)
+    if args.command == "imports":
+        _, problems = import_benchmarks(args.repeat, args.scale)
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        return 1 if problems else 0
+    if args.command == "run":
+        report = run(args.output, args.repeat, args.rounds, args.only)
+        if args.baseline is None:
+            return 0
+        baseline = _load(args.baseline)
+    else:
+        baseline = _load(args.baseline)
+        report = _load(args.current)
+    regressions = compare(baseline, report, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
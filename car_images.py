@@ -0,0 +1,174 @@
+import base64
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from image_cache import ImageCache
+from metrics import span
+
+# Background car image generation.
+# Streamlit re-executes the app script on every rerun, so the executor lives in this
+# imported module where it survives reruns and is shared by all sessions.
+IMAGE_WORKERS = int(os.getenv("CAR_IMAGE_WORKERS", "4"))
+# Generations allowed to run or wait at once; further submissions fail fast
+IMAGE_QUEUE_LIMIT = int(os.getenv("CAR_IMAGE_QUEUE_LIMIT", "32"))
+# Speculatively start the final image while the third attempt is being designed
+IMAGE_PREFETCH = os.getenv("CAR_IMAGE_PREFETCH", "0") == "1"
+
+# Generated images are cached on local disk by prompt, so students whose designs land in
+# the same vehicle-type/style bucket share one generation
+IMAGE_MODEL = "dall-e-3"
+IMAGE_SIZE = "1024x1024"
+image_cache = ImageCache(
+    os.path.join(os.getenv("CAR_MARKET_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")), "images"),
+    max_bytes=int(float(os.getenv("CAR_IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024),
+    max_age=float(os.getenv("CAR_IMAGE_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600
+)
+
+# Shared HTTP client for the image provider: pooled keep-alive connections, connect/read
+# timeouts, and bounded retries with jittered exponential backoff on 429/5xx (honouring
+# Retry-After). Read timeouts are not retried so a slow generation isn't paid for twice.
+# OPENAI_BASE_URL points it at a local mock for load tests. requests is only imported
+# when the first image is generated, so it doesn't slow down app start-up.
+IMAGE_API_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+IMAGE_CONNECT_TIMEOUT = float(os.getenv("CAR_IMAGE_CONNECT_TIMEOUT", "5"))
+IMAGE_READ_TIMEOUT = float(os.getenv("CAR_IMAGE_READ_TIMEOUT", "90"))
+IMAGE_MAX_RETRIES = int(os.getenv("CAR_IMAGE_MAX_RETRIES", "3"))
+# Upstream requests allowed in flight at once, to stay under provider rate limits
+IMAGE_MAX_CONCURRENCY = int(os.getenv("CAR_IMAGE_MAX_CONCURRENCY", "4"))
+
+def _build_http_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=IMAGE_MAX_RETRIES,
+        read=0,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "POST"}),
+        backoff_factor=0.5,
+        backoff_jitter=0.5,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(IMAGE_WORKERS, IMAGE_MAX_CONCURRENCY), max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+http_session = None
+_http_session_lock = threading.Lock()
+_upstream_slots = threading.BoundedSemaphore(IMAGE_MAX_CONCURRENCY)
+
+def _upstream_request(method, url, **kwargs):
+    global http_session
+    if http_session is None:
+        with _http_session_lock:
+            if http_session is None:
+                http_session = _build_http_session()
+    with _upstream_slots:
+        return http_session.request(method, url, timeout=(IMAGE_CONNECT_TIMEOUT, IMAGE_READ_TIMEOUT), **kwargs)
+
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="car-image")
+_pending = threading.BoundedSemaphore(IMAGE_QUEUE_LIMIT)
+
+# Prompt for a design. Only the vehicle-type and style buckets vary, so many designs
+# share a prompt.
+def build_car_image_prompt(speed, aesthetics, reliability, efficiency, tech, price):
+    # Enhanced prompt to strongly prevent text in images
+    return f"A {'sports car' if price > 80000 else 'luxury sedan' if price > 60000 else 'mid-range SUV' if price > 25000 and efficiency < 8 else 'eco-friendly SUV' if price > 25000 and efficiency >= 8 else 'eco-friendly compact' if price > 20000 and efficiency >= 8 else 'budget hatchback'} with a {'plain and basic' if aesthetics <= 3 else 'sleek and stylish' if aesthetics <= 7 else 'wild and extravagant'} design and funky color palette. The car should match its market segment: a high-performance sports car for extreme speed, a refined luxury sedan for premium comfort, a mid-range SUV for versatility, an eco-friendly SUV for sustainable family travel, an eco-friendly compact for maximum efficiency, or a budget hatchback for affordability. The car should be driving on a winding mountain road. The image should be comic/photorealistic. VERY IMPORTANT: DO NOT INCLUDE ANY TEXT, LETTERS, NUMBERS, WORDS, LABELS, WATERMARKS, LOGOS, OR SYMBOLS OF ANY KIND IN THE IMAGE."
+
+# Request image bytes for a prompt from OpenAI DALL·E; returns bytes or an error string
+def _request_image(prompt):
+    try:
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+
+        if not openai_api_key:
+            return "Error: No API Key found."
+
+        headers = {
+            "Authorization": f"Bearer {openai_api_key}",
+            "Content-Type": "application/json"
+        }
+
+        data = {
+            "model": IMAGE_MODEL,
+            "prompt": prompt,
+            "size": IMAGE_SIZE,
+            "n": 1,
+            "response_format": "b64_json"
+        }
+
+        response = _upstream_request("POST", f"{IMAGE_API_BASE_URL}/images/generations", json=data, headers=headers)
+
+        if response.status_code != 200:
+            return f"Error: {response.status_code} - {response.text}"
+        image = response.json()["data"][0]
+        if "b64_json" in image:
+            return base64.b64decode(image["b64_json"])
+        # Providers that only return a (short-lived) URL: download the bytes right away
+        download = _upstream_request("GET", image["url"])
+        if download.status_code != 200:
+            return f"Error: {download.status_code} - {download.text}"
+        return download.content
+    except Exception as e:
+        return f"Error generating image: {str(e)}"
+
+# Generate (or reuse) an image for a prompt; returns the local image path or an error string
+def generate_image_for_prompt(prompt):
+    try:
+        with span("generate_car_image"):
+            return image_cache.get_or_create(image_cache.key(prompt, IMAGE_MODEL, IMAGE_SIZE), lambda: _request_image(prompt))
+    except Exception as e:
+        return f"Error generating image: {str(e)}"
+
+# Hit/miss counters and size of the image cache
+def image_cache_stats():
+    return image_cache.stats()
+
+# AI image generation function using OpenAI DALL·E (blocking)
+def generate_car_image(speed, aesthetics, reliability, efficiency, tech, price):
+    return generate_image_for_prompt(build_car_image_prompt(speed, aesthetics, reliability, efficiency, tech, price))
+
+# Start generating an image in the background and return a Future for its path/error string.
+# When too many generations are already queued the Future resolves to an error at once,
+# so a burst of final attempts can't pile up unbounded work.
+def submit_car_image(prompt):
+    if not _pending.acquire(blocking=False):
+        future = Future()
+        future.set_result("Error: Image generator is busy, please try again shortly.")
+        return future
+    try:
+        future = _executor.submit(generate_image_for_prompt, prompt)
+    except BaseException:
+        _pending.release()
+        raise
+    future.add_done_callback(lambda _: _pending.release())
+    return future
+
+# Speculative prefetch for the final attempt. A generation is started once the prompt
+# for the current inputs is the same on two consecutive reruns, i.e. the student's last
+# interaction didn't change the car's look. At most one prefetch is kept per session;
+# a superseded one is cancelled if it hasn't started yet.
+def prefetch_car_image(session, prompt):
+    if not IMAGE_PREFETCH:
+        return
+    if session.get("image_prompt_seen") == prompt:
+        prefetch = session.get("image_prefetch")
+        if prefetch is None or prefetch[0] != prompt:
+            if prefetch is not None:
+                prefetch[1].cancel()
+            session["image_prefetch"] = (prompt, submit_car_image(prompt))
+    session["image_prompt_seen"] = prompt
+
+# Future for the final image: reuse a matching prefetch, otherwise submit a new generation
+def take_car_image(session, prompt):
+    prefetch = session.get("image_prefetch")
+    session["image_prefetch"] = None
+    if prefetch is not None:
+        if prefetch[0] == prompt and not prefetch[1].cancelled():
+            return prefetch[1]
+        prefetch[1].cancel()
+    return submit_car_image(prompt)
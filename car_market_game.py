@@ -1,447 +1,339 @@
+import sys
+
+# "python -m car_market_game ..." runs the headless command line and never loads the UI.
+# "streamlit run" has already imported streamlit by the time it executes this file.
+if __name__ == "__main__" and "streamlit" not in sys.modules:
+    from batch_cli import main as cli_main
+    sys.exit(cli_main(sys.argv[1:]))
+
 import streamlit as st
-import pandas as pd
-import requests
 import os
-import time
-
-# Simulated market data
-market_data = pd.DataFrame({
-    "Segment": ["Budget", "Family", "Luxury", "Sports", "Eco-Friendly"],
-    "Avg_Price": [20000, 30000, 60000, 80000, 35000],
-    "Preferred_Speed": [4, 5, 7, 10, 5],
-    "Preferred_Aesthetics": [5, 6, 9, 8, 7],
-    "Preferred_Reliability": [8, 7, 6, 5, 9],
-    "Preferred_Efficiency": [7, 6, 4, 3, 10],
-    "Preferred_Tech": [6, 7, 10, 9, 8],
-    "Market_Size": [50000, 40000, 15000, 10000, 25000]
-})
-
-# Market simulation function
-def simulate_market_performance(speed, aesthetics, reliability, efficiency, tech, price):
-    market_data["Score"] = (
-        abs(market_data["Preferred_Speed"] - speed) +
-        abs(market_data["Preferred_Aesthetics"] - aesthetics) +
-        abs(market_data["Preferred_Reliability"] - reliability) +
-        abs(market_data["Preferred_Efficiency"] - efficiency) +
-        abs(market_data["Preferred_Tech"] - tech)
-    )
-    best_match = market_data.loc[market_data["Score"].idxmin()]
-    
-    price_factor = max(0, 1 - abs(price - best_match["Avg_Price"]) / best_match["Avg_Price"])
-    estimated_sales = int(best_match["Market_Size"] * (1 - best_match["Score"] / 50) * price_factor)
-    cost = (speed * 2000) + (aesthetics * 1500) + (reliability * 1800) + (efficiency * 1700) + (tech * 2500)
-    profit = estimated_sales * (price - cost)
-    
-    feedback = ""
-    if estimated_sales == 0:
-        feedback = "🚨 No sales! Your price is too high for the options you've chosen. Try lowering your price or better matching your car's features to a market segment."
-    elif profit < -10000000:
-        feedback = "🚨 Catastrophic Loss! Your car is losing an extreme amount of money. You need to **completely rethink** your strategy—reduce production costs, increase the price, and make sure your car matches the right market segment."
-    elif profit < -1000000:
-        feedback = "⚠️ Huge Loss! Your losses are very high. Consider making significant adjustments—lowering expensive features, improving efficiency, or adjusting pricing to better fit the market."
-    elif profit < -100000:
-        feedback = "🚨 Major Loss! Your car is losing a significant amount of money. You need to make drastic changes—consider lowering production costs, increasing the price, or improving the balance of features to appeal to buyers."
-    elif profit < -50000:
-        feedback = "🔴 Moderate Loss! Your car is losing money. Try reducing unnecessary costs, adjusting the price, or making the car more appealing to its target market."
-    elif profit < 0:
-        feedback = "Your car is losing money. Consider increasing the price or reducing costs by adjusting features like speed, aesthetics, or technology."
-    elif profit < 20000:
-        feedback = "⚠️ Low Profit! Your profit is minimal. Consider small adjustments to your price or features to make your car more appealing."
-    elif profit < 50000:
-        feedback = "Your profit is low. Try optimizing your price or enhancing the car's appeal to boost sales."
-    else:
-        feedback = "Your car is profitable! Maintain a balance between cost and market demand for even better results."
-    
-    return {
-        "Feedback": feedback,
-        "Best Market Segment": best_match["Segment"],
-        "Estimated Sales": estimated_sales,
-        "Profit": profit,
-        "Cost": cost
-    }
-
-# Function to generate feedback for a profit amount
-def get_feedback_for_profit(profit, sales=None):
-    if sales == 0 or sales is not None and sales < 10:
-        return "🚨 No sales! Your price is too high for the options you've chosen. Try lowering your price or better matching your car's features to a market segment."
-    
-    if profit < -10000000:
-        return "🚨 Catastrophic Loss! Your car is losing an extreme amount of money. You need to **completely rethink** your strategy—reduce production costs, increase the price, and make sure your car matches the right market segment."
-    elif profit < -1000000:
-        return "⚠️ Huge Loss! Your losses are very high. Consider making significant adjustments—lowering expensive features, improving efficiency, or adjusting pricing to better fit the market."
-    elif profit < -100000:
-        return "🚨 Major Loss! Your car is losing a significant amount of money. You need to make drastic changes—consider lowering production costs, increasing the price, or improving the balance of features to appeal to buyers."
-    elif profit < -50000:
-        return "🔴 Moderate Loss! Your car is losing money. Try reducing unnecessary costs, adjusting the price, or making the car more appealing to its target market."
-    elif profit < 0:
-        return "Your car is losing money. Consider increasing the price or reducing costs by adjusting features like speed, aesthetics, or technology."
-    elif profit < 20000:
-        return "⚠️ Low Profit! Your profit is minimal. Consider small adjustments to your price or features to make your car more appealing."
-    elif profit < 50000:
-        return "Your profit is low. Try optimizing your price or enhancing the car's appeal to boost sales."
-    else:
-        return "Your car is profitable! Maintain a balance between cost and market demand for even better results."
-
-# AI image generation function using OpenAI DALL·E
-def generate_car_image(speed, aesthetics, reliability, efficiency, tech, price):
+import sqlite3
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from attempt_log import AttemptLog, session_memory_report
+from app_cache import (
+    LOGO_WIDTH, achievable_designs, attempt_card_html, attempts_summary_table, instructor_tables, leaderboard_tables, price_solution,
+    production_schedule, profit_risk, profit_sweep, refreshed_analytics, scenario_matrix, static_assets, submit_class_design
+)
+from car_images import build_car_image_prompt, generate_car_image, prefetch_car_image, take_car_image
+from event_log import ANALYTICS_TTL, get_event_log
+from leaderboard import get_leaderboard
+from market_model import (
+    DESIGN_COLUMNS, FEEDBACK_MESSAGES, PRICE_MAX, PRICE_MIN, PRICE_STEP, SCENARIOS, Scenario, build_design_table,
+    evaluate_scenarios, get_feedback_for_profit, get_feedback_tier, load_design_table, market_segments,
+    profit_distribution, segment_balance_report, simulate_market_batch, simulate_market_performance, solve_optimal_designs
+)
+from metrics import observe_session_memory, span
+from production_model import ProductionSettings, production_frame, simulate_production
+
+# Names scripts and notebooks import from this module. The model and image functions live
+# in market_model and car_images and are re-exported here, so existing imports keep working.
+__all__ = [
+    "FEEDBACK_MESSAGES", "build_design_table", "evaluate_scenarios", "generate_car_image", "get_feedback_for_profit",
+    "get_feedback_tier", "load_design_table", "main", "profit_distribution", "reset_game",
+    "segment_balance_report", "simulate_market_batch", "simulate_market_performance", "solve_optimal_designs"
+]
+
+# market_data, the segment table as a DataFrame, is market_model's too; building it loads
+# pandas, so it is fetched on first use rather than imported (and isn't in __all__)
+def __getattr__(name):
+    if name == "market_data":
+        import market_model
+        return market_model.market_data
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Longest production plan a student can simulate, in years
+PRODUCTION_MAX_YEARS = 10
+
+# Instructor key from CAR_MARKET_INSTRUCTOR_KEY; the instructor view is off when it isn't set
+INSTRUCTOR_KEY = os.getenv("CAR_MARKET_INSTRUCTOR_KEY", "")
+
+# Leaderboard writes are queued, so a slow or unavailable database never blocks a click
+def record_leaderboard_attempt(player, design, result):
     try:
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        
-        if not openai_api_key:
-            return "Error: No API Key found."
-        
-        headers = {
-            "Authorization": f"Bearer {openai_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        # Enhanced prompt to strongly prevent text in images
-        prompt = f"A {'sports car' if price > 80000 else 'luxury sedan' if price > 60000 else 'mid-range SUV' if price > 25000 and efficiency < 8 else 'eco-friendly SUV' if price > 25000 and efficiency >= 8 else 'eco-friendly compact' if price > 20000 and efficiency >= 8 else 'budget hatchback'} with a {'plain and basic' if aesthetics <= 3 else 'sleek and stylish' if aesthetics <= 7 else 'wild and extravagant'} design and funky color palette. The car should match its market segment: a high-performance sports car for extreme speed, a refined luxury sedan for premium comfort, a mid-range SUV for versatility, an eco-friendly SUV for sustainable family travel, an eco-friendly compact for maximum efficiency, or a budget hatchback for affordability. The car should be driving on a winding mountain road. The image should be comic/photorealistic. VERY IMPORTANT: DO NOT INCLUDE ANY TEXT, LETTERS, NUMBERS, WORDS, LABELS, WATERMARKS, LOGOS, OR SYMBOLS OF ANY KIND IN THE IMAGE."
-        
-        data = {
-            "model": "dall-e-3",
-            "prompt": prompt,
-            "size": "1024x1024",
-            "n": 1
-        }
-        
-        response = requests.post("https://api.openai.com/v1/images/generations", json=data, headers=headers)
-        
-        if response.status_code == 200:
-            return response.json()["data"][0]["url"]
-        else:
-            return f"Error: {response.status_code} - {response.text}"
-    except Exception as e:
-        return f"Error generating image: {str(e)}"
+        get_leaderboard().record(player, design, result)
+    except (OSError, sqlite3.Error):
+        pass
 
-# Streamlit UI
-try:
-    st.set_page_config(page_title="Business Administration Car Market Simulation Game", layout="wide", initial_sidebar_state="expanded")
-except Exception as e:
-    # This means the page config was already set, which is fine
-    pass
-
-# Improved CSS with better responsive layout and smaller start button
-st.markdown("""
-    <style>
-    /* Fix for black background on mobile */
-    body {
-        background-color: #ffffff !important;
-    }
-    .main .block-container {
-        background-color: #ffffff !important;
-    }
-    .stApp {
-        background-color: #ffffff !important;
-    }
-    
-    /* Fix for text color visibility on mobile */
-    .stMarkdown, .stText, p, h1, h2, h3, h4, h5, h6, span, div, label {
-        color: #333333 !important;
-    }
-    /* Make sure sliders, inputs and other controls have visible text */
-    .stSlider label, .stNumberInput label, .stSelectbox label, .stButton label {
-        color: #333333 !important;
-    }
-    /* Make sure all input text is visible */
-    input, select, textarea {
-        color: #333333 !important;
-    }
-    /* Specifically fix the price input field */
-    .stNumberInput input, .stNumberInput .css-qrbaxs {
-        color: #333333 !important;
-        background-color: #ffffff !important;
-    }
-    /* Fix for any input field background colors */
-    .css-qrbaxs, .css-zt5igj, input[type="number"], .stNumberInput div[data-baseweb="input"] {
-        background-color: #ffffff !important;
-        color: #333333 !important;
-    }
-    /* Fix Trump tariff button color scheme - more aggressive approach */
-    button[key="apply_tariff"],
-    [data-testid="baseButton-secondary"][aria-label="Impose Trump Tariff +25%"],
-    div:has(> button:contains("Impose Trump Tariff")),
-    button:contains("Trump Tariff"),
-    button:contains("Impose Trump"),
-    div:has(> span:contains("Impose Trump Tariff")) button {
-        background-color: #FF5733 !important;
-        color: white !important;
-        border-color: #CC4422 !important;
-        opacity: 1 !important;
-    }
-    /* Override Streamlit button colors */
-    .stButton button {
-        color: white !important;
-    }
-    /* Make sure the tariff button text is always visible */
-    button:contains("Trump") span,
-    button:contains("Tariff") span,
-    div:has(> button:contains("Trump")) span {
-        color: white !important;
-    }
-    /* Strong dark text for important elements */
-    strong, b {
-        color: #111111 !important;
-    }
-    
-    .custom-container {
-        border: 2px solid #4CAF50;
-        padding: 15px;
-        border-radius: 10px;
-        background-color: #ffffff;
-        color: #000000;
-        margin-bottom: 20px;
-        max-width: 900px;
-        margin-left: auto;
-        margin-right: auto;
-    }
-    .custom-container-tariff {
-        border: 2px solid #FF5733;
-        padding: 15px;
-        border-radius: 10px;
-        background-color: #fff3e0;
-        color: #000000;
-        margin-bottom: 20px;
-        max-width: 900px;
-        margin-left: auto;
-        margin-right: auto;
-    }
-    .section-divider {
-        border-top: 1px solid #ccc;
-        margin-top: 10px;
-        padding-top: 10px;
-    }
-    .header-green {
-        color: #4CAF50;
-    }
-    .header-orange {
-        color: #FF5733;
-    }
-    .instructions-container {
-        border: 2px solid #3498db;
-        padding: 20px;
-        border-radius: 10px;
-        background-color: #e8f4f8;
-        color: #000000;
-        margin-bottom: 20px;
-        max-width: 800px;
-        margin-left: auto;
-        margin-right: auto;
-    }
-    .attempt-counter {
-        font-weight: bold;
-        color: #3498db;
-        font-size: 18px;
-        text-align: center;
-        margin: 10px 0;
-        padding: 10px;
-        background-color: #e8f4f8;
-        border-radius: 5px;
-        max-width: 900px;
-        margin-left: auto;
-        margin-right: auto;
-    }
-    .prev-attempt {
-        font-size: 14px;
-        padding: 10px;
-        background-color: #f0f0f0;
-        border-radius: 5px;
-        margin-bottom: 10px;
-    }
-    .centered-header-container {
-        max-width: 900px;
-        margin-left: auto;
-        margin-right: auto;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-    }
-    .centered-container {
-        max-width: 900px;
-        margin-left: auto;
-        margin-right: auto;
-    }
-    /* Significantly smaller start button on desktop with manual size control */
-    .small-button {
-        max-width: 120px !important;
-        margin: 0 auto !important;
-        display: block !important;
-    }
-    .small-button button {
-        width: 120px !important;
-        min-width: unset !important;
-        max-width: 120px !important;
-    }
-    /* Override Streamlit default button expansion */
-    div[data-testid="stButton"] {
-        width: auto !important;
-    }
-    /* Button colors */
-    .stButton button {
-        font-weight: bold;
-        color: white !important;
-    }
-    /* Primary buttons should always have white text */
-    button[kind="primary"], 
-    .stButton button[data-baseweb="button"][kind="primary"],
-    [data-testid="baseButton-primary"] {
-        color: white !important;
-    }
-    /* Red warning buttons */
-    button[kind="secondary"], 
-    .stButton button[data-baseweb="button"][kind="secondary"],
-    [data-testid="baseButton-secondary"] {
-        background-color: #FF5733 !important;
-        border-color: #FF5733 !important;
-        color: white !important;
-    }
-    .red-button button {
-        background-color: #FF5733 !important;
-        border-color: #FF5733 !important;
-        color: white !important;
-    }
-    /* Responsive design */
-    @media (max-width: 768px) {
-        .hide-on-mobile {
-            display: none !important;
-        }
-        .custom-container, .custom-container-tariff, .instructions-container {
-            padding: 10px;
-        }
-        .stButton button {
-            width: 100%;
-        }
-        .small-button {
-            max-width: 100%;
-        }
-    }
-    /* Improve settings and results layout */
-    .settings-panel {
-        background-color: #f9f9f9;
-        padding: 15px;
-        border-radius: 10px;
-        margin-bottom: 15px;
-    }
-    .results-panel {
-        margin-top: 20px;
-    }
-    .sidebar-placeholder {
-        display: none;
-    }
-    @media (min-width: 992px) {
-        .sidebar-placeholder {
-            display: block;
-            width: 100%;
-            height: 1px;
-        }
-        .results-container {
-            padding-left: 20px;
-        }
-    }
-    </style>
-""", unsafe_allow_html=True)
-
-# Initialize session state
-if 'game_state' not in st.session_state:
-    st.session_state.game_state = "instructions"  # States: instructions, playing, game_over
-if 'result' not in st.session_state:
-    st.session_state.result = None
-if 'car_image_url' not in st.session_state:
-    st.session_state.car_image_url = None
-if 'tariff_applied' not in st.session_state:
-    st.session_state.tariff_applied = False
-if 'attempts_used' not in st.session_state:
-    st.session_state.attempts_used = 0
-if 'attempts_results' not in st.session_state:
-    st.session_state.attempts_results = []
-if 'car_designs' not in st.session_state:
-    st.session_state.car_designs = []
+# Analytics events are queued too and written in batches by the event log's own thread
+def record_simulation_event(attempt, design, result):
+    event_log = get_event_log()
+    if event_log is not None:
+        event_log.record_simulation(
+            get_script_run_ctx().session_id, st.session_state.player_name, st.session_state.class_code, attempt, design, result
+        )
+
+# Log a what-if view once per session, attempt and scenario, not on every fragment rerun
+def record_scenario_event(attempt, design, scenario, segment, sales, profit, baseline_profit):
+    event_log = get_event_log()
+    key = (attempt, scenario)
+    if event_log is not None and st.session_state.get("last_scenario_event") != key:
+        st.session_state.last_scenario_event = key
+        event_log.record_scenario(
+            get_script_run_ctx().session_id, st.session_state.player_name, st.session_state.class_code,
+            attempt, design, scenario, segment, sales, profit, baseline_profit
+        )
+
+# Course analytics over every session's events, opened with ?instructor=<key>. Refreshes
+# itself every few seconds; each refresh only reads the events logged since the last one.
+@st.fragment(run_every=ANALYTICS_TTL)
+def instructor_panel():
+    st.markdown("## 📋 Instructor View")
+    class_codes = refreshed_analytics().class_codes()
+    labels = {"All students": None, **{code or "No class code": code for code in class_codes}}
+    choice = st.selectbox("Class", list(labels), key="instructor_class")
+    sessions, events, attempts, segments, improvement, tariff_impact = instructor_tables(labels[choice])
+    st.caption(f"{sessions:,} game session{'s' if sessions != 1 else ''}, {events:,} logged events in total")
+    st.markdown("### Profit by Attempt")
+    st.dataframe(attempts, use_container_width=True, hide_index=True)
+    st.markdown("### Improvement from Attempt 1 to Attempt 3")
+    st.dataframe(improvement, use_container_width=True, hide_index=True)
+    st.markdown("### Where Students Converge (share of each attempt's designs by segment)")
+    st.dataframe(segments, use_container_width=True)
+    st.markdown("### What-If Impact (views by profit change vs. baseline)")
+    st.dataframe(tariff_impact, use_container_width=True)
 
 # Function to reset the game
 def reset_game():
     st.session_state.game_state = "instructions"
-    st.session_state.result = None
     st.session_state.car_image_url = None
-    st.session_state.tariff_applied = False
+    if st.session_state.car_image_future is not None:
+        st.session_state.car_image_future.cancel()
+    st.session_state.car_image_future = None
     st.session_state.attempts_used = 0
-    st.session_state.attempts_results = []
-    st.session_state.car_designs = []
+    st.session_state.attempts = AttemptLog()
+    st.session_state.production_run = None
 
-# Logo and header in the same row
-logo_path = "logo.png"  # Replace with the actual logo file path
+# Poll a background image generation and swap the image in once it is ready
+@st.fragment(run_every=1)
+def pending_car_image_panel():
+    future = st.session_state.car_image_future
+    if future is None or future.done():
+        if future is not None:
+            st.session_state.car_image_url = future.result() if not future.cancelled() else None
+            st.session_state.car_image_future = None
+        st.rerun()
+    st.info("🎨 Your AI-generated car image is being created and will appear here shortly...")
 
-# Create centered container for the header
-st.markdown('<div style="max-width: 900px; margin: 0 auto; padding: 10px;">', unsafe_allow_html=True)
-col1, col2 = st.columns([1, 5])
-with col1:
-    try:
-        st.image(logo_path, width=100)
-    except:
-        pass  # Skip if logo doesn't load
-with col2:
-    st.markdown("<h1 style='margin-top: 25px;'>Business Administration Car Market Simulation Game</h1>", unsafe_allow_html=True)
-st.markdown('</div>', unsafe_allow_html=True)
-
-# Instructions screen
-if st.session_state.game_state == "instructions":
-    st.markdown("""
-    <div class="instructions-container">
-        <h2 style="color: #3498db; text-align: center;">Welcome to the Car Market Simulator!</h2>
-        <hr>
-        <h3>Game Instructions:</h3>
-        <ol>
-            <li><strong>Objective:</strong> Design a profitable car by adjusting its features and price.</li>
-            <li><strong>You have 3 attempts</strong> to create a profitable car design.</li>
-            <li>Customize your car's specifications using the sliders.</li>
-            <li>Click "Simulate Market" to see how your car performs.</li>
-            <li>Learn from each attempt and adjust your strategy.</li>
-            <li>After your third attempt, you'll see an AI-generated image of your final car design.</li>
-            <li>The "Impose Trump Tariff" button lets you see how a 25% tariff would affect your profits.</li>
-        </ol>
-        <p style="text-align: center; font-weight: bold;">Good luck with your car design!</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Using a more aggressive approach with columns to constrain button width
-    col1, col2, col3 = st.columns([1, 1, 1])
+# Profit explorer around a design: profit against price at the design's feature values,
+# and against price and one chosen feature. A fragment, so choosing another feature only
+# reruns this panel.
+@st.fragment
+def profit_explorer_panel(design):
+    st.markdown("### 📈 Profit Explorer")
+    feature = st.selectbox("Feature to explore", DESIGN_COLUMNS[:5], key="explorer_feature")
+    sweep = profit_sweep(feature, tuple(design[column] for column in DESIGN_COLUMNS[:5] if column != feature))
+    marker = {"values": [{"Price": design["Price"], feature: design[feature]}]}
+    tooltip = [
+        {"field": feature, "type": "ordinal"}, {"field": "Price", "type": "quantitative", "format": "$,"},
+        {"field": "Profit", "type": "quantitative", "format": "$,"}, {"field": "Sales", "type": "quantitative", "format": ","},
+        {"field": "Market Segment", "type": "nominal"}
+    ]
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown(f"**Profit vs. price** ({feature} {design[feature]})")
+        st.vega_lite_chart(sweep[sweep[feature] == design[feature]], {
+            "height": 260,
+            "layer": [
+                {"mark": "line", "encoding": {
+                    "x": {"field": "Price", "type": "quantitative", "axis": {"format": "$~s"}},
+                    "y": {"field": "Profit", "type": "quantitative", "axis": {"format": "$~s"}},
+                    "tooltip": tooltip
+                }},
+                {"data": marker, "mark": {"type": "rule", "strokeDash": [4, 4]}, "encoding": {
+                    "x": {"field": "Price", "type": "quantitative"}
+                }}
+            ]
+        }, use_container_width=True)
     with col2:
-        st.markdown('<div style="width: 120px; margin: 0 auto;">', unsafe_allow_html=True)
-        start_button = st.button("Start Game", key="start_game_button", help="Click to start the game", type="primary")
-        st.markdown('</div>', unsafe_allow_html=True)
-    if start_button:
-        st.session_state.game_state = "playing"
-        st.session_state.attempts_used = 0
-        st.session_state.attempts_results = []
-        st.session_state.car_designs = []
-        st.rerun()
+        st.markdown(f"**Profit by {feature.lower()} and price**")
+        st.vega_lite_chart(sweep, {
+            "height": 260,
+            "layer": [
+                {"mark": "rect", "encoding": {
+                    "x": {"field": "Price", "type": "ordinal", "axis": {"values": list(range(PRICE_MIN, PRICE_MAX + 1, 30000)), "format": "$~s", "labelAngle": 0}},
+                    "y": {"field": feature, "type": "ordinal", "sort": "descending"},
+                    "color": {"field": "Profit", "type": "quantitative", "scale": {"scheme": "redyellowgreen", "domainMid": 0}, "legend": {"format": "$~s"}},
+                    "tooltip": tooltip
+                }},
+                {"data": marker, "mark": {"type": "point", "shape": "cross", "color": "black", "size": 120, "filled": True}, "encoding": {
+                    "x": {"field": "Price", "type": "ordinal"},
+                    "y": {"field": feature, "type": "ordinal"}
+                }}
+            ]
+        }, use_container_width=True)
+
+# Demand uncertainty for a design: the same car in many randomly perturbed markets, shown
+# as expected profit, a likely range and the chance of a loss. A fragment, so switching it
+# on or off only reruns this panel.
+@st.fragment
+def demand_uncertainty_panel(design):
+    if not st.toggle("🎲 Show demand uncertainty", key="uncertainty_mode",
+                     help="Re-runs your design in 100,000 markets where segment sizes, preferences and price sensitivity vary"):
+        return
+    distribution, histogram = profit_risk(tuple(design[column] for column in DESIGN_COLUMNS))
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Expected Profit", f"${distribution.mean:,.0f}")
+    col2.metric("Likely Range (5%-95%)", f"${distribution.percentiles[5]:,.0f} to ${distribution.percentiles[95]:,.0f}")
+    col3.metric("Chance of a Loss", f"{distribution.loss_probability:.1%}")
+    st.vega_lite_chart(histogram, {
+        "height": 200,
+        "mark": "bar",
+        "encoding": {
+            "x": {"field": "From", "type": "quantitative", "bin": {"binned": True}, "title": "Profit", "axis": {"format": "$~s"}},
+            "x2": {"field": "To"},
+            "y": {"field": "Share", "type": "quantitative", "title": "Share of markets", "axis": {"format": "%"}},
+            "color": {"condition": {"test": "datum.To <= 0", "value": "#FF5733"}, "value": "#4CAF50"},
+            "tooltip": [
+                {"field": "From", "type": "quantitative", "format": "$,.0f"}, {"field": "To", "type": "quantitative", "format": "$,.0f"},
+                {"field": "Share", "type": "quantitative", "format": ".1%"}
+            ]
+        }
+    }, use_container_width=True)
+
+# Multi-year production for a design: the student plans how many cars to build each year
+# and sees sales, leftover inventory, falling unit costs and profit as tastes drift. A
+# fragment, and the session keeps its last run, so changing one year's volume only
+# re-simulates the years from that one on.
+@st.fragment
+def production_panel(design, demand):
+    if not st.toggle("🏭 Plan multi-year production", key="production_mode",
+                     help="Keep this car on the market for several years: choose how many to build each year, within your plant's capacity"):
+        return
+    settings = ProductionSettings()
+    years = st.slider("Years on the market", 2, PRODUCTION_MAX_YEARS, 5, key="production_years")
+    st.caption(
+        f"Your plant builds up to {settings.capacity:,} cars a year. Each time total production doubles, the cost per car falls "
+        f"{1 - settings.learning_rate:.0%}. Unsold cars carry over to next year at {settings.holding_rate:.0%} of their cost, "
+        "and buyers' tastes shift a little every year."
+    )
+    schedule = st.data_editor(
+        production_schedule(years, min(demand, settings.capacity)), key="production_schedule",
+        hide_index=True, disabled=["Year"], use_container_width=True
+    )
+    volumes = schedule["Production"].fillna(0).astype(int).tolist()
+    run = simulate_production(
+        [tuple(design[column] for column in DESIGN_COLUMNS)], [volumes], years, settings, resume=st.session_state.production_run
+    )
+    st.session_state.production_run = run
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Profit", f"${int(run.profit.sum()):,}")
+    col2.metric("Cars Left Unsold", f"{int(run.inventory[-1, 0]):,}")
+    col3.metric(f"Cost per Car in Year {years}", f"${int(run.unit_cost[-1, 0]):,}", f"${int(run.unit_cost[-1, 0] - run.unit_cost[0, 0]):,}", delta_color="inverse")
+    table = production_frame(run).drop(columns="Design")
+    st.vega_lite_chart(table, {
+        "height": 200,
+        "mark": "bar",
+        "encoding": {
+            "x": {"field": "Year", "type": "ordinal", "axis": {"labelAngle": 0}},
+            "y": {"field": "Profit", "type": "quantitative", "axis": {"format": "$~s"}},
+            "color": {"condition": {"test": "datum.Profit < 0", "value": "#FF5733"}, "value": "#4CAF50"},
+            "tooltip": [
+                {"field": "Best Market Segment", "type": "nominal"}, {"field": "Sales", "type": "quantitative", "format": ","},
+                {"field": "Inventory", "type": "quantitative", "format": ","}, {"field": "Profit", "type": "quantitative", "format": "$,"}
+            ]
+        }
+    }, use_container_width=True)
+    for column in ("Unit Cost", "Profit"):
+        table[column] = table[column].map(lambda amount: f"${amount:,}")
+    st.dataframe(table, use_container_width=True, hide_index=True)
+
+# Class leaderboard for the game-over screen. A fragment, so refreshing it while classmates
+# finish their games only reruns this panel.
+@st.fragment
+def class_leaderboard_panel(segment):
+    top_players, top_in_segment = leaderboard_tables(segment)
+    if top_players is None:
+        return
+    st.markdown("### 🏁 Class Leaderboard")
+    board_col1, board_col2 = st.columns(2)
+    with board_col1:
+        st.markdown("**Top Students**")
+        st.dataframe(top_players, use_container_width=True, hide_index=True)
+    with board_col2:
+        st.markdown(f"**Top in {segment}**")
+        st.dataframe(top_in_segment, use_container_width=True, hide_index=True)
+    st.button("Refresh leaderboard", key="leaderboard_refresh")
+
+# What-if scenarios for every attempt: a scenario x attempt profit matrix and, for one
+# chosen scenario, the final design's updated results. A fragment, so picking a scenario
+# or building a custom one only reruns this panel.
+@st.fragment
+def scenario_panel(attempts):
+    st.markdown("### 🌪️ What-If Scenarios")
+    st.markdown("How would each of your designs hold up if costs or demand changed after launch? Every car keeps its price and market segment.")
+    scenarios = list(SCENARIOS)
+    with st.expander("Build your own scenario"):
+        custom_col1, custom_col2 = st.columns(2)
+        with custom_col1:
+            tariff = st.slider("Tariff (%)", 0, 100, 0, step=5, key="custom_tariff")
+            currency = st.slider("Currency move (% on parts bought abroad)", -30, 30, 0, step=5, key="custom_currency")
+            demand = st.slider("Demand shift (%)", -50, 50, 0, step=5, key="custom_demand")
+        with custom_col2:
+            material_feature = st.selectbox("Parts hit by a price shock", DESIGN_COLUMNS[:5], key="custom_material_feature")
+            material = st.slider("Parts price shock (%)", -50, 100, 0, step=5, key="custom_material")
+    if tariff or currency or demand or material:
+        shocks = [0.0] * 5
+        shocks[DESIGN_COLUMNS.index(material_feature)] = material / 100
+        scenarios.append(Scenario("Your scenario", tariff / 100, tuple(shocks), currency / 100, demand / 100))
+
+    matrix, outcomes = scenario_matrix(attempts.design_tuples(), tuple(scenarios), attempts.first_number)
+    st.markdown("**Profit by scenario and attempt**")
+    st.dataframe(matrix, use_container_width=True)
+    result = attempts.result(-1)
+    if "Competitors" in result:
+        st.caption("Scenarios leave out your classmates' cars: each design is shown with its segment to itself.")
+
+    names = [scenario.name for scenario in scenarios]
+    choice = st.selectbox("See how your final design fares under", names, key="scenario_choice")
+    if choice != "Baseline":
+        row = names.index(choice)
+        sales = int(outcomes.sales[row, -1])
+        profit = float(outcomes.profit[row, -1])
+        baseline_profit = int(outcomes.profit[0, -1])
+        record_scenario_event(
+            attempts.number(-1), attempts.design(-1), scenarios[row], result['Best Market Segment'], sales, profit, baseline_profit
+        )
+        st.markdown(f"""
+        <div class="custom-container-tariff">
+            <h2 class="header-orange">📊 Updated Market Results ({choice})</h2>
+            <p><strong>Best Market Segment:</strong> {result['Best Market Segment']}</p>
+            <p><strong>Estimated Sales:</strong> {sales} units</p>
+            <p><strong>Original Profit:</strong> ${baseline_profit:,}</p>
+            <p><strong>New Estimated Profit:</strong> ${profit:,.2f}</p>
+            <p><strong>Profit Change:</strong> ${profit - baseline_profit:,.2f}</p>
+            <div class="section-divider">
+                <h3 class="header-orange">💡 Updated Profit Feedback</h3>
+                <p>{get_feedback_for_profit(profit, sales)}</p>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
 
-# Playing the game or game over state
-elif st.session_state.game_state == "playing" or st.session_state.game_state == "game_over":
-    # Use a two-column layout for the main game interface
-    main_col1, main_col2 = st.columns([1, 2])
-    
-    # Left column for car design controls
-    with main_col1:
+# Design controls: attempt counter, previous attempts and the car sliders. A fragment, so
+# dragging a slider or typing a price only reruns this panel; "Simulate Market" then
+# reruns the whole app to show the new results.
+@st.fragment
+def design_controls_panel():
+    with span("sliders"):
         st.markdown(f"""
         <div class="attempt-counter">
             Attempt {st.session_state.attempts_used + 1} of 3
         </div>
         """, unsafe_allow_html=True)
-        
+
         # Show previous attempts 
-        if len(st.session_state.attempts_results) > 0:
+        attempts = st.session_state.attempts
+        if len(attempts) > 0:
             st.markdown("### Previous Attempts")
-            for i, (design, result) in enumerate(zip(st.session_state.car_designs, st.session_state.attempts_results)):
-                with st.expander(f"Attempt {i+1}: ${result['Profit']:,}"):
-                    st.write(f"**Market:** {result['Best Market Segment']}")
-                    st.write(f"**Sales:** {result['Estimated Sales']} units")
-                    st.write(f"**Settings:** Speed: {design['Speed']}, Aesthetics: {design['Aesthetics']}, " +
-                            f"Reliability: {design['Reliability']}, Efficiency: {design['Efficiency']}, " +
-                            f"Tech: {design['Tech']}, Price: ${design['Price']:,}")
-        
+            st.markdown("".join(
+                attempt_card_html(attempts.first_number + i, record) for i, record in enumerate(attempts.records().tolist())
+            ), unsafe_allow_html=True)
+
         # Design inputs
         st.markdown("### Customize Your Car")
-        
+
         # If we have previous attempts, use the best one as a starting point
         default_speed = 5
         default_aesthetics = 5
@@ -449,22 +341,20 @@ elif st.session_state.game_state == "playing" or st.session_state.game_state ==
         default_efficiency = 5
         default_tech = 5
         default_price = 30000
-        
-        if len(st.session_state.attempts_results) > 0:
+
+        if len(attempts) > 0:
             # Find best previous attempt
-            profits = [result['Profit'] for result in st.session_state.attempts_results]
-            best_idx = profits.index(max(profits))
-            best_design = st.session_state.car_designs[best_idx]
-            
+            best_design = attempts.design(attempts.best_index())
+
             default_speed = best_design['Speed']
             default_aesthetics = best_design['Aesthetics']
             default_reliability = best_design['Reliability']
             default_efficiency = best_design['Efficiency'] 
             default_tech = best_design['Tech']
             default_price = best_design['Price']
-        
+
         disabled = st.session_state.game_state == "game_over"
-        
+
         with st.container():
             st.markdown('<div class="settings-panel">', unsafe_allow_html=True)
             speed = st.slider("Speed", 1, 10, default_speed, disabled=disabled, 
@@ -477,196 +367,344 @@ elif st.session_state.game_state == "playing" or st.session_state.game_state ==
                                  help="Higher efficiency increases cost but appeals to Eco-Friendly segment")
             tech = st.slider("Technology", 1, 10, default_tech, disabled=disabled,
                            help="Higher tech increases cost but appeals to Luxury & Sports segments")
-            price = st.number_input("Price ($)", min_value=10000, max_value=200000, value=default_price, step=1000, disabled=disabled)
+            price = st.number_input("Price ($)", min_value=PRICE_MIN, max_value=PRICE_MAX, value=default_price, step=PRICE_STEP, disabled=disabled)
             st.markdown('</div>', unsafe_allow_html=True)
-            
+
+            # Speculatively start the final image while the third attempt is being designed
+            if st.session_state.game_state == "playing" and st.session_state.attempts_used == 2:
+                prefetch_car_image(st.session_state, build_car_image_prompt(speed, aesthetics, reliability, efficiency, tech, price))
+
             # Simulate market button (only show during playing state)
             if st.session_state.game_state == "playing":
                 sim_button = st.button("Simulate Market", type="primary")
                 if sim_button:
                     with st.spinner("Simulating market performance..."):
-                        # Reset tariff state when simulating new market
-                        st.session_state.tariff_applied = False
-                        
                         # Store design for future reference
-                        st.session_state.car_designs.append({
+                        design = {
                             "Speed": speed,
                             "Aesthetics": aesthetics, 
                             "Reliability": reliability,
                             "Efficiency": efficiency,
                             "Tech": tech,
                             "Price": price
-                        })
-                        
+                        }
+
                         # Simulate market
-                        st.session_state.result = simulate_market_performance(speed, aesthetics, reliability, efficiency, tech, price)
-                        st.session_state.attempts_results.append(st.session_state.result)
+                        with span("simulate_market_performance"):
+                            if st.session_state.class_code:
+                                # Competitive mode: attempt N joins round N of the class market
+                                result = submit_class_design(
+                                    st.session_state.class_code, st.session_state.attempts_used + 1, get_script_run_ctx().session_id,
+                                    (speed, aesthetics, reliability, efficiency, tech, price)
+                                )
+                            else:
+                                result = simulate_market_performance(speed, aesthetics, reliability, efficiency, tech, price)
+                        attempts.append(design, result)
                         st.session_state.attempts_used += 1
-                        
-                        # Generate AI image only on final attempt
+                        record_simulation_event(st.session_state.attempts_used, design, result)
+                        if st.session_state.player_name:
+                            record_leaderboard_attempt(st.session_state.player_name, design, result)
+
+                        # Generate AI image only on final attempt, in the background
                         if st.session_state.attempts_used >= 3:
-                            st.session_state.car_image_url = generate_car_image(speed, aesthetics, reliability, efficiency, tech, price)
+                            st.session_state.car_image_url = None
+                            st.session_state.car_image_future = take_car_image(
+                                st.session_state, build_car_image_prompt(speed, aesthetics, reliability, efficiency, tech, price)
+                            )
                             st.session_state.game_state = "game_over"
-                        
+
                         st.rerun()
-    
-    # Right column for results display
-    with main_col2:
-        st.markdown('<div class="results-panel">', unsafe_allow_html=True)
-        
-        # Display results if we have them
-        if st.session_state.result is not None:
+
+# Streamlit UI
+def main():
+    try:
+        st.set_page_config(page_title="Business Administration Car Market Simulation Game", layout="wide", initial_sidebar_state="expanded")
+    except Exception:
+        # This means the page config was already set, which is fine
+        pass
+
+    # Improved CSS with better responsive layout and smaller start button
+    with span("css"):
+        assets = static_assets()
+        st.markdown(assets["css"], unsafe_allow_html=True)
+
+    # Initialize session state
+    if 'game_state' not in st.session_state:
+        st.session_state.game_state = "instructions"  # States: instructions, playing, game_over
+    if 'car_image_url' not in st.session_state:
+        st.session_state.car_image_url = None
+    if 'car_image_future' not in st.session_state:
+        st.session_state.car_image_future = None
+    if 'image_prefetch' not in st.session_state:
+        st.session_state.image_prefetch = None
+    if 'attempts_used' not in st.session_state:
+        st.session_state.attempts_used = 0
+    if 'attempts' not in st.session_state:
+        st.session_state.attempts = AttemptLog()  # Compact history of designs and results
+    if 'player_name' not in st.session_state:
+        st.session_state.player_name = ""
+    if 'class_code' not in st.session_state:
+        st.session_state.class_code = ""
+    if 'production_run' not in st.session_state:
+        st.session_state.production_run = None  # Last multi-year run, resumed from on the next change
+
+    # Logo and header in the same row
+
+    # Create centered container for the header
+    with span("header"):
+        st.markdown('<div style="max-width: 900px; margin: 0 auto; padding: 10px;">', unsafe_allow_html=True)
+        col1, col2 = st.columns([1, 5])
+        with col1:
             try:
-                # Display car image only on final attempt if available
-                if st.session_state.game_state == "game_over" and st.session_state.car_image_url and "Error" not in st.session_state.car_image_url:
-                    try:
-                        # Add attractive box about AI-generated image with better contrast
-                        st.markdown("""
-                        <div style="background-color: #3498db; color: white; padding: 12px; 
-                        border-radius: 5px; text-align: center; margin-bottom: 10px; font-weight: bold;
-                        box-shadow: 0 2px 4px rgba(0,0,0,0.2);">
-                        ✨ This image is uniquely generated by AI based on your chosen customization ✨
-                        </div>
-                        """, unsafe_allow_html=True)
-                        st.image(st.session_state.car_image_url, use_container_width=True)
-                    except:
-                        st.write("Unable to display car image")
-                
-                # Show attempts left or final status
-                if st.session_state.game_state == "playing":
-                    attempts_left = 3 - st.session_state.attempts_used
-                    st.markdown(f"<div class='attempt-counter'>You have {attempts_left} attempt{'s' if attempts_left != 1 else ''} left</div>", unsafe_allow_html=True)
-                else:
-                    st.markdown("<div class='attempt-counter'>Final Result</div>", unsafe_allow_html=True)
-                
-                # Display results
-                result = st.session_state.result
-                st.markdown(f"""
-                <div class="custom-container">
-                    <h2 class="header-green">📊 Market Simulation Results</h2>
-                    <p><strong>Best Market Segment:</strong> {result['Best Market Segment']}</p>
-                    <p><strong>Estimated Sales:</strong> {result['Estimated Sales']} units</p>
-                    <p><strong>Estimated Profit:</strong> ${result['Profit']:,}</p>
-                    <div class="section-divider">
-                        <h3 class="header-orange">💡 Profit Feedback</h3>
-                        <p>{result['Feedback']}</p>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Display tariff information if it has been applied
-                if st.session_state.tariff_applied:
-                    tariffed_cost = st.session_state.result['Cost'] * 1.25  # Adding 25% tariff
-                    latest_design = st.session_state.car_designs[-1]
-                    tariffed_profit = st.session_state.result['Estimated Sales'] * (latest_design['Price'] - tariffed_cost)
-                    tariffed_feedback = get_feedback_for_profit(tariffed_profit, st.session_state.result['Estimated Sales'])
-                    
+                if assets["logo"] is not None:
+                    st.image(assets["logo"], width=LOGO_WIDTH)
+            except:
+                pass  # Skip if logo doesn't load
+        with col2:
+            st.markdown("<h1 style='margin-top: 25px;'>Business Administration Car Market Simulation Game</h1>", unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+
+    # Instructor analytics instead of the game
+    if INSTRUCTOR_KEY and st.query_params.get("instructor") == INSTRUCTOR_KEY:
+        instructor_panel()
+
+    # Instructions screen
+    elif st.session_state.game_state == "instructions":
+        with span("instructions"):
+            st.markdown("""
+            <div class="instructions-container">
+                <h2 style="color: #3498db; text-align: center;">Welcome to the Car Market Simulator!</h2>
+                <hr>
+                <h3>Game Instructions:</h3>
+                <ol>
+                    <li><strong>Objective:</strong> Design a profitable car by adjusting its features and price.</li>
+                    <li><strong>You have 3 attempts</strong> to create a profitable car design.</li>
+                    <li>Customize your car's specifications using the sliders.</li>
+                    <li>Click "Simulate Market" to see how your car performs.</li>
+                    <li>Learn from each attempt and adjust your strategy.</li>
+                    <li>After your third attempt, you'll see an AI-generated image of your final car design.</li>
+                    <li>Playing with your class? Enter the class code from your instructor and your cars will compete for the same buyers as everyone else's.</li>
+                    <li>At the end, the "What-If Scenarios" table shows how tariffs, parts prices, currency moves and demand swings would affect the profit of each of your designs.</li>
+                </ol>
+                <p style="text-align: center; font-weight: bold;">Good luck with your car design!</p>
+            </div>
+            """, unsafe_allow_html=True)
+
+            # Optional name for the class leaderboard
+            player_name = st.text_input("Your name for the class leaderboard (optional)", value=st.session_state.player_name, max_chars=40)
+
+            # Optional class code: everyone with the same code shares one competitive market
+            class_code = st.text_input("Class code for competitive mode (optional)", value=st.session_state.class_code, max_chars=20)
+
+            # Using a more aggressive approach with columns to constrain button width
+            col1, col2, col3 = st.columns([1, 1, 1])
+            with col2:
+                st.markdown('<div style="width: 120px; margin: 0 auto;">', unsafe_allow_html=True)
+                start_button = st.button("Start Game", key="start_game_button", help="Click to start the game", type="primary")
+                st.markdown('</div>', unsafe_allow_html=True)
+            if start_button:
+                st.session_state.player_name = player_name.strip()
+                st.session_state.class_code = class_code.strip().upper()
+                st.session_state.game_state = "playing"
+                st.session_state.attempts_used = 0
+                st.session_state.attempts = AttemptLog()
+                st.rerun()
+
+    # Playing the game or game over state
+    elif st.session_state.game_state == "playing" or st.session_state.game_state == "game_over":
+        attempts = st.session_state.attempts
+
+        # Use a two-column layout for the main game interface
+        main_col1, main_col2 = st.columns([1, 2])
+
+        # Left column for car design controls
+        with main_col1:
+            design_controls_panel()
+
+        # Right column for results display
+        with main_col2, span("results"):
+            st.markdown('<div class="results-panel">', unsafe_allow_html=True)
+
+            # Display results if we have them
+            if len(attempts) > 0:
+                try:
+                    # Display car image only on final attempt if available
+                    if st.session_state.game_state == "game_over" and st.session_state.car_image_future is not None:
+                        pending_car_image_panel()
+                    elif st.session_state.game_state == "game_over" and st.session_state.car_image_url and "Error" not in st.session_state.car_image_url:
+                        try:
+                            # Add attractive box about AI-generated image with better contrast
+                            st.markdown("""
+                            <div style="background-color: #3498db; color: white; padding: 12px; 
+                            border-radius: 5px; text-align: center; margin-bottom: 10px; font-weight: bold;
+                            box-shadow: 0 2px 4px rgba(0,0,0,0.2);">
+                            ✨ This image is uniquely generated by AI based on your chosen customization ✨
+                            </div>
+                            """, unsafe_allow_html=True)
+                            st.image(st.session_state.car_image_url, use_container_width=True)
+                        except:
+                            st.write("Unable to display car image")
+
+                    # Show attempts left or final status
+                    if st.session_state.game_state == "playing":
+                        attempts_left = 3 - st.session_state.attempts_used
+                        st.markdown(f"<div class='attempt-counter'>You have {attempts_left} attempt{'s' if attempts_left != 1 else ''} left</div>", unsafe_allow_html=True)
+                    else:
+                        st.markdown("<div class='attempt-counter'>Final Result</div>", unsafe_allow_html=True)
+
+                    # Display results
+                    result = attempts.result(-1)
+                    competition_html = ""
+                    if "Competitors" in result:
+                        competition_html = (
+                            f"<p><strong>Class Competition:</strong> {result['Competitors']} other car{'s' if result['Competitors'] != 1 else ''} "
+                            f"in this segment when you launched; you won {result['Market Share']:.1%} of its sales</p>"
+                        )
                     st.markdown(f"""
-                    <div class="custom-container-tariff">
-                        <h2 class="header-orange">📊 Updated Market Results (After Tariff)</h2>
-                        <p><strong>Best Market Segment:</strong> {st.session_state.result['Best Market Segment']}</p>
-                        <p><strong>Estimated Sales:</strong> {st.session_state.result['Estimated Sales']} units</p>
-                        <p><strong>Original Profit:</strong> ${st.session_state.result['Profit']:,}</p>
-                        <p><strong>New Estimated Profit:</strong> ${tariffed_profit:,.2f}</p>
-                        <p><strong>Profit Change:</strong> ${tariffed_profit - st.session_state.result['Profit']:,.2f}</p>
+                    <div class="custom-container">
+                        <h2 class="header-green">📊 Market Simulation Results</h2>
+                        <p><strong>Best Market Segment:</strong> {result['Best Market Segment']}</p>
+                        <p><strong>Estimated Sales:</strong> {result['Estimated Sales']} units</p>
+                        <p><strong>Estimated Profit:</strong> ${result['Profit']:,}</p>
+                        {competition_html}
                         <div class="section-divider">
-                            <h3 class="header-orange">💡 Updated Profit Feedback</h3>
-                            <p>{tariffed_feedback}</p>
+                            <h3 class="header-orange">💡 Profit Feedback</h3>
+                            <p>{result['Feedback']}</p>
                         </div>
                     </div>
                     """, unsafe_allow_html=True)
-                
-                # Game over summary at the end
-                if st.session_state.game_state == "game_over":
-                    # Calculate best attempt
-                    profits = [result['Profit'] for result in st.session_state.attempts_results]
-                    best_attempt_index = profits.index(max(profits))
-                    best_attempt = st.session_state.attempts_results[best_attempt_index]
-                    best_design = st.session_state.car_designs[best_attempt_index]
-                    
-                    st.markdown("""
-                    <div class="section-divider"></div>
-                    <h2 style="text-align: center; margin-top: 20px;">Game Summary</h2>
-                    """, unsafe_allow_html=True)
-                    
-                    # Best design callout
+
+                    # Break-even range and most profitable price for the latest design's features
+                    design = attempts.design(-1)
+                    solution = price_solution(tuple(design[column] for column in DESIGN_COLUMNS[:5]))
+                    if solution.break_even_low is None:
+                        price_html = (
+                            f"<p>At no price from ${PRICE_MIN:,} to ${PRICE_MAX:,} does this design both sell and cover its "
+                            f"${solution.cost:,} cost per car. Match a segment more closely or cut costly features.</p>"
+                        )
+                    else:
+                        price_html = (
+                            f"<p><strong>Break-Even Prices:</strong> ${solution.break_even_low:,} to ${solution.break_even_high:,} "
+                            f"(the car sells and covers its ${solution.cost:,} cost per car)</p>"
+                        )
+                        if solution.best_price is None:
+                            price_html += "<p>No price makes a profit with these features; at best the car breaks even.</p>"
+                        else:
+                            price_html += (
+                                f"<p><strong>Most Profitable Price:</strong> ${solution.best_price:,}, selling {solution.best_sales:,} units "
+                                f"for ${solution.best_profit:,} profit</p>"
+                            )
+                            if design['Price'] == solution.best_price:
+                                price_html += "<p>You found the most profitable price for this design!</p>"
+                            else:
+                                price_html += f"<p>You charged ${design['Price']:,}.</p>"
+                    if "Competitors" in result:
+                        price_html += "<p><em>These prices leave out your classmates' cars in the same segment.</em></p>"
                     st.markdown(f"""
-                    <div style="background-color: #e8f4f8; padding: 15px; border-radius: 10px; border: 2px solid #3498db; margin-bottom: 20px;">
-                        <h3 style="color: #3498db; text-align: center;">🏆 Best Performing Design: Attempt {best_attempt_index+1}</h3>
-                        <p><strong>Profit:</strong> ${best_attempt['Profit']:,}</p>
-                        <p><strong>Market Segment:</strong> {best_attempt['Best Market Segment']}</p>
-                        <p><strong>Settings:</strong> Speed: {best_design['Speed']}, Aesthetics: {best_design['Aesthetics']}, 
-                        Reliability: {best_design['Reliability']}, Efficiency: {best_design['Efficiency']}, 
-                        Tech: {best_design['Tech']}, Price: ${best_design['Price']:,}</p>
+                    <div class="custom-container">
+                        <h3 class="header-orange">💲 Price Check: What Should You Have Charged?</h3>
+                        {price_html}
                     </div>
                     """, unsafe_allow_html=True)
-                    
-                    # Create a DataFrame for the summary
-                    import pandas as pd
-                    summary_data = []
-                    for i, (design, result) in enumerate(zip(st.session_state.car_designs, st.session_state.attempts_results)):
-                        is_best = i == best_attempt_index
-                        best_badge = "🏆 " if is_best else ""
-                        summary_data.append({
-                            "Attempt": f"{best_badge}Attempt {i+1}",
-                            "Market Segment": result['Best Market Segment'],
-                            "Sales": result['Estimated Sales'],
-                            "Profit": f"${result['Profit']:,}",
-                            "Speed": design['Speed'],
-                            "Aesthetics": design['Aesthetics'],
-                            "Reliability": design['Reliability'],
-                            "Efficiency": design['Efficiency'],
-                            "Tech": design['Tech'],
-                            "Price": f"${design['Price']:,}"
-                        })
-                    
-                    summary_df = pd.DataFrame(summary_data)
-                    
-                    # Display the summary table
-                    st.markdown("### All Attempts Comparison")
-                    st.dataframe(summary_df, use_container_width=True)
-                    
-                    # Educational message about relevant courses
-                    st.markdown("""
-                    <div style="background-color: #e6f7ff; padding: 15px; border-radius: 10px; border: 2px solid #1890ff; margin: 20px 0;">
-                        <h3 style="color: #1890ff; margin-top: 0;">📚 Educational Note</h3>
-                        <p>Taking courses at Coast Mountain College such as <strong>Introduction to Marketing</strong> and <strong>Business Finance</strong> would help you understand markets and how to price products accordingly!</p>
-                        <p>Interested in more information? Visit the <a href="https://coastmountaincollege.ca/programs/study/business" target="_blank">Coast Mountain College Business Administration website</a></p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Tariff button after 3rd attempt if not already applied
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if not st.session_state.tariff_applied:
-                            # Fix for tariff button disappearing
-                            tariff_button = st.button(
-                                "Impose Trump Tariff +25%", 
-                                key="apply_tariff",
-                                type="secondary"
-                            )
-                            if tariff_button:
-                                st.session_state.tariff_applied = True
-                                st.rerun()
-                                st.session_state.tariff_applied = True
-                                st.rerun()
-                    
-                    with col2:
+
+                    # Profit explorer around the latest design
+                    profit_explorer_panel(attempts.design(-1))
+
+                    # Optional Monte Carlo view of the latest design
+                    demand_uncertainty_panel(attempts.design(-1))
+
+                    # Optional multi-year production plan for the latest design
+                    production_panel(attempts.design(-1), result['Estimated Sales'])
+
+                    # Game over summary at the end
+                    if st.session_state.game_state == "game_over":
+                        # Calculate best attempt
+                        best_attempt_index = attempts.best_index()
+                        best_attempt = attempts.result(best_attempt_index)
+                        best_design = attempts.design(best_attempt_index)
+
+                        st.markdown("""
+                        <div class="section-divider"></div>
+                        <h2 style="text-align: center; margin-top: 20px;">Game Summary</h2>
+                        """, unsafe_allow_html=True)
+
+                        # Best design callout
+                        st.markdown(f"""
+                        <div style="background-color: #e8f4f8; padding: 15px; border-radius: 10px; border: 2px solid #3498db; margin-bottom: 20px;">
+                            <h3 style="color: #3498db; text-align: center;">🏆 Best Performing Design: Attempt {attempts.number(best_attempt_index)}</h3>
+                            <p><strong>Profit:</strong> ${best_attempt['Profit']:,}</p>
+                            <p><strong>Market Segment:</strong> {best_attempt['Best Market Segment']}</p>
+                            <p><strong>Settings:</strong> Speed: {best_design['Speed']}, Aesthetics: {best_design['Aesthetics']}, 
+                            Reliability: {best_design['Reliability']}, Efficiency: {best_design['Efficiency']}, 
+                            Tech: {best_design['Tech']}, Price: ${best_design['Price']:,}</p>
+                        </div>
+                        """, unsafe_allow_html=True)
+
+                        # What was achievable under the current market model
+                        if market_segments.checksum is not None:
+                            best_possible = achievable_designs(market_segments.checksum, 1).iloc[0]
+                            share = best_attempt['Profit'] / best_possible['Profit'] * 100 if best_possible['Profit'] > 0 else 0
+                            st.markdown(f"""
+                            <div style="background-color: #f0f9eb; padding: 15px; border-radius: 10px; border: 2px solid #4CAF50; margin-bottom: 20px;">
+                                <h3 style="color: #4CAF50; text-align: center;">🎯 What Was Achievable</h3>
+                                <p><strong>Best Possible Profit:</strong> ${best_possible['Profit']:,}</p>
+                                <p><strong>Market Segment:</strong> {best_possible['Best Market Segment']}</p>
+                                <p><strong>Settings:</strong> Speed: {best_possible['Speed']}, Aesthetics: {best_possible['Aesthetics']}, 
+                                Reliability: {best_possible['Reliability']}, Efficiency: {best_possible['Efficiency']}, 
+                                Tech: {best_possible['Tech']}, Price: ${best_possible['Price']:,}</p>
+                                <p><strong>Your best design reached:</strong> {share:.1f}% of the best possible profit</p>
+                            </div>
+                            """, unsafe_allow_html=True)
+
+                        # Summary of all attempts (cached until the attempts change)
+                        summary_df = attempts_summary_table(attempts.records(), attempts.first_number, best_attempt_index)
+
+                        # Display the summary table
+                        st.markdown("### All Attempts Comparison")
+                        st.dataframe(summary_df, use_container_width=True)
+
+                        # Class leaderboard: best profit per student, overall and in this design's segment
+                        class_leaderboard_panel(best_attempt['Best Market Segment'])
+
+                        # What-if scenarios across all attempts
+                        scenario_panel(attempts)
+
+                        # Educational message about relevant courses
+                        st.markdown("""
+                        <div style="background-color: #e6f7ff; padding: 15px; border-radius: 10px; border: 2px solid #1890ff; margin: 20px 0;">
+                            <h3 style="color: #1890ff; margin-top: 0;">📚 Educational Note</h3>
+                            <p>Taking courses at Coast Mountain College such as <strong>Introduction to Marketing</strong> and <strong>Business Finance</strong> would help you understand markets and how to price products accordingly!</p>
+                            <p>Interested in more information? Visit the <a href="https://coastmountaincollege.ca/programs/study/business" target="_blank">Coast Mountain College Business Administration website</a></p>
+                        </div>
+                        """, unsafe_allow_html=True)
+
                         # New game button
                         if st.button("Start New Game", key="new_game_button", type="primary"):
                             reset_game()
                             st.rerun()
-            
-            except Exception as e:
-                st.error(f"Error displaying results: {str(e)}")
-        
-        # Show a placeholder message if no results to display yet
-        else:
-            st.markdown("""
-            <div style="text-align: center; padding: 30px; background-color: #f5f5f5; border-radius: 10px;">
-                <h3>Your results will appear here</h3>
-                <p>Adjust the car settings on the left and click "Simulate Market" to see how your design performs.</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-        st.markdown('</div>', unsafe_allow_html=True)
+
+                except Exception as e:
+                    st.error(f"Error displaying results: {str(e)}")
+
+            # Show a placeholder message if no results to display yet
+            else:
+                st.markdown("""
+                <div style="text-align: center; padding: 30px; background-color: #f5f5f5; border-radius: 10px;">
+                    <h3>Your results will appear here</h3>
+                    <p>Adjust the car settings on the left and click "Simulate Market" to see how your design performs.</p>
+                </div>
+                """, unsafe_allow_html=True)
+
+            st.markdown('</div>', unsafe_allow_html=True)
+
+    # Per-session memory: exported with the metrics, and shown with ?debug=memory
+    observe_session_memory(lambda: session_memory_report(st.session_state))
+    if st.query_params.get("debug") == "memory":
+        report = session_memory_report(st.session_state)
+        with st.expander(f"Session memory: {sum(report.values()):,} bytes", expanded=True):
+            st.dataframe({"Key": list(report), "Bytes": list(report.values())}, hide_index=True)
+
+# "streamlit run" executes this file inside a script run context; importing it renders nothing
+if __name__ == "__main__" and get_script_run_ctx() is not None:
+    with span("rerun"):
+        main()
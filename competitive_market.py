@@ -0,0 +1,178 @@
+import threading
+
+import numpy as np
+
+import market_model
+from market_model import DESIGN_COLUMNS, FEEDBACK_MESSAGES, PROFIT_TIER_BOUNDS, get_feedback_tier
+
+# Competitive market: every car in a class session still sells to its best-matching
+# segment, but cars in the same segment now split its buyers instead of each taking the
+# whole Market_Size. A car's attractiveness is its solo purchase rate
+#   a = (1 - score / 50) * price_factor
+# A buyer in the segment buys if at least one car appeals to them, so the segment sells
+#   market_size * (1 - prod(1 - a))
+# cars in total, shared between its cars in proportion to a. A car alone in its segment
+# sells exactly what simulate_market_performance predicts.
+#
+# clear_market() clears a whole round at once. CompetitiveMarket keeps per-segment totals
+# and updates them in O(1) when one student submits, so a class of thousands never needs
+# to be re-cleared for a single click.
+
+# Per-design match and solo demand: (segment, attractiveness, solo sales before truncation, cost)
+def _design_demand(segments, speed, aesthetics, reliability, efficiency, tech, price):
+    best, best_score, cost = market_model._match_designs(segments, speed, aesthetics, reliability, efficiency, tech)
+    avg_price = segments.avg_price[best]
+    price_factor = np.maximum(0, 1 - abs(price - avg_price) / avg_price)
+    appeal = 1 - best_score / 50
+    solo = segments.market_size[best] * appeal * price_factor
+    return best, np.maximum(0, appeal * price_factor), solo, cost
+
+# Fraction of its solo sales each car keeps, from the per-segment totals:
+# count of cars, cars with a == 1, sum of a and sum of log(1 - a) over the other cars
+def _sales_factor(count, saturated, total, log_miss):
+    coverage = np.where(saturated > 0, 1.0, -np.expm1(log_miss))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = np.where(total > 0, coverage / total, 0.0)
+    return np.where(count == 1, 1.0, factor)
+
+def _outcome_frame(segments, best, sales, price, cost, share, count, index=None):
+    import pandas as pd
+
+    profit = sales * (price - cost)
+    tier = 1 + np.searchsorted(PROFIT_TIER_BOUNDS, profit, side="right")
+    tier[sales == 0] = 0
+    return pd.DataFrame({
+        "Feedback": np.asarray(FEEDBACK_MESSAGES, dtype=object)[tier],
+        "Best Market Segment": segments.names[best],
+        "Estimated Sales": sales,
+        "Profit": profit,
+        "Cost": cost,
+        "Market Share": share,
+        "Competitors": count - 1
+    }, index=index)
+
+# Clear one round: every design in `designs` (a DataFrame with DESIGN_COLUMNS) competes
+# against all the others. Returns simulate_market_batch's columns plus each car's share of
+# its segment's sales and the number of competitors it faced.
+def clear_market(designs):
+    segments = market_model.market_segments
+    features = [designs[column].to_numpy() for column in DESIGN_COLUMNS]
+    best, appeal, solo, cost = _design_demand(segments, *features)
+    n_segments = len(segments.names)
+    count = np.bincount(best, minlength=n_segments)
+    saturated = np.bincount(best, weights=appeal >= 1, minlength=n_segments)
+    total = np.bincount(best, weights=appeal, minlength=n_segments)
+    with np.errstate(divide="ignore"):
+        log_miss = np.bincount(best, weights=np.where(appeal < 1, np.log1p(-np.minimum(appeal, 1)), 0.0), minlength=n_segments)
+    factor = _sales_factor(count, saturated, total, log_miss)[best]
+    sales = (solo * factor).astype(np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = np.where(total[best] > 0, appeal / total[best], 0.0)
+    share[count[best] == 1] = 1.0
+    return _outcome_frame(segments, best, sales, features[5], cost, share, count[best], designs.index)
+
+# Clear every round of a class session; `round_column` names the column that says which
+# round each design belongs to
+def clear_market_rounds(designs, round_column="Round"):
+    import pandas as pd
+
+    return pd.concat([clear_market(round_designs) for _, round_designs in designs.groupby(round_column, sort=False)]).loc[designs.index]
+
+# A live market for one class session round. Students submit (or resubmit) one design
+# each; every submission updates the segment totals incrementally and returns that
+# student's outcome against everyone currently in the market. Safe to share between
+# session threads.
+class CompetitiveMarket:
+    def __init__(self, segments=None):
+        self.segments = segments if segments is not None else market_model.market_segments
+        n_segments = len(self.segments.names)
+        self._designs = {}
+        self._count = np.zeros(n_segments, dtype=np.int64)
+        self._saturated = np.zeros(n_segments, dtype=np.int64)
+        self._total = np.zeros(n_segments)
+        self._log_miss = np.zeros(n_segments)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._designs)
+
+    # Add (sign=1) or remove (sign=-1) one car's contribution to its segment's totals
+    def _apply(self, demand, sign):
+        segment, appeal = demand[0], demand[1]
+        self._count[segment] += sign
+        if self._count[segment] == 0:
+            # Reset instead of subtracting, so rounding never leaves a residue in an empty segment
+            self._saturated[segment] = 0
+            self._total[segment] = 0.0
+            self._log_miss[segment] = 0.0
+            return
+        self._total[segment] += sign * appeal
+        if appeal >= 1:
+            self._saturated[segment] += sign
+        else:
+            self._log_miss[segment] += sign * np.log1p(-appeal)
+
+    def submit(self, player, speed, aesthetics, reliability, efficiency, tech, price):
+        index = market_model.design_table_index(speed, aesthetics, reliability, efficiency, tech)
+        table = market_model.load_design_table(self.segments) if index is not None else None
+        if table is not None:
+            # Slider designs: scalar table lookup, as in simulate_market_performance
+            segment = table.segment.item(index)
+            _, avg_price, market_size, _ = self.segments.rows[segment]
+            price_factor = max(0, 1 - abs(price - avg_price) / avg_price)
+            appeal = 1 - table.score.item(index) / 50
+            demand = (segment, max(0, appeal * price_factor), market_size * appeal * price_factor, table.cost.item(index), price)
+        else:
+            best, appeal, solo, cost = _design_demand(self.segments, *(np.array([value]) for value in (speed, aesthetics, reliability, efficiency, tech, price)))
+            demand = (best.item(0), appeal.item(0), solo.item(0), cost.item(0), price)
+        with self._lock:
+            previous = self._designs.get(player)
+            if previous is not None:
+                self._apply(previous, -1)
+            self._designs[player] = demand
+            self._apply(demand, 1)
+            return self._outcome(demand)
+
+    def withdraw(self, player):
+        with self._lock:
+            demand = self._designs.pop(player, None)
+            if demand is not None:
+                self._apply(demand, -1)
+
+    def _outcome(self, demand):
+        segment, appeal, solo, cost, price = demand
+        count, total = self._count[segment], self._total[segment]
+        factor = _sales_factor(count, self._saturated[segment], total, self._log_miss[segment]).item()
+        sales = int(solo * factor)
+        profit = sales * (price - cost)
+        return {
+            "Feedback": FEEDBACK_MESSAGES[get_feedback_tier(profit, sales)],
+            "Best Market Segment": self.segments.names[segment],
+            "Estimated Sales": sales,
+            "Profit": profit,
+            "Cost": cost,
+            "Market Share": 1.0 if count == 1 else (appeal / total.item() if total > 0 else 0.0),
+            "Competitors": int(count) - 1
+        }
+
+    # Current outcome of one student's design, or None if they haven't submitted
+    def outcome(self, player):
+        with self._lock:
+            demand = self._designs.get(player)
+            return self._outcome(demand) if demand is not None else None
+
+    # Current outcomes of every design in the market, one row per player
+    def results(self):
+        import pandas as pd
+
+        with self._lock:
+            players = list(self._designs)
+            if not players:
+                return _outcome_frame(self.segments, np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64))
+            segment, appeal, solo, cost, price = (np.array(values) for values in zip(*self._designs.values()))
+            count, total = self._count[segment], self._total[segment]
+            factor = _sales_factor(count, self._saturated[segment], total, self._log_miss[segment])
+        sales = (solo * factor).astype(np.int64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = np.where(count == 1, 1.0, np.where(total > 0, appeal / total, 0.0))
+        return _outcome_frame(self.segments, segment, sales, price, cost, share, count, pd.Index(players, name="Player"))
@@ -0,0 +1,306 @@
+import atexit
+import bisect
+import collections
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+
+# Append-only log of every simulation and scenario (tariff) event, for course analytics.
+# Sessions only enqueue a tuple; one background thread per process collects events for up
+# to FLUSH_INTERVAL seconds (or BATCH_SIZE events) and writes each batch as one
+# zstd-compressed Arrow IPC file, partitioned by UTC day in the hive layout
+#   <EVENT_LOG_DIR>/day=2026-10-18/part-<unix ms>-<pid>-<n>.arrow
+# so pyarrow.dataset(..., format="ipc", partitioning="hive"), pandas.read_feather or
+# DuckDB can read the whole log or a date range directly, and pyarrow.dataset can rewrite
+# it as Parquet in one call. Arrow IPC rather than Parquet because the writer then only
+# needs the core pyarrow module, which pandas has usually loaded already: loading the
+# Parquet library for the first flush in the middle of a class held up every session's
+# reruns for a couple of seconds.
+# Files appear atomically (written under a temporary name, then renamed) and are never
+# modified, which is what lets EventAnalytics fold in each file exactly once.
+# Set CAR_MARKET_EVENT_LOG_DIR to an empty string to turn logging off.
+# pyarrow is only imported by the writer thread and the analytics, not at start-up.
+EVENT_LOG_DIR = os.getenv(
+    "CAR_MARKET_EVENT_LOG_DIR",
+    os.path.join(os.getenv("CAR_MARKET_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")), "events")
+)
+FLUSH_INTERVAL = float(os.getenv("CAR_MARKET_EVENT_FLUSH_INTERVAL", "10"))
+BATCH_SIZE = 5000
+ANALYTICS_TTL = float(os.getenv("CAR_MARKET_EVENT_ANALYTICS_TTL", "5"))
+
+SIMULATE_EVENT = "simulate"
+SCENARIO_EVENT = "scenario"
+
+EVENT_FIELDS = (
+    "time", "event", "session", "player", "class_code", "attempt",
+    "speed", "aesthetics", "reliability", "efficiency", "tech", "price",
+    "segment", "sales", "profit", "cost", "competitors", "share",
+    "scenario", "tariff", "currency", "demand", "baseline_profit"
+)
+
+# Tariff impact histogram: profit change relative to the design's baseline profit, in
+# percent, clipped to the outer bins
+IMPACT_BINS = tuple(range(-100, 51, 10))
+
+# Columns EventAnalytics reads back
+_FOLD_COLUMNS = ["event", "session", "class_code", "attempt", "segment", "profit", "scenario", "baseline_profit"]
+
+# Marks a flush request in the writer queue
+_FLUSH = object()
+
+# Arrow schema for EVENT_FIELDS; `pa` is the pyarrow module. Times are UTC, stored
+# without a time zone: a zoned column makes pyarrow load its time zone database on the
+# first write, a few hundred milliseconds of CPU taken from every session's reruns.
+def event_schema(pa):
+    return pa.schema([
+        ("time", pa.timestamp("ms")), ("event", pa.string()), ("session", pa.string()),
+        ("player", pa.string()), ("class_code", pa.string()), ("attempt", pa.int16()),
+        ("speed", pa.int8()), ("aesthetics", pa.int8()), ("reliability", pa.int8()),
+        ("efficiency", pa.int8()), ("tech", pa.int8()), ("price", pa.int32()),
+        ("segment", pa.string()), ("sales", pa.int64()), ("profit", pa.float64()), ("cost", pa.float64()),
+        ("competitors", pa.int32()), ("share", pa.float32()),
+        ("scenario", pa.string()), ("tariff", pa.float32()), ("currency", pa.float32()), ("demand", pa.float32()),
+        ("baseline_profit", pa.float64())
+    ])
+
+class EventLog:
+    def __init__(self, directory=EVENT_LOG_DIR, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._files_written = 0
+
+    # Queue one simulation result; never blocks the caller on the disk
+    def record_simulation(self, session, player, class_code, attempt, design, result):
+        self._put((
+            time.time(), SIMULATE_EVENT, session, player, class_code, attempt,
+            design["Speed"], design["Aesthetics"], design["Reliability"], design["Efficiency"], design["Tech"], design["Price"],
+            result["Best Market Segment"], int(result["Estimated Sales"]), float(result["Profit"]), float(result["Cost"]),
+            result.get("Competitors"), result.get("Market Share"),
+            None, None, None, None, None
+        ))
+
+    # Queue one what-if result: `design` scored under `scenario` (a market_model.Scenario)
+    def record_scenario(self, session, player, class_code, attempt, design, scenario, segment, sales, profit, baseline_profit):
+        self._put((
+            time.time(), SCENARIO_EVENT, session, player, class_code, attempt,
+            design["Speed"], design["Aesthetics"], design["Reliability"], design["Efficiency"], design["Tech"], design["Price"],
+            segment, int(sales), float(profit), None, None, None,
+            scenario.name, scenario.tariff, scenario.currency, scenario.demand, float(baseline_profit)
+        ))
+
+    def _put(self, event):
+        self._queue.put(event)
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="event-log-writer", daemon=True)
+                    self._writer.start()
+                    atexit.register(self.flush)
+
+    # Write every queued event now and block until it is on disk
+    def flush(self):
+        if self._writer is not None:
+            self._queue.put(_FLUSH)
+            self._queue.join()
+
+    def _write_loop(self):
+        while True:
+            batch = []
+            first = self._queue.get()
+            flush = first is _FLUSH
+            if not flush:
+                batch.append(first)
+            deadline = time.monotonic() + self.flush_interval
+            while not flush and len(batch) < self.batch_size:
+                try:
+                    event = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if event is _FLUSH:
+                    flush = True
+                else:
+                    batch.append(event)
+            try:
+                if batch:
+                    self._write_batch(batch)
+            except Exception:
+                logging.getLogger(__name__).exception("Dropped %d analytics event(s)", len(batch))
+            finally:
+                for _ in range(len(batch) + flush):
+                    self._queue.task_done()
+
+    def _write_batch(self, batch):
+        import pyarrow as pa
+
+        schema = event_schema(pa)
+        days = collections.defaultdict(list)
+        for event in batch:
+            days[datetime.datetime.fromtimestamp(event[0], datetime.timezone.utc).date().isoformat()].append(event)
+        for day, events in days.items():
+            columns = list(zip(*events))
+            columns[0] = [int(seconds * 1000) for seconds in columns[0]]
+            table = pa.Table.from_arrays([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+            directory = os.path.join(self.directory, f"day={day}")
+            os.makedirs(directory, exist_ok=True)
+            self._files_written += 1
+            name = f"part-{int(time.time() * 1000)}-{os.getpid()}-{self._files_written}.arrow"
+            tmp_path = os.path.join(directory, f".{name}.tmp")
+            try:
+                with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd")) as writer:
+                    writer.write_table(table)
+                os.replace(tmp_path, os.path.join(directory, name))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+_event_log = None
+_event_log_lock = threading.Lock()
+
+# Process-wide event log shared by every session, or None when logging is turned off
+def get_event_log():
+    global _event_log
+    if _event_log is None and EVENT_LOG_DIR:
+        with _event_log_lock:
+            if _event_log is None:
+                _event_log = EventLog()
+    return _event_log
+
+# Running totals for one class code (or for everyone)
+class ClassAggregates:
+    __slots__ = ("sessions", "attempt_count", "attempt_profit", "attempt_profitable", "segment_counts", "first_profit",
+                 "improvements", "improved", "impact_counts", "impact_sums")
+
+    def __init__(self):
+        self.sessions = set()
+        # Per attempt number: simulations, summed profit, simulations with profit > 0
+        self.attempt_count = collections.Counter()
+        self.attempt_profit = collections.Counter()
+        self.attempt_profitable = collections.Counter()
+        # (attempt number, segment) -> simulations
+        self.segment_counts = collections.Counter()
+        # Attempt-1 profit of sessions that haven't reached attempt 3 yet
+        self.first_profit = {}
+        # Attempt 3 profit minus attempt 1 profit, for sessions that made both
+        self.improvements = []
+        self.improved = 0
+        # Scenario name -> tariff impact histogram (len(IMPACT_BINS) + 1 bins) and summed change
+        self.impact_counts = {}
+        self.impact_sums = collections.Counter()
+
+# Instructor aggregates over the whole event log, updated incrementally: refresh() lists
+# the day partitions and folds in only files it hasn't seen, so a page load costs a
+# directory listing plus the events written since the last one, never a rescan of the
+# whole log. Files from every app process sharing the directory are included.
+class EventAnalytics:
+    def __init__(self, directory=EVENT_LOG_DIR, ttl=ANALYTICS_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self.classes = collections.defaultdict(ClassAggregates)
+        self.events = 0
+        self._seen = set()
+        self._checked = None
+        self._lock = threading.Lock()
+
+    # Fold in any new log files; at most once per `ttl` seconds unless `force`d
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked is not None and now - self._checked < self.ttl:
+                return 0
+            self._checked = now
+            new_files = []
+            try:
+                partitions = sorted(entry.name for entry in os.scandir(self.directory) if entry.is_dir() and entry.name.startswith("day="))
+            except FileNotFoundError:
+                return 0
+            for partition in partitions:
+                for entry in os.scandir(os.path.join(self.directory, partition)):
+                    if entry.name.endswith(".arrow") and entry.path not in self._seen:
+                        new_files.append((entry.name.split("-")[1], entry.path))
+            if not new_files:
+                return 0
+            import pyarrow as pa
+
+            # Oldest first, so a session's attempt 1 is folded in before its attempt 3
+            for _, path in sorted(new_files):
+                with pa.OSFile(path) as source:
+                    self._fold(pa.ipc.open_file(source).read_all().select(_FOLD_COLUMNS).to_pydict())
+                self._seen.add(path)
+            return len(new_files)
+
+    def _fold(self, columns):
+        everyone = self.classes[None]
+        for event, session, class_code, attempt, segment, profit, scenario, baseline_profit in zip(*(columns[name] for name in _FOLD_COLUMNS)):
+            self.events += 1
+            for aggregates in (everyone, self.classes[class_code or ""]):
+                if event == SIMULATE_EVENT:
+                    aggregates.sessions.add(session)
+                    aggregates.attempt_count[attempt] += 1
+                    aggregates.attempt_profit[attempt] += profit
+                    aggregates.attempt_profitable[attempt] += profit > 0
+                    aggregates.segment_counts[attempt, segment] += 1
+                    if attempt == 1:
+                        aggregates.first_profit[session] = profit
+                    elif attempt == 3 and session in aggregates.first_profit:
+                        change = profit - aggregates.first_profit.pop(session)
+                        aggregates.improvements.append(change)
+                        aggregates.improved += change > 0
+                elif event == SCENARIO_EVENT:
+                    change = (profit - baseline_profit) / abs(baseline_profit) * 100 if baseline_profit else 0.0
+                    counts = aggregates.impact_counts.get(scenario)
+                    if counts is None:
+                        counts = aggregates.impact_counts[scenario] = [0] * (len(IMPACT_BINS) + 1)
+                    counts[_impact_bin(change)] += 1
+                    aggregates.impact_sums[scenario] += change
+
+    # Class codes seen so far ("" for students playing without one)
+    def class_codes(self):
+        with self._lock:
+            return sorted(code for code in self.classes if code is not None)
+
+    # Summary tables for one class code, or for everyone when `class_code` is None:
+    # {"sessions", "events", "attempts", "segments", "improvement", "tariff_impact"},
+    # where the last four are lists of row dicts
+    def summary(self, class_code=None):
+        with self._lock:
+            aggregates = self.classes.get(class_code) or ClassAggregates()
+            attempts = [
+                {"Attempt": attempt, "Simulations": count, "Average Profit": aggregates.attempt_profit[attempt] / count,
+                 "Profitable": aggregates.attempt_profitable[attempt] / count}
+                for attempt, count in sorted(aggregates.attempt_count.items())
+            ]
+            segments = collections.defaultdict(dict)
+            for (attempt, segment), count in aggregates.segment_counts.items():
+                segments[segment][f"Attempt {attempt}"] = count / aggregates.attempt_count[attempt]
+            improvements = sorted(aggregates.improvements)
+            improvement = [{
+                "Students": len(improvements),
+                "Improved": aggregates.improved / len(improvements),
+                "Average Change": sum(improvements) / len(improvements),
+                "Median Change": improvements[len(improvements) // 2]
+            }] if improvements else []
+            labels = [f"< {IMPACT_BINS[0]}%"] + [f"{low}% to {high}%" for low, high in zip(IMPACT_BINS, IMPACT_BINS[1:])] + [f">= {IMPACT_BINS[-1]}%"]
+            tariff_impact = [
+                {"Scenario": scenario, "Views": sum(counts), "Average Change (%)": aggregates.impact_sums[scenario] / sum(counts),
+                 **dict(zip(labels, counts))}
+                for scenario, counts in sorted(aggregates.impact_counts.items())
+            ]
+            return {
+                "sessions": len(aggregates.sessions),
+                "events": self.events,
+                "attempts": attempts,
+                "segments": [{"Segment": segment, **shares} for segment, shares in sorted(segments.items())],
+                "improvement": improvement,
+                "tariff_impact": tariff_impact
+            }
+
+def _impact_bin(change):
+    return bisect.bisect_right(IMPACT_BINS, change)
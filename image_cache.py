@@ -0,0 +1,135 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+# Persistent, content-addressed cache of generated images.
+# Entries are image files named by a hash of the normalized request, stored on local
+# disk so they outlive provider URLs and are shared by every session and process.
+# Entry mtimes double as last-access times for LRU eviction by total size and age.
+# Concurrent requests for the same key are coalesced into a single upstream call.
+class ImageCache:
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, max_age=30 * 24 * 3600, suffix=".png"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    # Cache key for a prompt plus any request options that change the image
+    @staticmethod
+    def key(prompt, *options):
+        normalized = " ".join(prompt.lower().split())
+        return hashlib.sha256("\x1f".join([normalized, *map(str, options)]).encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    # Path of a fresh entry (marking it recently used), or None
+    def get(self, key):
+        path = self.path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    # Store image bytes under a key and return the entry's path
+    def put(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self.evict()
+        return self.path(key)
+
+    # Return the cached path for a key, calling produce() on a miss. produce returns image
+    # bytes, or anything else (e.g. an error string) which is passed through uncached.
+    # Only one caller per key runs produce(); concurrent callers wait for its result.
+    def get_or_create(self, key, produce):
+        path = self.get(key)
+        if path is not None:
+            with self._lock:
+                self.hits += 1
+            return path
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            result = produce()
+            if isinstance(result, bytes):
+                result = self.put(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    # Drop entries older than max_age, then least recently used ones until under max_bytes
+    def evict(self):
+        now = time.time()
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                if now - stat.st_mtime > self.max_age:
+                    os.unlink(path)
+                    continue
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        entries = 0
+        size = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(self.suffix):
+                        entries += 1
+                        size += entry.stat().st_size
+        except OSError:
+            pass
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": entries, "bytes": size}
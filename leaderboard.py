@@ -0,0 +1,232 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# Persistent cross-session leaderboard on local SQLite in WAL mode.
+# Sessions only enqueue attempts; one background thread per process writes them in
+# batched transactions and keeps best-per-player and best-per-segment tables up to date,
+# so top-N queries are short index scans. Query results are cached for a few seconds
+# so every rerun doesn't hit the database.
+# The same store keeps every design submitted to a competitive class market, so a market
+# dropped from the app's cache (or lost with a restart) is rebuilt with all of them.
+LEADERBOARD_PATH = os.getenv(
+    "CAR_MARKET_LEADERBOARD_DB",
+    os.path.join(os.getenv("CAR_MARKET_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")), "leaderboard.sqlite3")
+)
+FLUSH_INTERVAL = 0.2
+BATCH_SIZE = 500
+CACHE_TTL = float(os.getenv("CAR_MARKET_LEADERBOARD_CACHE_TTL", "2"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    profit INTEGER NOT NULL,
+    sales INTEGER NOT NULL,
+    speed INTEGER, aesthetics INTEGER, reliability INTEGER, efficiency INTEGER, tech INTEGER, price INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attempts_profit ON attempts (profit DESC);
+CREATE INDEX IF NOT EXISTS attempts_segment_profit ON attempts (segment, profit DESC);
+CREATE TABLE IF NOT EXISTS best_by_player (
+    player TEXT PRIMARY KEY,
+    segment TEXT NOT NULL,
+    profit INTEGER NOT NULL,
+    sales INTEGER NOT NULL,
+    speed INTEGER, aesthetics INTEGER, reliability INTEGER, efficiency INTEGER, tech INTEGER, price INTEGER,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS best_by_player_profit ON best_by_player (profit DESC);
+CREATE TABLE IF NOT EXISTS best_by_segment (
+    segment TEXT NOT NULL,
+    player TEXT NOT NULL,
+    profit INTEGER NOT NULL,
+    sales INTEGER NOT NULL,
+    speed INTEGER, aesthetics INTEGER, reliability INTEGER, efficiency INTEGER, tech INTEGER, price INTEGER,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (segment, player)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS best_by_segment_profit ON best_by_segment (segment, profit DESC);
+CREATE TABLE IF NOT EXISTS class_submissions (
+    class_code TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    speed INTEGER, aesthetics INTEGER, reliability INTEGER, efficiency INTEGER, tech INTEGER, price INTEGER,
+    submitted_at REAL NOT NULL,
+    PRIMARY KEY (class_code, round, player)
+) WITHOUT ROWID;
+"""
+
+RESULT_FIELDS = "player, segment, profit, sales, speed, aesthetics, reliability, efficiency, tech, price"
+SUBMISSION_FIELDS = "class_code, round, player, speed, aesthetics, reliability, efficiency, tech, price"
+
+# Kinds of queued writes
+_ATTEMPT = 0
+_SUBMISSION = 1
+
+class Leaderboard:
+    def __init__(self, path=LEADERBOARD_PATH, cache_ttl=CACHE_TTL):
+        self.path = path
+        self.cache_ttl = cache_ttl
+        self._queue = queue.Queue()
+        self._cache = {}
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    # Queue an attempt for writing; never blocks the caller on the database
+    def record(self, player, design, result):
+        self._put(_ATTEMPT, (
+            player, result["Best Market Segment"], int(result["Profit"]), int(result["Estimated Sales"]),
+            design["Speed"], design["Aesthetics"], design["Reliability"], design["Efficiency"], design["Tech"], design["Price"],
+            time.time()
+        ))
+
+    # Queue a design submitted to a class market round (a DESIGN_COLUMNS tuple); a
+    # resubmission replaces the player's earlier design
+    def record_submission(self, class_code, round_number, player, design):
+        self._put(_SUBMISSION, (class_code, round_number, player, *design, time.time()))
+
+    def _put(self, kind, row):
+        self._queue.put((kind, row))
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="leaderboard-writer", daemon=True)
+                    self._writer.start()
+
+    # Block until every queued attempt has been written
+    def flush(self):
+        self._queue.join()
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(connection, batch)
+                self._cache.clear()
+            except sqlite3.Error:
+                logging.getLogger(__name__).exception("Dropped %d leaderboard attempt(s)", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, connection, batch):
+        submissions = [row for kind, row in batch if kind == _SUBMISSION]
+        batch = [row for kind, row in batch if kind == _ATTEMPT]
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                f"""INSERT INTO class_submissions ({SUBMISSION_FIELDS}, submitted_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (class_code, round, player) DO UPDATE SET
+                    speed = excluded.speed, aesthetics = excluded.aesthetics, reliability = excluded.reliability,
+                    efficiency = excluded.efficiency, tech = excluded.tech, price = excluded.price,
+                    submitted_at = excluded.submitted_at""", submissions
+            )
+            connection.executemany(
+                f"INSERT INTO attempts ({RESULT_FIELDS}, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch
+            )
+            connection.executemany(
+                f"""INSERT INTO best_by_player ({RESULT_FIELDS}, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (player) DO UPDATE SET
+                    segment = excluded.segment, profit = excluded.profit, sales = excluded.sales,
+                    speed = excluded.speed, aesthetics = excluded.aesthetics, reliability = excluded.reliability,
+                    efficiency = excluded.efficiency, tech = excluded.tech, price = excluded.price,
+                    updated_at = excluded.updated_at
+                WHERE excluded.profit > best_by_player.profit""", batch
+            )
+            connection.executemany(
+                f"""INSERT INTO best_by_segment ({RESULT_FIELDS}, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (segment, player) DO UPDATE SET
+                    profit = excluded.profit, sales = excluded.sales,
+                    speed = excluded.speed, aesthetics = excluded.aesthetics, reliability = excluded.reliability,
+                    efficiency = excluded.efficiency, tech = excluded.tech, price = excluded.price,
+                    updated_at = excluded.updated_at
+                WHERE excluded.profit > best_by_segment.profit""", batch
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _query(self, sql, params):
+        key = (sql, params)
+        cached = self._cache.get(key)
+        now = time.monotonic()
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        cursor = connection.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        self._cache[key] = (now + self.cache_ttl, rows)
+        return rows
+
+    # Best profit per student, highest first
+    def top_players(self, n=10):
+        return self._query(f"SELECT {RESULT_FIELDS} FROM best_by_player ORDER BY profit DESC LIMIT ?", (n,))
+
+    # Best profit per student within one segment, highest first
+    def top_in_segment(self, segment, n=10):
+        return self._query(
+            f"SELECT {RESULT_FIELDS} FROM best_by_segment WHERE segment = ? ORDER BY profit DESC LIMIT ?", (segment, n)
+        )
+
+    # Best single result in every segment
+    def segment_leaders(self):
+        return self._query(
+            f"""SELECT {RESULT_FIELDS} FROM best_by_segment AS outer_best
+            WHERE player = (SELECT player FROM best_by_segment WHERE segment = outer_best.segment ORDER BY profit DESC LIMIT 1)
+            ORDER BY profit DESC""", ()
+        )
+
+    # Every design submitted to a class market round, as (player, DESIGN_COLUMNS tuple)
+    # in submission order. Waits for queued writes and bypasses the cache, since it is
+    # used to rebuild a live market.
+    def class_submissions(self, class_code, round_number):
+        self.flush()
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        rows = connection.execute(
+            """SELECT player, speed, aesthetics, reliability, efficiency, tech, price FROM class_submissions
+            WHERE class_code = ? AND round = ? ORDER BY submitted_at""", (class_code, round_number)
+        ).fetchall()
+        return [(row[0], row[1:]) for row in rows]
+
+_leaderboard = None
+_leaderboard_lock = threading.Lock()
+
+# Process-wide leaderboard shared by every session
+def get_leaderboard():
+    global _leaderboard
+    if _leaderboard is None:
+        with _leaderboard_lock:
+            if _leaderboard is None:
+                _leaderboard = Leaderboard()
+    return _leaderboard
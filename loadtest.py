@@ -0,0 +1,398 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from websockets.asyncio.client import connect
+
+# Classroom load test: many simulated students playing the game at once against a real
+# "streamlit run" server, speaking the same websocket protocol as the browser.
+# Each student opens the app, enters a name, clicks Start Game, drags a few sliders and
+# runs "Simulate Market" three times, picks the tariff what-if scenario and starts a new
+# game, pausing between clicks and polling the background-image fragment like the browser does. The image provider is a
+# local mock with a configurable latency, so no API calls are made.
+#
+#   python loadtest.py --students 1,10,25,50 --think-time 1
+#
+# For each level it reports throughput, p50/p95/p99 click latency, server CPU (overall and
+# per click) and resident memory per session, then the largest level that stayed within the latency budget and
+# scaled, i.e. how many students one server process can take before it saturates.
+DEFAULT_LEVELS = "1,5,10,25,50"
+# Slider changes a student makes before each "Simulate Market"
+DESIGN_DRAGS = 3
+SCALING_EFFICIENCY = 0.8
+# 1x1 transparent PNG served by the mock image provider
+MOCK_IMAGE = base64.b64encode(bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082"
+)).decode("ascii")
+
+# Stand-in for the image generation API: sleeps `latency` seconds, then returns MOCK_IMAGE
+class MockImageProvider:
+    def __init__(self, latency):
+        self.latency = latency
+        self.requests = 0
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                provider.requests += 1
+                time.sleep(provider.latency)
+                body = json.dumps({"data": [{"b64_json": MOCK_IMAGE}]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, name="mock-image-provider", daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Start the app in its own process with a throwaway cache and leaderboard
+def start_app_server(port, image_provider_url, workdir):
+    env = dict(
+        os.environ,
+        OPENAI_BASE_URL=image_provider_url,
+        OPENAI_API_KEY="load-test",
+        CAR_MARKET_CACHE_DIR=os.path.join(workdir, "cache"),
+        CAR_MARKET_LEADERBOARD_DB=os.path.join(workdir, "leaderboard.sqlite3")
+    )
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    script = os.path.join(app_dir, "car_market_game.py")
+    # Run from the app directory so the app's .streamlit/config.toml applies
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", script, "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false"],
+        cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=open(os.path.join(workdir, "server.log"), "wb")
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App server exited early, see {os.path.join(workdir, 'server.log')}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("App server did not become healthy within 60s")
+
+# Resident memory and CPU seconds of a process, from /proc (Linux only)
+def process_usage(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        return rss, cpu
+    except (OSError, StopIteration, ValueError):
+        return None, None
+
+# One browser tab: sends reruns with widget states and waits for the script to finish
+class StudentSession:
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.widgets = {}
+        self.widget_fragments = {}
+        self.fragments = {}
+        self.errors = []
+
+    async def rerun(self, widget_states=(), fragment_id=None, auto=True):
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        if fragment_id is not None:
+            message.rerun_script.fragment_id = fragment_id
+            message.rerun_script.is_auto_rerun = auto
+        for state in widget_states:
+            message.rerun_script.widget_states.widgets.append(state)
+        await self.websocket.send(message.SerializeToString())
+        if fragment_id is None:
+            self.widgets = {}
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.websocket.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                self._track_element(forward.delta.new_element, forward.delta.fragment_id)
+            elif kind == "auto_rerun":
+                self.fragments[forward.auto_rerun.fragment_id] = forward.auto_rerun.interval
+            elif kind == "stop_auto_rerun":
+                for stopped in forward.stop_auto_rerun.fragment_ids:
+                    self.fragments.pop(stopped, None)
+            elif kind == "script_finished" and forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return
+
+    def _track_element(self, element, fragment_id):
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            self.errors.append(element.exception.message)
+        elif kind == "alert" and element.alert.format == 1:
+            self.errors.append(element.alert.body)
+        widget = getattr(element, kind)
+        if getattr(widget, "id", ""):
+            self.widgets[getattr(widget, "label", "")] = widget.id
+            self.widget_fragments[getattr(widget, "label", "")] = fragment_id
+
+    def widget_state(self, label, **value):
+        if label not in self.widgets:
+            raise RuntimeError(f"Widget {label!r} is not on the page")
+        message = BackMsg()
+        state = message.rerun_script.widget_states.widgets.add()
+        state.id = self.widgets[label]
+        for field, field_value in value.items():
+            if field == "double_array_value":
+                state.double_array_value.data.extend(field_value)
+            else:
+                setattr(state, field, field_value)
+        return state
+
+    # Click a button; like the browser, a button inside a fragment reruns just that fragment
+    async def click(self, label, *states):
+        await self.rerun([*states, self.widget_state(label, trigger_value=True)], self.widget_fragments.get(label) or None, auto=False)
+
+    # Change a widget's value; a widget inside a fragment reruns just that fragment
+    async def change(self, label, **value):
+        await self.rerun([self.widget_state(label, **value)], self.widget_fragments.get(label) or None, auto=False)
+
+# Think for about `think_time` seconds, polling auto-rerun fragments (the pending image
+# panel) on their interval the way the browser does
+async def _think(session, think_time, rng, polls):
+    remaining = think_time * rng.uniform(0.5, 1.5)
+    while remaining > 0:
+        if not session.fragments:
+            await asyncio.sleep(remaining)
+            return
+        fragment_id, interval = next(iter(session.fragments.items()))
+        wait = min(interval, remaining)
+        await asyncio.sleep(wait)
+        remaining -= wait
+        if wait == interval:
+            started = time.perf_counter()
+            await session.rerun(fragment_id=fragment_id)
+            polls.append(time.perf_counter() - started)
+
+async def play_student(url, student, games, think_time, ramp_up, seed, latencies, polls, failures):
+    rng = random.Random(seed * 100003 + student)
+    await asyncio.sleep(rng.uniform(0, ramp_up))
+    try:
+        async with connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=60) as websocket:
+            session = StudentSession(websocket)
+
+            async def timed(step, action):
+                started = time.perf_counter()
+                await action
+                latencies.append((step, time.perf_counter() - started))
+
+            await timed("open_app", session.rerun())
+            for _ in range(games):
+                await _think(session, think_time, rng, polls)
+                name = session.widget_state("Your name for the class leaderboard (optional)", string_value=f"student-{student}")
+                await timed("start_game", session.click("Start Game", name))
+                for attempt in range(3):
+                    await _think(session, think_time, rng, polls)
+                    for _ in range(DESIGN_DRAGS):
+                        await timed("adjust_design", session.change("Speed", double_array_value=[float(rng.randint(1, 10))]))
+                    speed = session.widget_state("Speed", double_array_value=[float(rng.randint(1, 10))])
+                    await timed("simulate_market", session.click("Simulate Market", speed))
+                await _think(session, think_time, rng, polls)
+                await timed("scenario", session.change("See how your final design fares under", string_value="Tariff +25%"))
+                await _think(session, think_time, rng, polls)
+                await timed("new_game", session.click("Start New Game"))
+            failures.extend(session.errors)
+    except Exception as e:
+        failures.append(f"student {student}: {type(e).__name__}: {e}")
+
+def _percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(max(values))}
+
+# Run `students` concurrent students and measure the level
+async def run_level(url, students, games, think_time, ramp_up, seed, server_pid):
+    latencies, polls, failures = [], [], []
+    rss_before, cpu_before = process_usage(server_pid) if server_pid else (None, None)
+    peak_rss = rss_before
+    started = time.perf_counter()
+    tasks = [
+        asyncio.create_task(play_student(url, student, games, think_time, ramp_up, seed, latencies, polls, failures))
+        for student in range(students)
+    ]
+    while not all(task.done() for task in tasks):
+        await asyncio.sleep(0.25)
+        if server_pid:
+            rss, _ = process_usage(server_pid)
+            if rss is not None:
+                peak_rss = max(peak_rss or 0, rss)
+    elapsed = time.perf_counter() - started
+    rss_after, cpu_after = process_usage(server_pid) if server_pid else (None, None)
+    clicks = [seconds for _, seconds in latencies]
+    result = {
+        "students": students,
+        "seconds": elapsed,
+        "clicks": len(clicks),
+        "throughput": len(clicks) / elapsed if elapsed > 0 else 0.0,
+        "latency": _percentiles(clicks),
+        "latency_by_step": {
+            step: _percentiles([seconds for name, seconds in latencies if name == step])
+            for step in dict.fromkeys(name for name, _ in latencies)
+        },
+        "image_polls": len(polls),
+        "image_poll_latency": _percentiles(polls),
+        "failures": failures,
+        "server_cpu": (cpu_after - cpu_before) / elapsed if cpu_before is not None and cpu_after is not None else None,
+        "server_cpu_per_click": (cpu_after - cpu_before) / len(clicks) if cpu_before is not None and cpu_after is not None and clicks else None,
+        "server_rss": rss_after,
+        "memory_per_session": (peak_rss - rss_before) / students if rss_before is not None and peak_rss is not None else None
+    }
+    # Let closed sessions get cleaned up before the next level
+    await asyncio.sleep(1)
+    return result
+
+# Largest level that met the p95 budget and kept at least SCALING_EFFICIENCY of the
+# single-student per-student throughput, plus the first level that didn't
+def saturation(levels, p95_budget):
+    base = levels[0]["throughput"] / levels[0]["students"] if levels and levels[0]["throughput"] else None
+    for level in levels:
+        level["scaling"] = level["throughput"] / (base * level["students"]) if base else None
+    capacity = None
+    for level in levels:
+        ok = (
+            not level["failures"] and level["latency"]["p95"] is not None and level["latency"]["p95"] <= p95_budget
+            and (level["scaling"] is None or level["scaling"] >= SCALING_EFFICIENCY)
+        )
+        if not ok:
+            return capacity, level
+        capacity = level
+    return capacity, None
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+def _students(level):
+    return f"{level['students']} student{'s' if level['students'] != 1 else ''}"
+
+def print_report(levels, capacity, saturated, p95_budget):
+    print(f"{'students':>8} {'clicks/s':>9} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'max ms':>7} "
+          f"{'scaling':>8} {'cpu':>6} {'cpu ms/click':>12} {'MB/session':>10} {'failures':>8}")
+    for level in levels:
+        latency = level["latency"]
+        cpu = "-" if level["server_cpu"] is None else f"{level['server_cpu']:.0%}"
+        cpu_per_click = _ms(level["server_cpu_per_click"])
+        memory = "-" if level["memory_per_session"] is None else f"{level['memory_per_session'] / 2 ** 20:.2f}"
+        scaling = "-" if level.get("scaling") is None else f"{level['scaling']:.0%}"
+        print(f"{level['students']:>8} {level['throughput']:>9.2f} {_ms(latency['p50']):>7} {_ms(latency['p95']):>7} "
+              f"{_ms(latency['p99']):>7} {_ms(latency['max']):>7} {scaling:>8} {cpu:>6} {cpu_per_click:>12} {memory:>10} {len(level['failures']):>8}")
+    print()
+    slowest = max(levels, key=lambda level: level["students"])
+    for step, latency in slowest["latency_by_step"].items():
+        print(f"  {slowest['students']} students, {step:<16} p50 {_ms(latency['p50'])} ms, p95 {_ms(latency['p95'])} ms, p99 {_ms(latency['p99'])} ms")
+    print()
+    budget = f"p95 <= {p95_budget * 1000:.0f} ms"
+    if capacity is None:
+        print(f"Even {_students(levels[0])} missed the budget ({budget}).")
+    elif saturated is None:
+        print(f"No saturation up to {_students(capacity)} ({budget}); try higher levels.")
+    else:
+        reasons = []
+        if saturated["failures"]:
+            reasons.append(f"{len(saturated['failures'])} failure(s), e.g. {saturated['failures'][0]}")
+        if saturated["latency"]["p95"] is not None and saturated["latency"]["p95"] > p95_budget:
+            reasons.append(f"p95 {_ms(saturated['latency']['p95'])} ms")
+        if saturated.get("scaling") is not None and saturated["scaling"] < SCALING_EFFICIENCY:
+            reasons.append(f"throughput scaling {saturated['scaling']:.0%}")
+        print(f"One process handles {_students(capacity)} within budget ({budget}); "
+              f"it saturates by {_students(saturated)}: {', '.join(reasons)}.")
+
+async def run_levels(url, levels, games, think_time, ramp_up, seed, server_pid):
+    # Warm-up game so imports, caches and the design table don't count against level one
+    failures = []
+    await play_student(url, -1, 1, 0, 0, seed, [], [], failures)
+    if failures:
+        raise RuntimeError(f"Warm-up game failed: {failures[0]}")
+    results = []
+    for students in levels:
+        print(f"Running {students} student(s)...", file=sys.stderr)
+        results.append(await run_level(url, students, games, think_time, ramp_up, seed, server_pid))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python loadtest.py", description="Simulate a lecture hall of students playing at once.")
+    parser.add_argument("--students", default=DEFAULT_LEVELS, help=f"Comma-separated concurrency levels to step through (default: {DEFAULT_LEVELS})")
+    parser.add_argument("--games", type=int, default=1, help="Games each student plays per level (default: 1)")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean pause between clicks in seconds (default: 1.0)")
+    parser.add_argument("--ramp-up", type=float, default=None, help="Spread student arrivals over this many seconds (default: think time)")
+    parser.add_argument("--image-latency", type=float, default=2.0, help="Mock image provider response time in seconds (default: 2.0)")
+    parser.add_argument("--p95-budget", type=float, default=0.5, help="Click latency budget for p95 in seconds (default: 0.5)")
+    parser.add_argument("--url", help="Load an already running app (ws://host:port/_stcore/stream) instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="PID of the --url server, for CPU and memory figures")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for think times and designs (default: 0)")
+    parser.add_argument("--json", help="Also write the full results to this JSON file")
+    args = parser.parse_args(argv)
+    levels = [int(level) for level in args.students.split(",")]
+    ramp_up = args.think_time if args.ramp_up is None else args.ramp_up
+
+    provider = server = None
+    try:
+        if args.url:
+            url, server_pid = args.url, args.server_pid
+        else:
+            workdir = tempfile.mkdtemp(prefix="car-market-loadtest-")
+            provider = MockImageProvider(args.image_latency)
+            port = _free_port()
+            print(f"Starting app server on port {port} (logs in {workdir})...", file=sys.stderr)
+            server = start_app_server(port, provider.url, workdir)
+            url, server_pid = f"ws://127.0.0.1:{port}/_stcore/stream", server.pid
+        results = asyncio.run(run_levels(url, levels, args.games, args.think_time, ramp_up, args.seed, server_pid))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if provider is not None:
+            provider.close()
+
+    capacity, saturated = saturation(results, args.p95_budget)
+    print_report(results, capacity, saturated, args.p95_budget)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "settings": vars(args),
+                "image_requests": provider.requests if provider is not None else None,
+                "levels": results,
+                "capacity": capacity["students"] if capacity else None,
+                "saturated_at": saturated["students"] if saturated else None
+            }, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
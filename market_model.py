@@ -0,0 +1,879 @@
+import bisect
+import collections
+import csv
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Market simulation model shared by the Streamlit app and the batch CLI.
+# It has no Streamlit dependency and, being an imported module, builds the market data,
+# compiled segments and loaded design tables once per process rather than on every rerun.
+# pandas is only imported by the functions that return DataFrames, so importing the model
+# (and the app, which needs it at start-up) doesn't pay for it.
+
+# Feedback messages, indexed by feedback tier (0 = no sales, 8 = profitable)
+FEEDBACK_MESSAGES = [
+    "🚨 No sales! Your price is too high for the options you've chosen. Try lowering your price or better matching your car's features to a market segment.",
+    "🚨 Catastrophic Loss! Your car is losing an extreme amount of money. You need to **completely rethink** your strategy—reduce production costs, increase the price, and make sure your car matches the right market segment.",
+    "⚠️ Huge Loss! Your losses are very high. Consider making significant adjustments—lowering expensive features, improving efficiency, or adjusting pricing to better fit the market.",
+    "🚨 Major Loss! Your car is losing a significant amount of money. You need to make drastic changes—consider lowering production costs, increasing the price, or improving the balance of features to appeal to buyers.",
+    "🔴 Moderate Loss! Your car is losing money. Try reducing unnecessary costs, adjusting the price, or making the car more appealing to its target market.",
+    "Your car is losing money. Consider increasing the price or reducing costs by adjusting features like speed, aesthetics, or technology.",
+    "⚠️ Low Profit! Your profit is minimal. Consider small adjustments to your price or features to make your car more appealing.",
+    "Your profit is low. Try optimizing your price or enhancing the car's appeal to boost sales.",
+    "Your car is profitable! Maintain a balance between cost and market demand for even better results."
+]
+
+# Profit thresholds separating feedback tiers 1-8
+PROFIT_TIER_BOUNDS = [-10000000, -1000000, -100000, -50000, 0, 20000, 50000]
+
+# Design columns accepted by simulate_market_batch, in argument order
+DESIGN_COLUMNS = ["Speed", "Aesthetics", "Reliability", "Efficiency", "Tech", "Price"]
+
+# Segment preference columns, in the same feature order as the design columns
+PREFERENCE_COLUMNS = ["Preferred_Speed", "Preferred_Aesthetics", "Preferred_Reliability", "Preferred_Efficiency", "Preferred_Tech"]
+
+# Immutable snapshot of the segment table used by the scoring engine.
+# The arrays are read-only and "rows" holds plain tuples for the single-design path,
+# so scoring never writes shared state and is safe to call from any session thread.
+# "checksum" identifies the matching design table, or is None when the preferences
+# can't be tabulated (non-integer values).
+MarketSegments = collections.namedtuple("MarketSegments", ["names", "avg_price", "market_size", "preferences", "rows", "checksum"])
+
+# `data` is the segment table as a DataFrame or as a {column: values} mapping
+def compile_market_segments(data):
+    names = np.array(list(data["Segment"]), dtype=object)
+    avg_price = np.array(data["Avg_Price"])
+    market_size = np.array(data["Market_Size"])
+    preferences = np.column_stack([np.asarray(data[column]) for column in PREFERENCE_COLUMNS])
+    for array in (names, avg_price, market_size, preferences):
+        array.setflags(write=False)
+    rows = tuple(zip(names.tolist(), avg_price.tolist(), market_size.tolist(), map(tuple, preferences.tolist())))
+    return MarketSegments(names, avg_price, market_size, preferences, rows, design_table_checksum(preferences))
+
+# Score designs against every segment and return (best segment index, best score) per design.
+# Designs are scored in chunks so the design x segment matrix stays small with many segments.
+def _score_designs(segments, speed, aesthetics, reliability, efficiency, tech):
+    preferences = segments.preferences
+    chunk_size = max(1, SCORE_CHUNK_CELLS // len(preferences))
+    if len(speed) > chunk_size:
+        parts = [
+            _score_designs(segments, *(values[start:start + chunk_size] for values in (speed, aesthetics, reliability, efficiency, tech)))
+            for start in range(0, len(speed), chunk_size)
+        ]
+        return np.concatenate([best for best, _ in parts]), np.concatenate([score for _, score in parts])
+    scores = (
+        abs(preferences[:, 0] - speed[:, None]) +
+        abs(preferences[:, 1] - aesthetics[:, None]) +
+        abs(preferences[:, 2] - reliability[:, None]) +
+        abs(preferences[:, 3] - efficiency[:, None]) +
+        abs(preferences[:, 4] - tech[:, None])
+    )
+    # argmin keeps the first segment on ties, like idxmin
+    best = scores.argmin(axis=1)
+    return best, scores[np.arange(len(best)), best]
+
+SCORE_CHUNK_CELLS = 1 << 22
+
+# Design-space lookup table.
+# Segment match, match score and production cost depend only on the five sliders,
+# so all FEATURE_LEVELS ** 5 combinations are precomputed into a small .npy file.
+# Every process memory-maps the same file read-only and shares its pages.
+FEATURE_LEVELS = 10
+DESIGN_TABLE_VERSION = 1
+DESIGN_TABLE_DTYPE = np.dtype([("segment", "<u2"), ("score", "<u2"), ("cost", "<i4")])
+DesignTable = collections.namedtuple("DesignTable", ["checksum", "path", "segment", "score", "cost"])
+
+# Loaded tables, kept per process
+_design_tables = {}
+_design_tables_lock = threading.Lock()
+
+def design_table_dir():
+    return os.getenv("CAR_MARKET_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+# Checksum tying a table to the segment preferences it was built from; a changed
+# market_data yields a new checksum, so a stale table is never picked up
+def design_table_checksum(preferences):
+    preferences = np.asarray(preferences, dtype=np.float64)
+    if not np.array_equal(preferences, np.round(preferences)) or len(preferences) > np.iinfo(np.uint16).max:
+        return None
+    digest = hashlib.sha256(f"v{DESIGN_TABLE_VERSION}:{FEATURE_LEVELS}:{DESIGN_TABLE_DTYPE.descr}".encode())
+    digest.update(np.ascontiguousarray(preferences).tobytes())
+    return digest.hexdigest()[:16]
+
+# Row of a slider combination in the design table, or None if it isn't on the slider grid
+def design_table_index(speed, aesthetics, reliability, efficiency, tech):
+    index = 0
+    for level in (speed, aesthetics, reliability, efficiency, tech):
+        if type(level) is not int or not 1 <= level <= FEATURE_LEVELS:
+            return None
+        index = index * FEATURE_LEVELS + level - 1
+    return index
+
+# Nearest segment (index, L1 score) of every slider combination, by an exact L1 distance
+# transform over the slider grid instead of scoring every cell against every segment.
+# Each segment seeds the cell nearest its preferences with the key
+# "distance * n_segments + index"; a preference outside the slider range adds its distance
+# to the range, which every cell shares. One min-plus pass per feature then spreads the
+# keys across the grid, so every cell ends up with its nearest segment, the lowest index
+# winning ties exactly like the argmin scan. Cost grows with the grid, not the segments.
+def _nearest_segment_grid(preferences):
+    preferences = np.asarray(preferences, dtype=np.int64)
+    stride = len(preferences)
+    clamped = np.clip(preferences, 1, FEATURE_LEVELS)
+    keys = np.full((FEATURE_LEVELS,) * 5, np.iinfo(np.int64).max // 4, dtype=np.int64)
+    seeds = abs(preferences - clamped).sum(axis=1) * stride + np.arange(stride)
+    np.minimum.at(keys, tuple((clamped - 1).T), seeds)
+    levels = np.arange(FEATURE_LEVELS)
+    step = abs(levels[:, None] - levels[None, :]) * stride
+    for axis in range(5):
+        spread = np.moveaxis(keys, axis, -1)
+        keys = np.moveaxis((spread[..., None, :] + step).min(axis=-1), -1, axis)
+    keys = keys.reshape(-1)
+    return keys % stride, keys // stride
+
+def _design_table_records(segments):
+    levels = np.arange(1, FEATURE_LEVELS + 1)
+    grid = np.stack(np.meshgrid(levels, levels, levels, levels, levels, indexing="ij"), axis=-1).reshape(-1, 5)
+    speed, aesthetics, reliability, efficiency, tech = grid.T
+    records = np.empty(len(grid), dtype=DESIGN_TABLE_DTYPE)
+    records["segment"], records["score"] = _nearest_segment_grid(segments.preferences)
+    records["cost"] = (speed * 2000) + (aesthetics * 1500) + (reliability * 1800) + (efficiency * 1700) + (tech * 2500)
+    return records
+
+# Build step: precompute the table for the given segments and write it atomically
+def build_design_table(segments=None, directory=None):
+    segments = market_segments if segments is None else segments
+    if segments.checksum is None:
+        raise ValueError("Segment preferences must be whole numbers to build a design table")
+    directory = directory or design_table_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"design_table-{segments.checksum}.npy")
+    records = _design_table_records(segments)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, records)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+# Loader: memory-map the table for the given segments, building it first if it is
+# missing or unreadable. Falls back to an in-memory table if the cache dir isn't writable.
+def load_design_table(segments=None, directory=None):
+    segments = market_segments if segments is None else segments
+    if segments.checksum is None:
+        return None
+    key = (segments.checksum, directory)
+    table = _design_tables.get(key)
+    if table is not None:
+        return table
+    with _design_tables_lock:
+        table = _design_tables.get(key)
+        if table is not None:
+            return table
+        path = os.path.join(directory or design_table_dir(), f"design_table-{segments.checksum}.npy")
+        records = None
+        for attempt in range(2):
+            try:
+                records = np.load(path, mmap_mode="r")
+                if records.dtype == DESIGN_TABLE_DTYPE and records.shape == (FEATURE_LEVELS ** 5,):
+                    break
+                records = None
+            except (OSError, ValueError):
+                records = None
+            if attempt == 0:
+                try:
+                    build_design_table(segments, directory)
+                except OSError:
+                    break
+        if records is None:
+            path = None
+            records = _design_table_records(segments)
+        # Plain ndarray views over the mapping index much faster than np.memmap
+        records = records.view(np.ndarray)
+        table = DesignTable(segments.checksum, path, records["segment"], records["score"], records["cost"])
+        _design_tables[key] = table
+        return table
+
+# Simulated market data: segment definitions are read from a CSV file (CAR_MARKET_SEGMENTS,
+# default segments.csv next to this module) with one row per segment. Row order is the
+# tie-break order when a design is equally close to several segments. An optional Region
+# column groups segments into regional markets; CAR_MARKET_REGION picks the one to play.
+SEGMENTS_PATH = os.getenv("CAR_MARKET_SEGMENTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "segments.csv"))
+MARKET_REGION = os.getenv("CAR_MARKET_REGION") or None
+SEGMENT_COLUMNS = ["Segment", "Avg_Price", *PREFERENCE_COLUMNS, "Market_Size"]
+
+# Segment table as {column: numpy array} in MARKET_COLUMNS order. Numeric columns are
+# int64 when every value is a whole number and float64 otherwise, as pandas.read_csv would
+# give; the csv module keeps pandas out of start-up.
+MARKET_COLUMNS = ["Segment", "Region", "Avg_Price", *PREFERENCE_COLUMNS, "Market_Size"]
+
+def read_market_columns(path=SEGMENTS_PATH, region=MARKET_REGION):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f, skipinitialspace=True)
+        header = next(reader, [])
+        records = [dict(zip(header, row)) for row in reader if row]
+    missing = [column for column in SEGMENT_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"{path} is missing segment column(s): {', '.join(missing)}")
+    if any(not record.get(column, "").strip() for record in records for column in SEGMENT_COLUMNS):
+        raise ValueError(f"{path} has empty segment values")
+    regions = [record.get("Region") or "Global" for record in records]
+    if region is not None:
+        records = [record for record, record_region in zip(records, regions) if record_region == region]
+        if not records:
+            raise ValueError(f"{path} has no segments in region {region!r}")
+        regions = [region] * len(records)
+    names = [record["Segment"] for record in records]
+    if region is None and len(set(regions)) > 1:
+        # Several regional markets at once: keep segment names unique across regions
+        names = [f"{name} ({record_region})" for name, record_region in zip(names, regions)]
+    columns = {"Segment": np.array(names, dtype=object), "Region": np.array(regions, dtype=object)}
+    for column in MARKET_COLUMNS[2:]:
+        values = [record[column] for record in records]
+        try:
+            columns[column] = np.array([int(value) for value in values], dtype=np.int64)
+        except ValueError:
+            try:
+                columns[column] = np.array([float(value) for value in values])
+            except ValueError:
+                raise ValueError(f"{path} has a non-numeric {column} value") from None
+    if (columns["Avg_Price"] <= 0).any():
+        raise ValueError(f"{path} has a segment with a non-positive Avg_Price")
+    return columns
+
+def load_market_data(path=SEGMENTS_PATH, region=MARKET_REGION):
+    import pandas as pd
+    return pd.DataFrame(read_market_columns(path, region))
+
+def load_market_model(path=SEGMENTS_PATH, region=MARKET_REGION):
+    market_data = load_market_data(path, region)
+    return market_data, compile_market_segments(market_data)
+
+_market_columns = read_market_columns()
+market_segments = compile_market_segments(_market_columns)
+
+# market_data, the segment table as a DataFrame, is built from the same columns on first use
+def __getattr__(name):
+    if name == "market_data":
+        import pandas as pd
+        global market_data
+        market_data = pd.DataFrame(_market_columns)
+        return market_data
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Segment count above which off-grid single designs are scored with numpy instead of a loop
+SCAN_LOOP_SEGMENTS = 16
+
+# Function to map a profit (and sales) to a feedback tier
+def get_feedback_tier(profit, sales):
+    if sales == 0:
+        return 0
+    return 1 + bisect.bisect_right(PROFIT_TIER_BOUNDS, profit)
+
+# Market simulation function
+def simulate_market_performance(speed, aesthetics, reliability, efficiency, tech, price):
+    segments = market_segments
+    index = design_table_index(speed, aesthetics, reliability, efficiency, tech)
+    table = load_design_table(segments) if index is not None else None
+    if table is not None:
+        # Slider designs: O(1) lookup of the precomputed match and cost
+        best_match = segments.rows[table.segment.item(index)]
+        best_score = table.score.item(index)
+        cost = table.cost.item(index)
+    elif len(segments.rows) > SCAN_LOOP_SEGMENTS:
+        # Off the slider grid with many segments: one vectorized scan
+        best, best_score = _score_designs(segments, *(np.array([level]) for level in (speed, aesthetics, reliability, efficiency, tech)))
+        best_match = segments.rows[best.item(0)]
+        best_score = best_score.item(0)
+        cost = (speed * 2000) + (aesthetics * 1500) + (reliability * 1800) + (efficiency * 1700) + (tech * 2500)
+    else:
+        # Find the closest segment; strict "<" keeps the first segment on ties, like idxmin
+        best_match = None
+        best_score = None
+        for segment in segments.rows:
+            pref_speed, pref_aesthetics, pref_reliability, pref_efficiency, pref_tech = segment[3]
+            score = (
+                abs(pref_speed - speed) +
+                abs(pref_aesthetics - aesthetics) +
+                abs(pref_reliability - reliability) +
+                abs(pref_efficiency - efficiency) +
+                abs(pref_tech - tech)
+            )
+            if best_score is None or score < best_score:
+                best_match, best_score = segment, score
+        cost = (speed * 2000) + (aesthetics * 1500) + (reliability * 1800) + (efficiency * 1700) + (tech * 2500)
+    segment_name, avg_price, market_size, _ = best_match
+    
+    price_factor = max(0, 1 - abs(price - avg_price) / avg_price)
+    estimated_sales = int(market_size * (1 - best_score / 50) * price_factor)
+    profit = estimated_sales * (price - cost)
+    
+    feedback = FEEDBACK_MESSAGES[get_feedback_tier(profit, estimated_sales)]
+    
+    return {
+        "Feedback": feedback,
+        "Best Market Segment": segment_name,
+        "Estimated Sales": estimated_sales,
+        "Profit": profit,
+        "Cost": cost
+    }
+
+# Best segment index, match score and production cost per design (1-D arrays)
+def _match_designs(segments, speed, aesthetics, reliability, efficiency, tech):
+    features = (speed, aesthetics, reliability, efficiency, tech)
+    table = None
+    if all(np.issubdtype(values.dtype, np.integer) for values in features) and all(
+        values.size == 0 or (values.min() >= 1 and values.max() <= FEATURE_LEVELS) for values in features
+    ):
+        table = load_design_table(segments)
+    if table is not None:
+        # Slider designs: gather the precomputed match and cost by table row
+        rows = np.zeros(len(speed), dtype=np.int64)
+        for values in features:
+            rows = rows * FEATURE_LEVELS + (values - 1)
+        return table.segment[rows].astype(np.intp), table.score[rows].astype(np.int64), table.cost[rows].astype(np.int64)
+    # Score every design against every segment
+    best, best_score = _score_designs(segments, *features)
+    cost = (speed * 2000) + (aesthetics * 1500) + (reliability * 1800) + (efficiency * 1700) + (tech * 2500)
+    return best, best_score, cost
+
+# Vectorized market simulation on 1-D arrays, one per design column. Returns
+# (best segment index, estimated sales, profit, cost, feedback tier) arrays with the same
+# values simulate_market_performance gives each design.
+def simulate_market_arrays(speed, aesthetics, reliability, efficiency, tech, price):
+    segments = market_segments
+    best, best_score, cost = _match_designs(segments, speed, aesthetics, reliability, efficiency, tech)
+    avg_price = segments.avg_price[best]
+    market_size = segments.market_size[best]
+    
+    price_factor = np.maximum(0, 1 - abs(price - avg_price) / avg_price)
+    estimated_sales = (market_size * (1 - best_score / 50) * price_factor).astype(np.int64)
+    profit = estimated_sales * (price - cost)
+    
+    tier = 1 + np.searchsorted(PROFIT_TIER_BOUNDS, profit, side="right")
+    tier[estimated_sales == 0] = 0
+    return best, estimated_sales, profit, cost, tier
+
+# Vectorized market simulation for many designs at once.
+# Accepts either a DataFrame with DESIGN_COLUMNS or one array-like per feature,
+# and returns one row per design with the same fields as simulate_market_performance
+# plus the numeric "Feedback Tier". Designs outside DESIGN_RANGES raise ValueError.
+def simulate_market_batch(speed, aesthetics=None, reliability=None, efficiency=None, tech=None, price=None):
+    import pandas as pd
+
+    index = None
+    if isinstance(speed, pd.DataFrame):
+        designs = speed
+        index = designs.index
+        speed, aesthetics, reliability, efficiency, tech, price = (designs[column].to_numpy() for column in DESIGN_COLUMNS)
+    speed, aesthetics, reliability, efficiency, tech, price = (
+        np.asarray(values).reshape(-1) for values in (speed, aesthetics, reliability, efficiency, tech, price)
+    )
+    check_design_ranges((speed, aesthetics, reliability, efficiency, tech, price), index)
+    best, estimated_sales, profit, cost, tier = simulate_market_arrays(speed, aesthetics, reliability, efficiency, tech, price)
+    
+    return pd.DataFrame({
+        "Feedback": np.asarray(FEEDBACK_MESSAGES, dtype=object)[tier],
+        "Best Market Segment": market_segments.names[best],
+        "Estimated Sales": estimated_sales,
+        "Profit": profit,
+        "Cost": cost,
+        "Feedback Tier": tier
+    }, index=index)
+
+# Function to generate feedback for a profit amount
+def get_feedback_for_profit(profit, sales=None):
+    if sales == 0 or sales is not None and sales < 10:
+        return FEEDBACK_MESSAGES[0]
+    return FEEDBACK_MESSAGES[1 + bisect.bisect_right(PROFIT_TIER_BOUNDS, profit)]
+
+# Price range and step accepted by the price input
+PRICE_MIN = 10000
+PRICE_MAX = 200000
+PRICE_STEP = 1000
+
+# Design values the batch entry points accept: features within the sliders' range
+# (fractions allowed) and prices within the price input's. Outside these, sales *
+# (price - cost) can overflow the int64 batch arithmetic, so such designs are rejected
+# rather than scored with a wrapped profit.
+DESIGN_RANGES = {
+    **{column: (1, FEATURE_LEVELS) for column in DESIGN_COLUMNS[:5]},
+    "Price": (PRICE_MIN, PRICE_MAX)
+}
+
+# Raise ValueError for the first design outside DESIGN_RANGES (NaN included). `columns`
+# are 1-D arrays in DESIGN_COLUMNS order; `index` labels the designs in the message.
+def check_design_ranges(columns, index=None):
+    for column, values in zip(DESIGN_COLUMNS, columns):
+        low, high = DESIGN_RANGES[column]
+        outside = ~((values >= low) & (values <= high))
+        if outside.any():
+            row = int(outside.argmax())
+            label = row if index is None else index[row]
+            raise ValueError(f"{column} of design {label} is {values[row]}; it must be a number from {low:,} to {high:,}")
+
+# Exact sales and profit of cars priced at `price` in a segment, evaluated exactly
+# like simulate_market_performance (vectorized)
+def _segment_sales_profit(price, avg_price, market_size, score, cost):
+    price_factor = np.maximum(0, 1 - abs(price - avg_price) / avg_price)
+    sales = (market_size * (1 - score / 50) * price_factor).astype(np.int64)
+    return sales, sales * (price - cost)
+
+# Profit surface around a design: every level of one feature (the other four held at the
+# design's values) against every price on the price grid, evaluated in one vectorized pass.
+# It doesn't depend on the design's own value of `feature` or its price, so a single
+# sweep serves every design along that feature/price plane.
+ProfitSurface = collections.namedtuple("ProfitSurface", ["feature", "levels", "prices", "segments", "sales", "profit"])
+
+def profit_surface(speed, aesthetics, reliability, efficiency, tech, feature):
+    position = DESIGN_COLUMNS.index(feature)
+    if position >= len(PREFERENCE_COLUMNS):
+        raise ValueError(f"Can't sweep {feature!r}; choose one of {', '.join(DESIGN_COLUMNS[:len(PREFERENCE_COLUMNS)])}")
+    segments = market_segments
+    levels = np.arange(1, FEATURE_LEVELS + 1)
+    features = [np.full(FEATURE_LEVELS, value) for value in (speed, aesthetics, reliability, efficiency, tech)]
+    features[position] = levels
+    best, best_score, cost = _match_designs(segments, *features)
+    prices = np.arange(PRICE_MIN, PRICE_MAX + 1, PRICE_STEP)
+    sales, profit = _segment_sales_profit(
+        prices[None, :], segments.avg_price[best][:, None], segments.market_size[best][:, None],
+        best_score[:, None], cost[:, None]
+    )
+    return ProfitSurface(feature, levels, prices, segments.names[best], sales, profit)
+
+# What-if cost and demand shocks applied to designs that are already on the market: each
+# car keeps its segment and price, and the fractions below change its cost and sales.
+#   tariff     duty on the whole production cost (0.25 = +25%)
+#   material   price shock on each feature's parts, in DESIGN_COLUMNS order (0.3 = +30%)
+#   currency   move in the cost of parts bought abroad (0.1 = 10% dearer)
+#   demand     shift in the size of every segment (-0.2 = 20% fewer buyers)
+Scenario = collections.namedtuple("Scenario", ["name", "tariff", "material", "currency", "demand"], defaults=(0.0, (0.0,) * 5, 0.0, 0.0))
+
+SCENARIOS = [
+    Scenario("Baseline"),
+    Scenario("Tariff +25%", tariff=0.25),
+    Scenario("Tariff +50%", tariff=0.5),
+    Scenario("Steel price shock", material=(0.3, 0.0, 0.3, 0.0, 0.0)),
+    Scenario("Chip shortage", material=(0.0, 0.0, 0.0, 0.0, 0.6)),
+    Scenario("Weaker dollar", currency=0.15),
+    Scenario("Recession", demand=-0.2),
+    Scenario("Boom", demand=0.15)
+]
+
+# Cost per feature level, in DESIGN_COLUMNS order
+FEATURE_UNIT_COSTS = (2000, 1500, 1800, 1700, 2500)
+
+# Sales, cost and profit of every design under every scenario, as (scenarios x designs) arrays
+ScenarioOutcomes = collections.namedtuple("ScenarioOutcomes", ["scenarios", "sales", "cost", "profit"])
+
+# Outcomes per (design, scenario) pair, kept across calls so a student's earlier attempts
+# and the preset scenarios are only evaluated once per process
+SCENARIO_CACHE_SIZE = 1 << 16
+_scenario_outcomes = collections.OrderedDict()
+_scenario_outcomes_lock = threading.Lock()
+
+# Evaluate (n, 6) designs against scenarios in one vectorized pass. With no shocks this
+# reproduces simulate_market_performance exactly, and a tariff alone reproduces the
+# game's original `sales * (price - cost * 1.25)`.
+def _scenario_grid(designs, scenarios):
+    segments = market_segments
+    best, best_score, _ = _match_designs(segments, *(designs[:, i] for i in range(5)))
+    price = designs[:, 5]
+    tariff, currency, demand = (np.array([getattr(s, field) for s in scenarios], dtype=float)[:, None] for field in ("tariff", "currency", "demand"))
+    material = np.array([s.material for s in scenarios], dtype=float)
+    cost = designs[:, 0] * (FEATURE_UNIT_COSTS[0] * (1 + material[:, 0:1]))
+    for i in range(1, 5):
+        cost = cost + designs[:, i] * (FEATURE_UNIT_COSTS[i] * (1 + material[:, i:i + 1]))
+    cost = cost * (1 + tariff) * (1 + currency)
+    avg_price = segments.avg_price[best]
+    price_factor = np.maximum(0, 1 - abs(price - avg_price) / avg_price)
+    sales = (segments.market_size[best] * (1 + demand) * (1 - best_score / 50) * price_factor).astype(np.int64)
+    return sales, cost, sales * (price - cost)
+
+# Designs are (Speed, Aesthetics, Reliability, Efficiency, Tech, Price) tuples. Only the
+# pairs not seen before are computed, together, in one call to _scenario_grid.
+def evaluate_scenarios(designs, scenarios=SCENARIOS):
+    designs = [tuple(design) for design in designs]
+    scenarios = list(scenarios)
+    outcomes = np.empty((3, len(scenarios), len(designs)))
+    missing_designs, missing_scenarios = {}, {}
+    with _scenario_outcomes_lock:
+        for i, scenario in enumerate(scenarios):
+            for j, design in enumerate(designs):
+                outcome = _scenario_outcomes.get((design, scenario))
+                if outcome is None:
+                    missing_scenarios.setdefault(scenario, []).append(i)
+                    missing_designs.setdefault(design, []).append(j)
+                else:
+                    _scenario_outcomes.move_to_end((design, scenario))
+                    outcomes[:, i, j] = outcome
+    if missing_designs:
+        sales, cost, profit = _scenario_grid(np.array(list(missing_designs)), list(missing_scenarios))
+        with _scenario_outcomes_lock:
+            for a, (scenario, rows) in enumerate(missing_scenarios.items()):
+                for b, (design, columns) in enumerate(missing_designs.items()):
+                    outcome = (sales[a, b], cost[a, b], profit[a, b])
+                    _scenario_outcomes[(design, scenario)] = outcome
+                    for i in rows:
+                        outcomes[:, i, columns] = np.array(outcome)[:, None]
+            while len(_scenario_outcomes) > SCENARIO_CACHE_SIZE:
+                _scenario_outcomes.popitem(last=False)
+    return ScenarioOutcomes(scenarios, outcomes[0].astype(np.int64), outcomes[1], outcomes[2])
+
+# Demand uncertainty for Monte Carlo runs. Every draw is a whole market: each segment's
+# size is scaled by 1 + market_size * z, each of its preferences shifts by preferences * z
+# feature levels, and the market's price sensitivity (how fast sales fall as the price
+# moves away from a segment's average) is scaled by 1 + price_sensitivity * z, with z
+# standard normal. The car then sells to whichever segment it matches best in that draw.
+Uncertainty = collections.namedtuple("Uncertainty", ["market_size", "preferences", "price_sensitivity"], defaults=(0.15, 0.75, 0.2))
+
+MONTE_CARLO_DRAWS = 100000
+PROFIT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Draws are generated in chunks of about this many preference cells, each chunk from its
+# own seed, so memory stays bounded with many segments and results only depend on the seed
+DRAW_CHUNK_CELLS = 1 << 20
+
+# Keep generated draws in memory for reuse across designs up to this size
+DRAW_CACHE_BYTES = 256 << 20
+
+# Summary of a design's profit over the draws; "profit" holds every draw
+ProfitDistribution = collections.namedtuple(
+    "ProfitDistribution", ["draws", "mean", "std", "percentiles", "loss_probability", "expected_sales", "profit"]
+)
+
+# Market draws as (size multiplier, preferences, price sensitivity) chunks
+def _market_draw_chunks(segments, draws, seed, uncertainty):
+    n_segments = len(segments.names)
+    chunk_draws = max(1, DRAW_CHUNK_CELLS // (n_segments * len(PREFERENCE_COLUMNS)))
+    starts = range(0, draws, chunk_draws)
+    for start, chunk_seed in zip(starts, np.random.SeedSequence(seed).spawn(len(starts))):
+        rng = np.random.default_rng(chunk_seed)
+        size = min(chunk_draws, draws - start)
+        size_multiplier = np.maximum(0, 1 + uncertainty.market_size * rng.standard_normal((size, n_segments)))
+        preferences = segments.preferences + uncertainty.preferences * rng.standard_normal((size, n_segments, len(PREFERENCE_COLUMNS)))
+        sensitivity = np.maximum(0, 1 + uncertainty.price_sensitivity * rng.standard_normal((size, 1)))
+        yield size_multiplier, preferences, sensitivity
+
+_market_draws = {}
+_market_draws_lock = threading.Lock()
+
+# Draw chunks for (draws, seed, uncertainty): kept in memory when they fit in
+# DRAW_CACHE_BYTES, otherwise regenerated on every pass
+def market_draws(draws=MONTE_CARLO_DRAWS, seed=0, uncertainty=Uncertainty()):
+    segments = market_segments
+    key = (segments.checksum, len(segments.names), draws, seed, uncertainty)
+    with _market_draws_lock:
+        chunks = _market_draws.get(key)
+    if chunks is not None:
+        return chunks
+    if draws * len(segments.names) * (len(PREFERENCE_COLUMNS) + 1) * 8 > DRAW_CACHE_BYTES:
+        return _MarketDrawChunks(segments, draws, seed, uncertainty)
+    chunks = tuple(_market_draw_chunks(segments, draws, seed, uncertainty))
+    with _market_draws_lock:
+        _market_draws.clear()
+        _market_draws[key] = chunks
+    return chunks
+
+class _MarketDrawChunks:
+    def __init__(self, segments, draws, seed, uncertainty):
+        self.arguments = (segments, draws, seed, uncertainty)
+
+    def __iter__(self):
+        return _market_draw_chunks(*self.arguments)
+
+# Monte Carlo profit distribution of one design. All designs see the same seeded draws
+# (common random numbers), so two designs can be compared draw for draw.
+def profit_distribution(speed, aesthetics, reliability, efficiency, tech, price, draws=MONTE_CARLO_DRAWS, seed=0, uncertainty=Uncertainty()):
+    segments = market_segments
+    design = (speed, aesthetics, reliability, efficiency, tech)
+    cost = design[0] * FEATURE_UNIT_COSTS[0]
+    for level, unit_cost in zip(design[1:], FEATURE_UNIT_COSTS[1:]):
+        cost = cost + level * unit_cost
+    sales = []
+    for size_multiplier, preferences, sensitivity in market_draws(draws, seed, uncertainty):
+        scores = abs(preferences[:, :, 0] - speed)
+        for i in range(1, len(design)):
+            scores += abs(preferences[:, :, i] - design[i])
+        best = scores.argmin(axis=1)
+        rows = np.arange(len(best))
+        avg_price = segments.avg_price[best]
+        price_factor = np.maximum(0, 1 - sensitivity[:, 0] * abs(price - avg_price) / avg_price)
+        market_size = segments.market_size[best] * size_multiplier[rows, best]
+        sales.append(np.maximum(0, market_size * (1 - scores[rows, best] / 50) * price_factor).astype(np.int64))
+    sales = np.concatenate(sales)
+    profit = sales * (price - cost)
+    return ProfitDistribution(
+        draws, float(profit.mean()), float(profit.std()), dict(zip(PROFIT_PERCENTILES, np.percentile(profit, PROFIT_PERCENTILES).tolist())),
+        np.count_nonzero(profit < 0) / draws, float(sales.mean()), profit
+    )
+
+# Profit distribution summaries for a frame of designs (DESIGN_COLUMNS), one row per design
+def _profit_distribution_rows(designs, draws, seed, uncertainty):
+    import pandas as pd
+
+    rows = []
+    for design in designs[DESIGN_COLUMNS].itertuples(index=False):
+        distribution = profit_distribution(*design, draws=draws, seed=seed, uncertainty=uncertainty)
+        row = {"Mean Profit": distribution.mean, "Profit Std": distribution.std}
+        row.update({f"P{q} Profit": value for q, value in distribution.percentiles.items()})
+        row["Loss Probability"] = distribution.loss_probability
+        row["Expected Sales"] = distribution.expected_sales
+        rows.append(row)
+    return pd.DataFrame(rows, index=designs.index)
+
+# Monte Carlo summaries for many designs, e.g. an instructor's class export. With
+# workers > 1 the designs are split across a process pool; every worker regenerates the
+# same seeded draws, so the results don't depend on the number of workers.
+def profit_distribution_batch(designs, draws=MONTE_CARLO_DRAWS, seed=0, uncertainty=Uncertainty(), workers=1):
+    import pandas as pd
+
+    if workers <= 1 or len(designs) < 2:
+        return _profit_distribution_rows(designs, draws, seed, uncertainty)
+    parts = np.array_split(np.arange(len(designs)), min(len(designs), workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_profit_distribution_rows, designs.iloc[part], draws, seed, uncertainty) for part in parts]
+        return pd.concat([future.result() for future in futures])
+
+# Continuous relaxation of profit (sales before integer truncation). It bounds the
+# exact profit from above wherever price >= cost, rises up to the segment price and
+# peaks on the far side at avg_price + cost / 2.
+def _profit_upper_bound(price, avg_price, market_size, score, cost):
+    price_factor = np.maximum(0, 1 - abs(price - avg_price) / avg_price)
+    return market_size * (1 - score / 50) * price_factor * (price - cost)
+
+def _price_peak(avg_price, cost):
+    return np.clip(avg_price + cost / 2, PRICE_MIN, PRICE_MAX)
+
+# Closed-form price interval where the upper bound reaches `threshold` (> 0), widened
+# by a dollar on each side so rounding can only add candidates, never drop them
+def _price_window(threshold, avg_price, market_size, score, cost):
+    demand = market_size * (1 - score / 50)
+    scaled = 4 * threshold * avg_price / np.maximum(demand, 1e-12)
+    # Below the segment price: demand * (p / A) * (p - c) >= threshold
+    low_left = (cost + np.sqrt(cost ** 2 + scaled)) / 2
+    # Above it: demand * (2 - p / A) * (p - c) >= threshold
+    spread = (2 * avg_price - cost) ** 2 - scaled
+    root = np.sqrt(np.maximum(spread, 0))
+    low_right = (2 * avg_price + cost - root) / 2
+    high = (2 * avg_price + cost + root) / 2
+    low = np.where(low_left <= avg_price, low_left, low_right)
+    empty = spread < 0
+    return np.where(empty, np.inf, low - 1), np.where(empty, -np.inf, high + 1)
+
+# Every (design row, grid price) whose profit could reach the row's threshold.
+# Rows with a non-positive threshold get the full price grid, since the upper bound
+# says nothing about losses.
+def _candidate_prices(threshold, avg_price, market_size, score, cost):
+    grid_size = (PRICE_MAX - PRICE_MIN) // PRICE_STEP + 1
+    low, high = _price_window(np.maximum(threshold, 1), avg_price, market_size, score, cost)
+    first = np.clip(np.ceil((low - PRICE_MIN) / PRICE_STEP), 0, grid_size).astype(np.int64)
+    last = np.clip(np.floor((high - PRICE_MIN) / PRICE_STEP), -1, grid_size - 1).astype(np.int64)
+    full = threshold <= 0
+    first[full] = 0
+    last[full] = grid_size - 1
+    counts = np.maximum(last - first + 1, 0)
+    rows = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return rows, PRICE_MIN + (first[rows] + offsets) * PRICE_STEP
+
+# Exact optimal-design solver over every slider combination and every allowed price.
+# Returns the top-k (design, price) points by profit, optionally limited to one segment.
+# Each design's profit is piecewise in price, so instead of evaluating all ~19M points
+# it prices every design at its closed-form peak, takes the k-th best of those as a
+# threshold and only evaluates the few grid prices whose upper bound can beat it.
+def solve_optimal_designs(k=1, segment=None):
+    segments = market_segments
+    table = load_design_table(segments)
+    if table is None:
+        raise ValueError("The optimal-design solver needs whole-number segment preferences")
+    rows = np.arange(FEATURE_LEVELS ** 5)
+    if segment is not None:
+        rows = rows[segments.names[table.segment] == segment]
+    best = table.segment[rows].astype(np.intp)
+    score = table.score[rows].astype(np.int64)
+    cost = table.cost[rows].astype(np.int64)
+    avg_price = segments.avg_price[best]
+    market_size = segments.market_size[best]
+    k = min(k, len(rows) * ((PRICE_MAX - PRICE_MIN) // PRICE_STEP + 1))
+    if k <= 0:
+        return _optimal_designs_frame(rows[:0], rows[:0], rows[:0], rows[:0], rows[:0], segments.names[best[:0]])
+    
+    # Lower bound per design: exact profit at the grid prices around the continuous peak
+    peak = _price_peak(avg_price, cost)
+    achieved = np.full(len(rows), np.iinfo(np.int64).min)
+    for rounding in (np.floor, np.ceil):
+        price = PRICE_MIN + rounding((peak - PRICE_MIN) / PRICE_STEP) * PRICE_STEP
+        achieved = np.maximum(achieved, _segment_sales_profit(price, avg_price, market_size, score, cost)[1])
+    # At least k points reach the k-th best lower bound, so nothing below it can make the top k
+    kth = len(achieved) - min(k, len(achieved))
+    threshold = np.partition(achieved, kth)[kth]
+    if threshold > 0:
+        keep = _profit_upper_bound(peak, avg_price, market_size, score, cost) >= threshold * (1 - 1e-9)
+    else:
+        keep = np.ones(len(rows), dtype=bool)
+    candidate_rows, price = _candidate_prices(
+        np.full(keep.sum(), threshold), avg_price[keep], market_size[keep], score[keep], cost[keep]
+    )
+    candidate_rows = np.flatnonzero(keep)[candidate_rows]
+    sales, profit = _segment_sales_profit(
+        price, avg_price[candidate_rows], market_size[candidate_rows], score[candidate_rows], cost[candidate_rows]
+    )
+    # Highest profit first; ties keep slider order, then the lower price
+    order = np.lexsort((price, candidate_rows, -profit))[:k]
+    candidate_rows = candidate_rows[order]
+    return _optimal_designs_frame(
+        rows[candidate_rows], price[order], sales[order], cost[candidate_rows], profit[order],
+        segments.names[best[candidate_rows]]
+    )
+
+# Price solver for designs whose five features are already chosen. The features fix the
+# segment, match score and cost, so profit depends on price alone:
+#   sales(p) = int(demand * (1 - |p - avg_price| / avg_price)),  demand = market_size * (1 - score / 50)
+#   profit(p) = sales(p) * (p - cost)
+# Break-even range: the grid prices at which the car sells and covers its cost, between
+# the closed-form ends p >= cost, p >= avg_price / demand and p <= avg_price * (2 - 1 / demand).
+# Best price: the relaxation peaks at avg_price + cost / 2; the exact profit at the grid
+# prices either side of the peak is a lower bound, and _price_window gives the few grid
+# prices whose relaxation could still beat it. Only those are evaluated, so the integer
+# sales are respected exactly without scanning the price grid.
+# Prices are NaN where there is no break-even range or no price makes a profit.
+PriceSolution = collections.namedtuple(
+    "PriceSolution", ["segment", "cost", "break_even_low", "break_even_high", "best_price", "best_sales", "best_profit"]
+)
+
+# Vectorized solver on 1-D feature arrays. Returns (best segment index, cost, break-even
+# low, break-even high, best price, best sales, best profit) arrays.
+def solve_price_arrays(speed, aesthetics, reliability, efficiency, tech):
+    segments = market_segments
+    best, score, cost = _match_designs(segments, speed, aesthetics, reliability, efficiency, tech)
+    avg_price = segments.avg_price[best]
+    market_size = segments.market_size[best]
+    grid_size = (PRICE_MAX - PRICE_MIN) // PRICE_STEP + 1
+
+    # Break-even range, snapped to the grid; the exact check one step either side absorbs
+    # rounding in the closed-form ends
+    demand = market_size * (1 - score / 50)
+    sells = demand >= 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        low = np.where(sells, np.maximum(cost, avg_price / demand), np.inf)
+        high = np.where(sells, avg_price * (2 - 1 / demand), -np.inf)
+    first = np.clip(np.ceil((low - PRICE_MIN) / PRICE_STEP), 0, grid_size).astype(np.int64)
+    last = np.clip(np.floor((high - PRICE_MIN) / PRICE_STEP), -1, grid_size - 1).astype(np.int64)
+
+    def breaks_even(index):
+        price = PRICE_MIN + index * PRICE_STEP
+        sales, _ = _segment_sales_profit(price, avg_price, market_size, score, cost)
+        return (index >= 0) & (index < grid_size) & (sales >= 1) & (price >= cost)
+
+    first = np.where(breaks_even(first), np.where(breaks_even(first - 1), first - 1, first), first + 1)
+    last = np.where(breaks_even(last), np.where(breaks_even(last + 1), last + 1, last), last - 1)
+    has_range = sells & (first <= last) & breaks_even(first)
+    break_even_low = np.where(has_range, PRICE_MIN + first * PRICE_STEP, np.nan)
+    break_even_high = np.where(has_range, PRICE_MIN + last * PRICE_STEP, np.nan)
+
+    # Best price: lower bound from the grid prices around the peak, then the closed-form
+    # window of prices that could reach it (or make any profit at all)
+    peak = _price_peak(avg_price, cost)
+    achieved = np.full(len(best), np.iinfo(np.int64).min)
+    for rounding in (np.floor, np.ceil):
+        price = PRICE_MIN + rounding((peak - PRICE_MIN) / PRICE_STEP) * PRICE_STEP
+        achieved = np.maximum(achieved, _segment_sales_profit(price, avg_price, market_size, score, cost)[1])
+    # (the slack keeps a window open when the bound equals the relaxation's own peak)
+    rows, price = _candidate_prices(np.maximum(achieved * (1 - 1e-9), 1), avg_price, market_size, score, cost)
+    sales, profit = _segment_sales_profit(price, avg_price[rows], market_size[rows], score[rows], cost[rows])
+    # Per design, the highest profit at the lowest price
+    order = np.lexsort((price, -profit, rows))
+    rows, price, sales, profit = rows[order], price[order], sales[order], profit[order]
+    first_candidate = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else rows
+    rows, price, sales, profit = rows[first_candidate], price[first_candidate], sales[first_candidate], profit[first_candidate]
+    profitable = profit > 0
+    rows, price, sales, profit = rows[profitable], price[profitable], sales[profitable], profit[profitable]
+    best_price = np.full(len(best), np.nan)
+    best_sales = np.zeros(len(best), dtype=np.int64)
+    best_profit = np.zeros(len(best), dtype=profit.dtype)
+    best_price[rows] = price
+    best_sales[rows] = sales
+    best_profit[rows] = profit
+    return best, cost, break_even_low, break_even_high, best_price, best_sales, best_profit
+
+# Break-even range and most profitable price of one design, as a PriceSolution; prices
+# are None where there is no range or no profitable price
+def solve_price(speed, aesthetics, reliability, efficiency, tech):
+    best, cost, low, high, price, sales, profit = solve_price_arrays(
+        *(np.array([level]) for level in (speed, aesthetics, reliability, efficiency, tech))
+    )
+    return PriceSolution(
+        market_segments.names[best.item(0)], cost.item(0), _grid_price(low.item(0)), _grid_price(high.item(0)),
+        _grid_price(price.item(0)), sales.item(0), profit.item(0)
+    )
+
+def _grid_price(value):
+    return None if np.isnan(value) else int(value)
+
+# Price solver for many designs at once. Accepts a DataFrame with the five feature
+# columns (a Price column is ignored) or one array-like per feature; returns one row per
+# design, with nullable integer prices.
+def solve_price_batch(speed, aesthetics=None, reliability=None, efficiency=None, tech=None):
+    import pandas as pd
+
+    index = None
+    if isinstance(speed, pd.DataFrame):
+        designs = speed
+        index = designs.index
+        speed, aesthetics, reliability, efficiency, tech = (designs[column].to_numpy() for column in DESIGN_COLUMNS[:5])
+    speed, aesthetics, reliability, efficiency, tech = (
+        np.asarray(values).reshape(-1) for values in (speed, aesthetics, reliability, efficiency, tech)
+    )
+    best, cost, low, high, price, sales, profit = solve_price_arrays(speed, aesthetics, reliability, efficiency, tech)
+    return pd.DataFrame({
+        "Best Market Segment": market_segments.names[best],
+        "Cost": cost,
+        "Break-Even Low": pd.array(low, dtype="Int64"),
+        "Break-Even High": pd.array(high, dtype="Int64"),
+        "Best Price": pd.array(price, dtype="Int64"),
+        "Best Sales": sales,
+        "Best Profit": profit
+    }, index=index)
+
+def _optimal_designs_frame(table_rows, price, sales, cost, profit, segment_names):
+    import pandas as pd
+
+    levels = np.unravel_index(table_rows, (FEATURE_LEVELS,) * 5)
+    frame = pd.DataFrame({column: values + 1 for column, values in zip(DESIGN_COLUMNS, levels)})
+    frame["Price"] = price
+    frame["Best Market Segment"] = segment_names
+    frame["Estimated Sales"] = sales
+    frame["Cost"] = cost
+    frame["Profit"] = profit
+    return frame
+
+# Balance check for the segment parameters in market_data: the best achievable design
+# in every segment and how many slider combinations each segment attracts
+def segment_balance_report():
+    import pandas as pd
+
+    segments = market_segments
+    table = load_design_table(segments)
+    matches = np.bincount(table.segment, minlength=len(segments.names))
+    report = []
+    for index, name in enumerate(segments.names):
+        best = solve_optimal_designs(1, segment=name) if matches[index] else None
+        report.append({
+            "Segment": name,
+            "Matching Designs": int(matches[index]),
+            "Best Profit": int(best["Profit"].iloc[0]) if best is not None else None,
+            "Best Price": int(best["Price"].iloc[0]) if best is not None else None,
+            "Best Sales": int(best["Estimated Sales"].iloc[0]) if best is not None else None
+        })
+    return pd.DataFrame(report)
@@ -0,0 +1,175 @@
+import bisect
+import contextlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Per-rerun timing spans, aggregated into one latency histogram per phase and exported
+# in the Prometheus text format. Turned on by setting either
+#   CAR_MARKET_METRICS_FILE   file rewritten every CAR_MARKET_METRICS_INTERVAL seconds
+#                             (e.g. for node_exporter's textfile collector)
+#   CAR_MARKET_METRICS_PORT   serve http://CAR_MARKET_METRICS_HOST:<port>/metrics
+#                             (default host 127.0.0.1) from a background thread
+# When neither is set, span() hands back a shared no-op context manager, so instrumented
+# code costs one function call per span.
+METRICS_FILE = os.getenv("CAR_MARKET_METRICS_FILE", "")
+METRICS_PORT = int(os.getenv("CAR_MARKET_METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("CAR_MARKET_METRICS_HOST", "127.0.0.1")
+METRICS_INTERVAL = float(os.getenv("CAR_MARKET_METRICS_INTERVAL", "15"))
+ENABLED = bool(METRICS_FILE or METRICS_PORT)
+
+# Bucket upper bounds in seconds; fine-grained at the low end where reruns live, with
+# enough range above to catch multi-second outliers and image generations
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+class Histogram:
+    def __init__(self, name, help_text, label, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, seconds):
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(value)
+            if series is None:
+                series = self._series[value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += seconds
+
+    # Per-label bucket counts (last entry is +Inf, not cumulative) and sums
+    def snapshot(self):
+        with self._lock:
+            return {value: (list(counts), total) for value, (counts, total) in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for value, (counts, total) in sorted(self.snapshot().items()):
+            label = f'{self.label}="{_escape(value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total!r}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+phase_seconds = Histogram("car_market_phase_seconds", "Time spent in each phase of a rerun.", "phase")
+
+# Session-state size buckets in bytes, from a fresh session up to runaway histories
+SESSION_BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+session_state_bytes = Histogram(
+    "car_market_session_state_bytes", "Approximate size of each session-state entry at the end of a rerun.", "key",
+    buckets=SESSION_BYTES_BUCKETS
+)
+
+class _Span:
+    __slots__ = ("phase", "started")
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    # Also records spans cut short by st.rerun()/st.stop() or an error
+    def __exit__(self, *exc_info):
+        phase_seconds.observe(self.phase, time.perf_counter() - self.started)
+        return False
+
+_NO_SPAN = contextlib.nullcontext()
+
+# Time a block: `with span("results"): ...`
+def span(phase):
+    return _Span(phase) if ENABLED else _NO_SPAN
+
+# Record the size of each session-state entry; `report` (returning {key: bytes}) is only
+# called when metrics are on
+def observe_session_memory(report):
+    if ENABLED:
+        for key, size in report().items():
+            session_state_bytes.observe(key, size)
+
+# Record spans without starting any exporter, e.g. for benchmarks reading phase_seconds
+def enable():
+    global ENABLED
+    ENABLED = True
+
+# All metrics in the Prometheus text exposition format
+def render_metrics():
+    return phase_seconds.render() + session_state_bytes.render()
+
+# Atomically replace `path` with the current metrics, so a scraper never reads a partial file
+def write_metrics_file(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(render_metrics())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def _file_export_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_metrics_file(path)
+        except OSError:
+            logging.getLogger(__name__).exception("Could not write metrics to %s", path)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+# Start the configured exporters once per process
+def start_exporters():
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    if METRICS_FILE:
+        threading.Thread(target=_file_export_loop, args=(METRICS_FILE, METRICS_INTERVAL), name="metrics-file", daemon=True).start()
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), _MetricsHandler)
+        except OSError:
+            # Another app process already serves this port
+            logging.getLogger(__name__).warning("Metrics port %d is in use; not serving /metrics", METRICS_PORT)
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+
+if ENABLED:
+    start_exporters()
@@ -0,0 +1,163 @@
+import collections
+import hashlib
+import math
+
+import numpy as np
+
+import market_model
+from market_model import DESIGN_COLUMNS
+
+# Multi-year production: each design stays on the market for several years, and every
+# year the student decides how many cars to build. The state of every design is a few
+# arrays (inventory, cumulative production) plus the drifting segment preferences, and
+# each year is one vectorized step over all designs:
+#   production  = min(volume, capacity)
+#   unit cost   = cost * (max(cumulative, learning_volume) / learning_volume) ** log2(learning_rate)
+#   sales       = min(demand, inventory + production)
+#   inventory   = inventory + production - sales, each unsold car costing holding_rate of
+#                 its unit cost to carry into the next year
+#   profit      = sales * price - production * unit cost - holding cost
+# Demand is simulate_market_performance's sales against that year's preferences. Year 1
+# uses the segment table as is, so building exactly the demand in year 1 (within
+# capacity) reproduces the single-period profit; from year 2 each preference takes a
+# seeded random step.
+#
+# Every year is keyed by a hash of the inputs it depends on (designs, settings, segments
+# and all volumes so far), so a new run resumes from the longest prefix of years it shares
+# with an earlier run instead of recomputing from year one.
+ProductionSettings = collections.namedtuple(
+    "ProductionSettings", ["capacity", "learning_rate", "learning_volume", "holding_rate", "drift", "seed"],
+    defaults=(20000, 0.9, 10000, 0.25, 0.3, 0)
+)
+
+# Year-by-year results: `keys` holds one input hash per year, `preferences` is
+# (years x segments x 5) and every other field is a (years x designs) array. Profit is
+# int64 for integer prices and float64 otherwise, like simulate_market_arrays.
+# `resumed` counts the leading years taken from the run passed as `resume`.
+ProductionRun = collections.namedtuple(
+    "ProductionRun", ["keys", "preferences", "segment", "demand", "production", "sales", "inventory", "unit_cost", "profit", "resumed"]
+)
+
+PRODUCTION_VERSION = 1
+_YEAR_FIELDS = ["segment", "demand", "production", "sales", "inventory", "unit_cost", "profit"]
+
+# One input hash per year; each one covers everything before it
+def _year_keys(segments, designs, volumes, settings):
+    digest = hashlib.sha256(f"v{PRODUCTION_VERSION}:{tuple(settings)!r}".encode())
+    for values in (segments.avg_price, segments.market_size, segments.preferences, designs):
+        digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    keys = []
+    key = digest.digest()
+    for year in range(volumes.shape[1]):
+        key = hashlib.sha256(key + np.ascontiguousarray(volumes[:, year]).tobytes()).digest()
+        keys.append(key.hex()[:16])
+    return np.array(keys, dtype="U16")
+
+# Preferences after one year of drift. The step only depends on the seed and the year, so
+# any year can be recomputed from the one before it.
+def _drift_preferences(preferences, year, settings):
+    if settings.drift <= 0:
+        return preferences
+    rng = np.random.default_rng([settings.seed, year])
+    return np.clip(preferences + rng.normal(0.0, settings.drift, preferences.shape), 1, market_model.FEATURE_LEVELS)
+
+# Best segment, demand and base cost of every design against one year's preferences
+def _year_demand(segments, features, price, preferences, year):
+    if year == 1:
+        best, best_score, cost = market_model._match_designs(segments, *features)
+    else:
+        best, best_score = market_model._score_designs(segments._replace(preferences=preferences), *features)
+        cost = sum(values * unit_cost for values, unit_cost in zip(features, market_model.FEATURE_UNIT_COSTS))
+    demand, _ = market_model._segment_sales_profit(price, segments.avg_price[best], segments.market_size[best], best_score, cost)
+    return best, demand, cost
+
+# Simulate `years` years of production for many designs at once. `designs` is a DataFrame
+# with DESIGN_COLUMNS or an (n, 6) array; `volumes` is the planned production per design,
+# as one number, one per design, or an (n, years) array. Pass an earlier ProductionRun
+# as `resume` to reuse every leading year whose inputs haven't changed.
+def simulate_production(designs, volumes, years, settings=ProductionSettings(), resume=None):
+    segments = market_model.market_segments
+    if hasattr(designs, "columns"):
+        designs = designs[DESIGN_COLUMNS].to_numpy()
+    designs = np.asarray(designs).reshape(-1, len(DESIGN_COLUMNS))
+    n = len(designs)
+    volumes = np.asarray(volumes, dtype=np.int64)
+    if volumes.ndim < 2:
+        volumes = volumes.reshape(-1, 1)
+    volumes = np.broadcast_to(volumes, (n, years)) if volumes.shape[1] == 1 else volumes
+    if volumes.shape != (n, years):
+        raise ValueError(f"Expected production volumes for {n} design(s) over {years} year(s), got shape {volumes.shape}")
+    features = [designs[:, i] for i in range(5)]
+    price = designs[:, 5]
+    keys = _year_keys(segments, designs, volumes, settings)
+
+    # Leading years shared with the earlier run
+    resumed = 0
+    if resume is not None:
+        shared = min(len(resume.keys), years)
+        resumed = int(np.argmin(np.append(resume.keys[:shared] == keys[:shared], False)))
+    preferences = np.empty((years, *segments.preferences.shape))
+    history = {field: np.zeros((years, n), dtype=np.intp if field == "segment" else np.int64) for field in _YEAR_FIELDS}
+    # A fractional price would be truncated in an int64 profit
+    history["profit"] = np.zeros((years, n), dtype=np.result_type(price, np.int64))
+    if resumed:
+        preferences[:resumed] = resume.preferences[:resumed]
+        for field in _YEAR_FIELDS:
+            history[field][:resumed] = getattr(resume, field)[:resumed]
+        current = preferences[resumed - 1]
+        inventory = history["inventory"][resumed - 1].copy()
+        cumulative = history["production"][:resumed].sum(axis=0)
+    else:
+        current = segments.preferences.astype(np.float64)
+        inventory = np.zeros(n, dtype=np.int64)
+        cumulative = np.zeros(n, dtype=np.int64)
+
+    learning = math.log2(settings.learning_rate)
+    for year in range(resumed + 1, years + 1):
+        if year > 1:
+            current = _drift_preferences(current, year, settings)
+        best, demand, cost = _year_demand(segments, features, price, current, year)
+        production = np.clip(volumes[:, year - 1], 0, settings.capacity)
+        unit_cost = np.rint(cost * (np.maximum(cumulative, settings.learning_volume) / settings.learning_volume) ** learning).astype(np.int64)
+        sales = np.minimum(demand, inventory + production)
+        inventory = inventory + production - sales
+        holding = np.rint(inventory * unit_cost * settings.holding_rate).astype(np.int64)
+        cumulative = cumulative + production
+        row = year - 1
+        preferences[row] = current
+        history["segment"][row] = best
+        history["demand"][row] = demand
+        history["production"][row] = production
+        history["sales"][row] = sales
+        history["inventory"][row] = inventory
+        history["unit_cost"][row] = unit_cost
+        history["profit"][row] = sales * price - production * unit_cost - holding
+    return ProductionRun(keys, preferences, resumed=resumed, **history)
+
+# Checkpoints on disk: a run saved with save_production_run can be loaded in a later
+# process and passed as `resume`
+def save_production_run(run, path):
+    with open(path, "wb") as f:
+        np.savez_compressed(f, **{field: getattr(run, field) for field in ProductionRun._fields if field != "resumed"})
+
+def load_production_run(path):
+    with np.load(path) as saved:
+        return ProductionRun(resumed=0, **{field: saved[field] for field in ProductionRun._fields if field != "resumed"})
+
+# Long-form table of a run: one row per design and year
+def production_frame(run, index=None):
+    import pandas as pd
+
+    years, n = run.profit.shape
+    design = np.arange(n) if index is None else np.asarray(index)
+    return pd.DataFrame({
+        "Design": np.tile(design, years),
+        "Year": np.arange(1, years + 1).repeat(n),
+        "Best Market Segment": market_model.market_segments.names[run.segment.reshape(-1)],
+        "Demand": run.demand.reshape(-1),
+        "Production": run.production.reshape(-1),
+        "Sales": run.sales.reshape(-1),
+        "Inventory": run.inventory.reshape(-1),
+        "Unit Cost": run.unit_cost.reshape(-1),
+        "Profit": run.profit.reshape(-1)
+    })
@@ -0,0 +1,437 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+
+import numpy as np
+
+import market_model
+from market_model import DESIGN_COLUMNS, FEEDBACK_MESSAGES
+
+# Local HTTP service for the market model, so LMS and grading scripts can score designs
+# without driving the Streamlit UI. Plain asyncio, no web framework:
+#   python -m car_market_game serve [--host 127.0.0.1] [--port 8765]
+# Endpoints (JSON in, JSON out; design keys are DESIGN_COLUMNS in any case):
+#   POST /simulate         one design, e.g. {"Speed": 5, ..., "Price": 30000}; returns the
+#                          fields simulate_market_performance returns. Features must be
+#                          1-10 and the price 10,000-200,000 (market_model.DESIGN_RANGES),
+#                          else 400
+#   POST /simulate/batch   designs as NDJSON (one object per line) or one JSON array.
+#                          Results stream back as NDJSON, one line per design in input
+#                          order, while the rest of the request is still being read; a
+#                          line that isn't a valid design gets {"error": ..., "line": n}
+#   POST /feedback         {"profit": ..., "sales": ...} (sales optional); returns
+#                          {"Feedback": ...} from get_feedback_for_profit
+#   GET  /health           status and micro-batching counters
+# Concurrent /simulate requests are micro-batched: requests arriving within
+# SERVICE_BATCH_WINDOW seconds of the first are scored together in one vectorized call.
+SERVICE_HOST = os.getenv("CAR_MARKET_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("CAR_MARKET_SERVICE_PORT", "8765"))
+SERVICE_BATCH_WINDOW = float(os.getenv("CAR_MARKET_SERVICE_BATCH_WINDOW", "0.002"))
+SERVICE_BATCH_MAX = 1024
+# Designs per streamed chunk of a /simulate/batch response
+SERVICE_CHUNK_SIZE = 4096
+# Largest body accepted by the single-object endpoints, and by /simulate/batch as a JSON array
+MAX_BODY_BYTES = 1 << 20
+MAX_ARRAY_BYTES = 64 << 20
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+    413: "Payload Too Large", 500: "Internal Server Error"
+}
+_COLUMN_KEYS = {column.lower(): column for column in DESIGN_COLUMNS}
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _json_bytes(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# One design from a decoded JSON object, as a DESIGN_COLUMNS tuple of ints and floats
+def parse_design(obj):
+    if not isinstance(obj, dict):
+        raise ValueError("design must be a JSON object")
+    try:
+        # Keys spelled exactly as DESIGN_COLUMNS, as in our own exports
+        design = tuple(obj[column] for column in DESIGN_COLUMNS)
+    except KeyError:
+        keys = {_COLUMN_KEYS.get(str(key).strip().lower()): value for key, value in obj.items()}
+        missing = [column for column in DESIGN_COLUMNS if column not in keys]
+        if missing:
+            raise ValueError(f"design is missing {', '.join(missing)}") from None
+        design = tuple(keys[column] for column in DESIGN_COLUMNS)
+    for column, value in zip(DESIGN_COLUMNS, design):
+        # type() rather than isinstance() keeps JSON true/false out; the range test catches NaN
+        low, high = market_model.DESIGN_RANGES[column]
+        if type(value) is not int and type(value) is not float or not low <= value <= high:
+            raise ValueError(f"{column} must be a number from {low:,} to {high:,}")
+    return design
+
+# Score DESIGN_COLUMNS tuples in vectorized passes, yielding (design indexes, best segment,
+# sales, profit, cost, tier) per pass. All-integer designs are scored apart from the rest,
+# so slider designs keep integer results (and the design table) even when batched with
+# fractional ones.
+def _score_groups(designs):
+    groups = {}
+    for i, design in enumerate(designs):
+        groups.setdefault(all(type(value) is int for value in design), []).append(i)
+    for integral, indexes in groups.items():
+        columns = np.array([designs[i] for i in indexes], dtype=np.int64 if integral else np.float64).T
+        yield (indexes, *market_model.simulate_market_arrays(*columns))
+
+# simulate_market_performance's dict for each design, from vectorized passes
+def simulate_designs(designs):
+    results = [None] * len(designs)
+    for indexes, best, sales, profit, cost, tier in _score_groups(designs):
+        names = market_model.market_segments.names[best].tolist()
+        for i, name, design_sales, design_profit, design_cost, design_tier in zip(
+            indexes, names, sales.tolist(), profit.tolist(), cost.tolist(), tier.tolist()
+        ):
+            results[i] = {
+                "Feedback": FEEDBACK_MESSAGES[design_tier],
+                "Best Market Segment": name,
+                "Estimated Sales": design_sales,
+                "Profit": design_profit,
+                "Cost": design_cost
+            }
+    return results
+
+# The same results as JSON lines, filled into a template instead of one json.dumps per
+# design; byte for byte what _json_bytes gives for simulate_designs' dicts
+_RESULT_LINE = b'{"Feedback":%s,"Best Market Segment":%s,"Estimated Sales":%d,"Profit":%s,"Cost":%s}'
+_FEEDBACK_JSON = [_json_bytes(message) for message in FEEDBACK_MESSAGES]
+
+def _result_lines(designs):
+    lines = [None] * len(designs)
+    for indexes, best, sales, profit, cost, tier in _score_groups(designs):
+        names = market_model.market_segments.names
+        segment_json = {segment: _json_bytes(names[segment]) for segment in np.unique(best).tolist()}
+        for i, segment, design_sales, design_profit, design_cost, design_tier in zip(
+            indexes, best.tolist(), sales.tolist(), profit.tolist(), cost.tolist(), tier.tolist()
+        ):
+            lines[i] = _RESULT_LINE % (
+                _FEEDBACK_JSON[design_tier], segment_json[segment], design_sales, repr(design_profit).encode(), repr(design_cost).encode()
+            )
+    return lines
+
+# Coalesces concurrent single-design requests into vectorized batches. Lives on the event
+# loop: submit() queues a design and the batch runs when the window closes or fills up.
+class MicroBatcher:
+    def __init__(self, window=SERVICE_BATCH_WINDOW, max_batch=SERVICE_BATCH_MAX):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        self.batches = 0
+        self.designs = 0
+
+    def submit(self, design):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((design, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        self.batches += 1
+        self.designs += len(pending)
+        try:
+            results = simulate_designs([design for design, _ in pending])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+# Request body pieces, for Content-Length or chunked transfer encoding. A body longer
+# than `limit` bytes (None: no limit) is refused with a 413 as soon as a header or chunk
+# size announces it, before it is read, and large chunks are read a slice at a time, so
+# a declared size never decides how much the server buffers.
+async def _body_pieces(reader, headers, limit=None):
+    remaining = math.inf if limit is None else limit
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size_line = await reader.readline()
+            try:
+                size = int(size_line.split(b";")[0].strip(), 16)
+            except ValueError:
+                raise RequestError(400, "malformed chunked body") from None
+            if size < 0:
+                raise RequestError(400, "malformed chunked body")
+            if size > remaining:
+                raise RequestError(413, f"body is larger than {limit:,} bytes")
+            if size == 0:
+                # Skip any trailers up to the blank line
+                while (await reader.readline()).strip():
+                    pass
+                return
+            remaining -= size
+            while size > 0:
+                piece = await reader.readexactly(min(size, 1 << 16))
+                size -= len(piece)
+                yield piece
+            await reader.readexactly(2)
+    elif "content-length" in headers:
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise RequestError(400, "malformed Content-Length") from None
+        if length < 0:
+            raise RequestError(400, "malformed Content-Length")
+        if length > remaining:
+            raise RequestError(413, f"body is larger than {limit:,} bytes")
+        while length > 0:
+            piece = await reader.read(min(length, 1 << 16))
+            if not piece:
+                raise asyncio.IncompleteReadError(b"", length)
+            length -= len(piece)
+            yield piece
+
+async def _read_body(reader, headers, limit):
+    if "content-length" not in headers and "chunked" not in headers.get("transfer-encoding", "").lower():
+        raise RequestError(411, "request needs a Content-Length or chunked body")
+    body = bytearray()
+    async for piece in _body_pieces(reader, headers, limit):
+        body += piece
+    return bytes(body)
+
+def _decode_json(body):
+    try:
+        return json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise RequestError(400, f"invalid JSON: {e}") from None
+
+# Designs of a /simulate/batch body as (line number, item) pairs, as the body arrives.
+# An item is a raw NDJSON line or an already decoded array element; _chunk_ndjson parses
+# them off the event loop.
+async def _batch_items(reader, headers):
+    # NDJSON bodies stream without a total limit; pieces are at most 64 KiB, so the
+    # array and line limits below bound what is buffered
+    pieces = _body_pieces(reader, headers)
+    buffered = b""
+    async for piece in pieces:
+        buffered += piece
+        if buffered.strip():
+            break
+    if buffered.lstrip().startswith(b"["):
+        # A JSON array has to be read whole
+        body = bytearray(buffered)
+        async for piece in pieces:
+            body += piece
+            if len(body) > MAX_ARRAY_BYTES:
+                raise RequestError(413, f"JSON array bodies are limited to {MAX_ARRAY_BYTES:,} bytes; send NDJSON instead")
+        designs = await asyncio.to_thread(_decode_json, bytes(body))
+        if not isinstance(designs, list):
+            raise RequestError(400, "batch body must be a JSON array or NDJSON")
+        for number, obj in enumerate(designs, 1):
+            yield number, obj
+        return
+    number = 0
+    while True:
+        *lines, buffered = buffered.split(b"\n")
+        for line in lines:
+            number += 1
+            yield number, line
+        if len(buffered) > MAX_BODY_BYTES:
+            raise RequestError(413, f"NDJSON line {number + 1} is longer than {MAX_BODY_BYTES:,} bytes")
+        piece = await anext(pieces, None)
+        if piece is None:
+            break
+        buffered += piece
+    if buffered.strip():
+        yield number + 1, buffered
+
+# A batch item as a DESIGN_COLUMNS tuple, or the error message for its line
+def _parse_item(item):
+    if isinstance(item, bytes):
+        if not item.strip():
+            return "empty line"
+        try:
+            item = json.loads(item)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            return f"invalid JSON: {e}"
+    try:
+        return parse_design(item)
+    except ValueError as e:
+        return str(e)
+
+class SimulationService:
+    def __init__(self, batch_window=SERVICE_BATCH_WINDOW, chunk_size=SERVICE_CHUNK_SIZE):
+        self.batcher = MicroBatcher(batch_window)
+        self.chunk_size = chunk_size
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while await self._handle_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # ValueError: StreamReader.readline() on a header line over the stream limit
+            pass
+        except Exception:
+            logging.getLogger(__name__).exception("Simulation service request failed")
+        finally:
+            writer.close()
+
+    # Serve one request; returns whether the connection stays open for another
+    async def _handle_request(self, reader, writer):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return False
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            self._respond(writer, 400, {"error": "malformed request line"}, False)
+            return False
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if not line.strip():
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        path = target.split("?", 1)[0]
+        try:
+            if path == "/simulate/batch":
+                self._require(method, "POST")
+                keep_alive = await self._simulate_batch(reader, writer, headers, keep_alive)
+            elif path == "/simulate":
+                self._require(method, "POST")
+                design = self._parse(parse_design, _decode_json(await _read_body(reader, headers, MAX_BODY_BYTES)))
+                self._respond(writer, 200, await self.batcher.submit(design), keep_alive)
+            elif path == "/feedback":
+                self._require(method, "POST")
+                self._respond(writer, 200, self._feedback(_decode_json(await _read_body(reader, headers, MAX_BODY_BYTES))), keep_alive)
+            elif path == "/health":
+                self._require(method, "GET")
+                self._respond(writer, 200, {
+                    "status": "ok",
+                    "segments": len(market_model.market_segments.names),
+                    "batches": self.batcher.batches,
+                    "batched_designs": self.batcher.designs
+                }, keep_alive)
+            else:
+                raise RequestError(404, f"no endpoint at {path}")
+        except RequestError as e:
+            # The unread part of a rejected body would be taken for the next request
+            self._respond(writer, e.status, {"error": str(e)}, False)
+            await writer.drain()
+            return False
+        await writer.drain()
+        return keep_alive
+
+    @staticmethod
+    def _require(method, allowed):
+        if method != allowed:
+            raise RequestError(405, f"use {allowed}")
+
+    @staticmethod
+    def _parse(parser, value):
+        try:
+            return parser(value)
+        except ValueError as e:
+            raise RequestError(400, str(e)) from None
+
+    @staticmethod
+    def _feedback(obj):
+        if not isinstance(obj, dict) or "profit" not in obj:
+            raise RequestError(400, "body must be a JSON object with profit and optional sales")
+        profit, sales = obj["profit"], obj.get("sales")
+        for name, value in (("profit", profit), ("sales", sales)):
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value)):
+                raise RequestError(400, f"{name} must be a number")
+        return {"Feedback": market_model.get_feedback_for_profit(profit, sales)}
+
+    @staticmethod
+    def _respond(writer, status, value, keep_alive):
+        body = _json_bytes(value)
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+            + body
+        )
+
+    # Stream NDJSON results chunk by chunk; chunks are scored in a worker thread so other
+    # connections keep being served during a large batch. Results are written as soon as
+    # they are ready but only drained once the whole body is in: most HTTP clients send the
+    # entire body before reading, and waiting for them to read would deadlock both sides
+    # on full socket buffers. Returns whether the connection can be kept open.
+    async def _simulate_batch(self, reader, writer, headers, keep_alive):
+        if "content-length" not in headers and "chunked" not in headers.get("transfer-encoding", "").lower():
+            raise RequestError(411, "request needs a Content-Length or chunked body")
+        items = _batch_items(reader, headers)
+        # Errors in reading the first item (e.g. a bad JSON array) still get a plain error response
+        first = await anext(items, None)
+        writer.write(
+            f"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+        )
+        chunk = [first] if first is not None else []
+        try:
+            async for item in items:
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size:
+                    await self._write_chunk(writer, chunk)
+                    chunk = []
+        except RequestError as e:
+            # The response has started: end it with an error line and drop the connection
+            if chunk:
+                await self._write_chunk(writer, chunk)
+            data = _json_bytes({"error": str(e)}) + b"\n"
+            writer.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data))
+            return False
+        if chunk:
+            await self._write_chunk(writer, chunk)
+        writer.write(b"0\r\n\r\n")
+        return keep_alive
+
+    async def _write_chunk(self, writer, chunk):
+        data = await asyncio.to_thread(_chunk_ndjson, chunk)
+        writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+# NDJSON results for a chunk of (line number, item) pairs, in order
+def _chunk_ndjson(chunk):
+    designs = [_parse_item(item) for _, item in chunk]
+    valid = [i for i, design in enumerate(designs) if isinstance(design, tuple)]
+    lines = [None] * len(chunk)
+    for i, line in zip(valid, _result_lines([designs[i] for i in valid])):
+        lines[i] = line
+    for i, (number, _) in enumerate(chunk):
+        if lines[i] is None:
+            lines[i] = _json_bytes({"error": designs[i], "line": number})
+    return b"\n".join(lines) + b"\n"
+
+# Start the service on the running event loop; returns the asyncio server
+async def start_service(host=SERVICE_HOST, port=SERVICE_PORT, batch_window=SERVICE_BATCH_WINDOW):
+    # Load the design table now rather than in the first request
+    market_model.load_design_table()
+    service = SimulationService(batch_window)
+    return await asyncio.start_server(service.handle_connection, host, port, limit=MAX_BODY_BYTES)
+
+async def _serve(host, port, batch_window):
+    server = await start_service(host, port, batch_window)
+    address = server.sockets[0].getsockname()
+    print(f"Simulation service listening on http://{address[0]}:{address[1]}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, batch_window=SERVICE_BATCH_WINDOW):
+    try:
+        asyncio.run(_serve(host, port, batch_window))
+    except KeyboardInterrupt:
+        pass
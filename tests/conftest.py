@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# Keep the suite's design tables, images, leaderboard and event log out of the
+# checkout's .cache, and turn event logging off unless a test asks for it. Set
+# before any app module is imported, since they read these at import time.
+_cache_dir = tempfile.mkdtemp(prefix="car-market-tests-")
+os.environ["CAR_MARKET_CACHE_DIR"] = _cache_dir
+os.environ["CAR_MARKET_EVENT_LOG_DIR"] = ""
+os.environ.pop("OPENAI_API_KEY", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,85 @@
+import importlib
+
+import pytest
+
+import attempt_log
+from attempt_log import AttemptLog
+from market_model import DESIGN_COLUMNS, simulate_market_performance
+
+def _design(i):
+    return dict(zip(DESIGN_COLUMNS, (1 + i % 10, 1 + i // 10 % 10, 5, 6, 7, 10000 + 1000 * (i % 191))))
+
+def _play(log, attempts):
+    played = []
+    for i in attempts:
+        design = _design(i)
+        result = simulate_market_performance(**{column.lower(): value for column, value in design.items()})
+        log.append(design, result)
+        played.append((design, result))
+    return played
+
+@pytest.fixture
+def capped(monkeypatch):
+    # MAX_ATTEMPTS is read at import time
+    monkeypatch.setenv("CAR_MARKET_MAX_ATTEMPTS", "5")
+    yield importlib.reload(attempt_log)
+    monkeypatch.delenv("CAR_MARKET_MAX_ATTEMPTS")
+    importlib.reload(attempt_log)
+
+def test_oldest_attempts_are_evicted_past_the_cap(capped):
+    assert capped.MAX_ATTEMPTS == 5
+    log = capped.AttemptLog()
+    played = _play(log, range(12))
+    assert len(log) == 5 and log.first_number == 8
+    assert [log.number(i) for i in range(5)] == [8, 9, 10, 11, 12]
+    assert [log.design(i) for i in range(5)] == [design for design, _ in played[7:]]
+    assert log.design(-1) == played[-1][0]
+    with pytest.raises(IndexError):
+        log.design(5)
+
+def test_designs_and_results_round_trip():
+    log = AttemptLog()
+    played = _play(log, range(0, 300, 7))
+    for i, (design, result) in enumerate(played):
+        assert log.design(i) == design
+        assert log.result(i) == result
+    assert log.design_tuples() == tuple(tuple(design.values()) for design, _ in played)
+    assert not log.records().flags.writeable
+
+def test_competitive_fields_round_trip():
+    log = AttemptLog()
+    design = _design(3)
+    result = dict(simulate_market_performance(*design.values()), **{"Market Share": 0.123456789012, "Competitors": 17})
+    log.append(design, result)
+    log.append(design, simulate_market_performance(*design.values()))
+    assert log.result(0) == result
+    assert "Competitors" not in log.result(1) and "Market Share" not in log.result(1)
+
+def test_best_index_takes_the_first_of_equal_profits():
+    log = AttemptLog()
+    design = _design(4)
+    result = simulate_market_performance(*design.values())
+    for profit in (100, 500, 200, 500):
+        log.append(design, dict(result, Profit=profit))
+    assert log.best_index() == 1
+
+@pytest.mark.parametrize("design_changes, result_changes", [
+    ({"Price": 2 ** 32}, {}),
+    ({"Price": -1}, {}),
+    ({"Price": 30000.5}, {}),
+    ({"Speed": 256}, {}),
+    ({"Speed": 5.5}, {}),
+    ({}, {"Cost": 2 ** 32 + 5}),
+    ({}, {"Cost": float("nan")}),
+    ({}, {"Profit": 2 ** 63}),
+    ({}, {"Estimated Sales": -3}),
+])
+def test_values_that_do_not_fit_are_refused(design_changes, result_changes):
+    log = AttemptLog(max_attempts=1)
+    design = _design(5)
+    result = simulate_market_performance(*design.values())
+    log.append(design, result)
+    with pytest.raises(ValueError, match="doesn't fit the attempt log"):
+        log.append(dict(design, **design_changes), dict(result, **result_changes))
+    # Nothing was evicted or overwritten
+    assert len(log) == 1 and log.first_number == 1 and log.result(0) == result
@@ -0,0 +1,64 @@
+import io
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch_cli
+from market_model import DESIGN_COLUMNS, simulate_market_batch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _designs_csv(path, n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    designs = pd.DataFrame(rng.integers(1, 11, size=(n, 5)), columns=[column.lower() for column in DESIGN_COLUMNS[:5]])
+    designs["Price"] = rng.integers(10, 201, size=n) * 1000
+    designs["Student"] = np.arange(n)
+    designs.to_csv(path, index=False)
+    return designs
+
+def test_module_entry_point_runs_headless_without_loading_the_ui(tmp_path):
+    source = tmp_path / "designs.csv"
+    output = tmp_path / "results.csv"
+    _designs_csv(source)
+    probe = (
+        "import runpy, sys; sys.argv = ['car_market_game'] + sys.argv[1:]\n"
+        "try:\n    runpy.run_module('car_market_game', run_name='__main__')\n"
+        "finally:\n    print(sorted(name for name in sys.modules if name.split('.')[0] in ('streamlit', 'app_cache')), file=sys.stderr)"
+    )
+    done = subprocess.run(
+        [sys.executable, "-c", probe, "simulate", str(source), "-o", str(output)],
+        cwd=ROOT, capture_output=True, text=True, timeout=120
+    )
+    assert done.returncode == 0, done.stderr
+    lines = done.stderr.splitlines()
+    assert lines[-1] == "[]"
+    assert len(lines) == 2 and lines[0].startswith("Simulated 300 designs")
+    assert len(pd.read_csv(output)) == 300
+
+def test_simulate_matches_the_batch_model_with_any_worker_count(tmp_path):
+    source = tmp_path / "designs.csv"
+    designs = _designs_csv(source, n=1000)
+    expected = simulate_market_batch(designs.rename(columns=batch_cli._design_column_names(designs.columns)))
+    outputs = []
+    for workers in (1, 2):
+        output = io.StringIO()
+        assert batch_cli.simulate_designs(str(source), output, chunk_size=128, workers=workers) == 1000
+        outputs.append(output.getvalue())
+    assert outputs[0] == outputs[1]
+    results = pd.read_csv(io.StringIO(outputs[0]))
+    assert (results["Profit"].to_numpy() == expected["Profit"].to_numpy()).all()
+    assert (results["Student"].to_numpy() == designs["Student"].to_numpy()).all()
+
+def test_simulate_refuses_out_of_range_designs(tmp_path, capsys):
+    source = tmp_path / "designs.csv"
+    designs = _designs_csv(source, n=50)
+    designs.loc[31, "Price"] = 10**15
+    designs.to_csv(source, index=False)
+    with pytest.raises(SystemExit) as exit_info:
+        batch_cli.main(["simulate", str(source), "-o", str(tmp_path / "results.csv")])
+    assert exit_info.value.code == 2
+    assert "Price of design 31 is 1000000000000000" in capsys.readouterr().err
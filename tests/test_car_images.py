@@ -0,0 +1,216 @@
+import base64
+import importlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import image_cache
+
+# 1x1 transparent PNG, as served by loadtest.py's mock provider
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082"
+)
+
+# Local stand-in for the image generation API. Each request first pops the next status
+# from `script` (answering it with an error body), and once the script is used up
+# returns PNG after `latency` seconds. Counts requests and the most seen at once.
+class StubImageProvider:
+    def __init__(self, script=(), latency=0.0):
+        self.script = list(script)
+        self.latency = latency
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with provider._lock:
+                    provider.requests += 1
+                    provider.in_flight += 1
+                    provider.max_in_flight = max(provider.max_in_flight, provider.in_flight)
+                    status = provider.script.pop(0) if provider.script else 200
+                try:
+                    if status == 200:
+                        time.sleep(provider.latency)
+                        body = json.dumps({"data": [{"b64_json": base64.b64encode(PNG).decode("ascii")}]}).encode("utf-8")
+                    else:
+                        body = json.dumps({"error": {"message": f"stub status {status}"}}).encode("utf-8")
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with provider._lock:
+                        provider.in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def provider():
+    stub = StubImageProvider()
+    yield stub
+    stub.close()
+
+# car_images re-imported against the stub, with its own empty image cache. The module
+# reads its settings at import time, so they are set in the environment first.
+@pytest.fixture
+def car_images(provider, tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_BASE_URL", provider.url)
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("CAR_MARKET_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("CAR_IMAGE_READ_TIMEOUT", "1")
+    monkeypatch.setenv("CAR_IMAGE_MAX_CONCURRENCY", "2")
+    monkeypatch.setenv("CAR_IMAGE_QUEUE_LIMIT", "4")
+    monkeypatch.setenv("CAR_IMAGE_PREFETCH", "1")
+    import car_images
+    return importlib.reload(car_images)
+
+# Backoff delays the retry policy asks for, recorded instead of slept
+@pytest.fixture
+def backoffs(monkeypatch):
+    from urllib3.util.retry import Retry
+
+    delays = []
+    monkeypatch.setattr(Retry, "_sleep_backoff", lambda retry: delays.append(retry.get_backoff_time()))
+    return delays
+
+PROMPT_DESIGN = (5, 6, 7, 6, 7, 30000)
+
+def test_background_generation_returns_a_future_with_the_cached_image(car_images, provider):
+    provider.latency = 0.3
+    prompt = car_images.build_car_image_prompt(*PROMPT_DESIGN)
+    started = time.perf_counter()
+    future = car_images.submit_car_image(prompt)
+    assert time.perf_counter() - started < 0.2
+    assert not future.done()
+    path = future.result(timeout=10)
+    with open(path, "rb") as f:
+        assert f.read() == PNG
+    # A second generation for the same prompt comes from the disk cache
+    assert car_images.submit_car_image(prompt).result(timeout=10) == path
+    assert provider.requests == 1
+    assert car_images.image_cache_stats()["hits"] == 1
+
+def test_submissions_past_the_queue_limit_fail_fast(car_images, provider):
+    provider.latency = 0.5
+    futures = [car_images.submit_car_image(f"prompt {i}") for i in range(6)]
+    results = [future.result(timeout=10) for future in futures]
+    busy = [result for result in results if str(result).startswith("Error: Image generator is busy")]
+    assert len(busy) == 2
+    assert provider.requests == 4
+
+def test_prefetch_starts_once_inputs_are_stable_and_is_reused(car_images, provider):
+    session = {}
+    prompt = car_images.build_car_image_prompt(*PROMPT_DESIGN)
+    car_images.prefetch_car_image(session, prompt)
+    assert session.get("image_prefetch") is None
+    car_images.prefetch_car_image(session, prompt)
+    prefetched = session["image_prefetch"][1]
+    assert car_images.take_car_image(session, prompt) is prefetched
+    assert session["image_prefetch"] is None
+    prefetched.result(timeout=10)
+    assert provider.requests == 1
+
+def test_concurrent_misses_for_one_prompt_share_a_single_request(car_images, provider):
+    provider.latency = 0.3
+    prompt = car_images.build_car_image_prompt(*PROMPT_DESIGN)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def generate():
+        barrier.wait()
+        results.append(car_images.generate_image_for_prompt(prompt))
+
+    threads = [threading.Thread(target=generate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == 1 and os.path.exists(results[0])
+    assert provider.requests == 1
+    stats = car_images.image_cache_stats()
+    assert (stats["misses"], stats["coalesced"], stats["entries"]) == (1, 7, 1)
+
+def test_errors_are_passed_through_and_not_cached(car_images, provider):
+    provider.script = [400]
+    prompt = car_images.build_car_image_prompt(*PROMPT_DESIGN)
+    assert car_images.generate_image_for_prompt(prompt).startswith("Error: 400")
+    assert os.path.exists(car_images.generate_image_for_prompt(prompt))
+    assert provider.requests == 2
+
+def test_cache_evicts_least_recently_used_entries_over_the_size_limit(tmp_path):
+    cache = image_cache.ImageCache(str(tmp_path), max_bytes=3 * len(PNG))
+    paths = [cache.put(f"key{i}", PNG) for i in range(3)]
+    now = time.time()
+    for i, path in enumerate(paths):
+        os.utime(path, (now - 300 + i, now - 300 + i))
+    os.utime(paths[0], None)  # key0 used most recently
+    cache.put("key3", PNG)
+    assert [cache.get(f"key{i}") is not None for i in range(4)] == [True, False, True, True]
+
+def test_cache_drops_entries_older_than_max_age(tmp_path):
+    cache = image_cache.ImageCache(str(tmp_path), max_age=60)
+    old = cache.put("old", PNG)
+    os.utime(old, (time.time() - 120, time.time() - 120))
+    assert cache.get("old") is None
+    cache.put("new", PNG)
+    assert not os.path.exists(old)
+    assert cache.get_or_create("new", lambda: pytest.fail("fresh entry should be a hit")) == cache.path("new")
+
+def test_429_and_5xx_are_retried_until_the_image_arrives(car_images, provider, backoffs):
+    provider.script = [429, 503, 502]
+    path = car_images.generate_image_for_prompt("retry me")
+    assert os.path.exists(path)
+    assert provider.requests == 4
+    # Exponential backoff (0, 1s, 2s) plus up to 0.5s of jitter
+    assert backoffs[0] == 0 and 1 <= backoffs[1] <= 1.5 and 2 <= backoffs[2] <= 2.5
+
+def test_retries_are_bounded(car_images, provider, backoffs):
+    provider.script = [429] * 10
+    assert car_images.generate_image_for_prompt("always limited").startswith("Error: 429")
+    assert provider.requests == 1 + car_images.IMAGE_MAX_RETRIES
+    assert len(backoffs) == car_images.IMAGE_MAX_RETRIES
+
+def test_read_timeouts_are_not_retried(car_images, provider):
+    provider.latency = 2 * car_images.IMAGE_READ_TIMEOUT
+    started = time.perf_counter()
+    result = car_images.generate_image_for_prompt("slow generation")
+    assert result.startswith("Error generating image")
+    assert time.perf_counter() - started < provider.latency + 0.5
+    assert provider.requests == 1
+
+def test_upstream_concurrency_is_limited(car_images, provider):
+    provider.latency = 0.3
+    threads = [threading.Thread(target=car_images.generate_image_for_prompt, args=(f"design {i}",)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert provider.requests == 6
+    assert provider.max_in_flight == car_images.IMAGE_MAX_CONCURRENCY == 2
+
+def test_requests_share_one_pooled_session(car_images, provider):
+    car_images.generate_image_for_prompt("first")
+    session = car_images.http_session
+    car_images.generate_image_for_prompt("second")
+    assert car_images.http_session is session
+    assert provider.requests == 2
@@ -0,0 +1,13 @@
+import car_market_game
+import market_model
+
+def test_model_and_image_functions_are_still_importable_from_the_app():
+    from car_market_game import FEEDBACK_MESSAGES, generate_car_image, market_data, simulate_market_batch
+
+    assert simulate_market_batch is market_model.simulate_market_batch
+    # (test_car_images reloads car_images, so compare where the function comes from)
+    assert (generate_car_image.__module__, generate_car_image.__name__) == ("car_images", "generate_car_image")
+    assert FEEDBACK_MESSAGES is market_model.FEEDBACK_MESSAGES
+    assert market_data is market_model.market_data
+    for name in car_market_game.__all__:
+        assert hasattr(car_market_game, name), name
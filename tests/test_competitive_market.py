@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from competitive_market import CompetitiveMarket, clear_market
+from market_model import DESIGN_COLUMNS, simulate_market_performance
+
+def _designs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    designs = pd.DataFrame(rng.integers(1, 11, size=(n, 5)), columns=DESIGN_COLUMNS[:5])
+    designs["Price"] = rng.integers(10, 201, size=n) * 1000
+    return designs
+
+def test_incremental_market_matches_clearing_the_round_at_once():
+    designs = _designs(400)
+    market = CompetitiveMarket()
+    for player, design in enumerate(designs.itertuples(index=False)):
+        market.submit(player, *design)
+    # Resubmissions replace a player's earlier design
+    for player in range(0, 400, 7):
+        market.submit(player, *designs.iloc[player])
+    cleared = clear_market(designs)
+    results = market.results()
+    assert (results["Estimated Sales"].to_numpy() == cleared["Estimated Sales"].to_numpy()).all()
+    assert np.allclose(results["Market Share"].to_numpy(), cleared["Market Share"].to_numpy())
+
+def test_a_car_alone_in_its_segment_sells_as_in_the_single_player_game():
+    market = CompetitiveMarket()
+    outcome = market.submit("solo", 5, 6, 7, 6, 7, 30000)
+    expected = simulate_market_performance(5, 6, 7, 6, 7, 30000)
+    assert {key: outcome[key] for key in expected} == expected
+    assert outcome["Competitors"] == 0
+
+def test_an_evicted_class_market_is_rebuilt_with_every_submission():
+    from app_cache import class_market, submit_class_design
+
+    designs = _designs(30, seed=1)
+    for player, design in enumerate(designs.itertuples(index=False)):
+        submit_class_design("period-3", 2, f"session-{player}", tuple(design))
+    submit_class_design("period-3", 2, "session-0", tuple(designs.iloc[1]))
+    before = class_market("period-3", 2).results()
+
+    class_market.clear()
+    rebuilt = class_market("period-3", 2)
+    assert len(rebuilt) == 30
+    assert rebuilt.results().sort_index().equals(before.sort_index())
+    # Other rounds and classes stay separate
+    assert len(class_market("period-3", 1)) == 0 and len(class_market("period-4", 2)) == 0
@@ -0,0 +1,62 @@
+import threading
+
+import numpy as np
+
+import market_model
+from market_model import simulate_market_batch, simulate_market_performance
+
+THREADS = 16
+DESIGNS_PER_THREAD = 400
+
+def _designs(seed, n):
+    rng = np.random.default_rng(seed)
+    levels = rng.integers(1, 11, size=(n, 5)).tolist()
+    prices = (rng.integers(10, 201, size=n) * 1000).tolist()
+    # Mix in off-grid designs so both the table lookup and the scan path are exercised
+    designs = [(*level, price) for level, price in zip(levels, prices)]
+    designs += [(min(level[0], 9) + 0.5, *level[1:], price) for level, price in zip(levels[:n // 4], prices[:n // 4])]
+    return designs
+
+# Run `work(i)` on THREADS threads released together, returning each thread's result
+def _run_concurrently(work):
+    barrier = threading.Barrier(THREADS)
+    results = [None] * THREADS
+    errors = []
+
+    def run(i):
+        try:
+            barrier.wait()
+            results[i] = work(i)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors
+    return results
+
+def test_concurrent_sessions_match_serial_runs():
+    workloads = [_designs(i, DESIGNS_PER_THREAD) for i in range(THREADS)]
+    serial = [[simulate_market_performance(*design) for design in designs] for designs in workloads]
+    concurrent = _run_concurrently(lambda i: [simulate_market_performance(*design) for design in workloads[i]])
+    assert concurrent == serial
+
+def test_concurrent_batches_match_serial_runs():
+    workloads = [np.array(_designs(100 + i, DESIGNS_PER_THREAD)) for i in range(THREADS)]
+    serial = [simulate_market_batch(*designs.T) for designs in workloads]
+    concurrent = _run_concurrently(lambda i: simulate_market_batch(*workloads[i].T))
+    for expected, got in zip(serial, concurrent):
+        assert got.equals(expected)
+
+def test_concurrent_first_use_builds_one_design_table(tmp_path):
+    segments = market_model.market_segments
+    tables = _run_concurrently(lambda i: market_model.load_design_table(segments, str(tmp_path)))
+    assert all(table is tables[0] for table in tables)
+
+def test_segment_snapshot_is_read_only():
+    segments = market_model.market_segments
+    for array in (segments.names, segments.avg_price, segments.market_size, segments.preferences):
+        assert not array.flags.writeable
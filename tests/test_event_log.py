@@ -0,0 +1,91 @@
+import os
+
+import pyarrow as pa
+import pytest
+
+import event_log
+import market_model
+from event_log import EventAnalytics, EventLog
+
+DESIGN = {"Speed": 5, "Aesthetics": 6, "Reliability": 7, "Efficiency": 6, "Tech": 7, "Price": 30000}
+
+def _result(profit, segment="Family"):
+    return {"Best Market Segment": segment, "Estimated Sales": 1000, "Profit": profit, "Cost": 25000}
+
+def _files(directory):
+    return sorted(
+        os.path.join(root, name) for root, _, names in os.walk(directory) for name in names
+    )
+
+@pytest.fixture
+def log(tmp_path):
+    # A long flush interval, so nothing reaches the disk until flush() is called
+    return EventLog(str(tmp_path), flush_interval=60)
+
+def test_flush_writes_one_arrow_file_per_day_partition(log, tmp_path):
+    for attempt in (1, 2, 3):
+        log.record_simulation("s1", "Ada", "CLASS", attempt, DESIGN, _result(1000.0 * attempt))
+    log.record_scenario("s1", "Ada", "CLASS", 3, DESIGN, market_model.SCENARIOS[1], "Family", 900, 1500.0, 3000.0)
+    assert _files(tmp_path) == []
+    log.flush()
+
+    files = _files(tmp_path)
+    assert len(files) == 1
+    day, name = files[0].split(os.sep)[-2:]
+    assert day.startswith("day=") and name.startswith("part-") and name.endswith(".arrow")
+    with pa.OSFile(files[0]) as source:
+        table = pa.ipc.open_file(source).read_all()
+    assert table.schema == event_log.event_schema(pa)
+    assert table.column("event").to_pylist() == ["simulate"] * 3 + ["scenario"]
+    assert table.column("profit").to_pylist() == [1000.0, 2000.0, 3000.0, 1500.0]
+    assert table.column("scenario").to_pylist() == [None, None, None, "Tariff +25%"]
+
+def test_refresh_folds_in_only_new_files(log, tmp_path):
+    analytics = EventAnalytics(str(tmp_path), ttl=60)
+    assert analytics.refresh(force=True) == 0
+
+    log.record_simulation("s1", "Ada", "CLASS", 1, DESIGN, _result(1000.0))
+    log.flush()
+    assert analytics.refresh(force=True) == 1
+    assert analytics.events == 1
+    # Within the ttl nothing is listed; a forced refresh with no new files reads nothing
+    assert analytics.refresh() == 0
+    assert analytics.refresh(force=True) == 0
+    assert analytics.events == 1
+
+    log.record_simulation("s1", "Ada", "CLASS", 3, DESIGN, _result(4000.0))
+    log.flush()
+    assert analytics.refresh(force=True) == 1
+    assert analytics.events == 2
+
+def test_summary_per_class_code(log, tmp_path):
+    for session, code, first, third in [("s1", "A", 1000.0, 4000.0), ("s2", "A", 2000.0, 1000.0), ("s3", "B", -500.0, 500.0)]:
+        log.record_simulation(session, "p", code, 1, DESIGN, _result(first, "Budget"))
+        log.record_simulation(session, "p", code, 3, DESIGN, _result(third))
+    log.record_scenario("s1", "p", "A", 3, DESIGN, market_model.SCENARIOS[1], "Family", 900, 3000.0, 4000.0)
+    log.record_simulation("s4", "p", "", 1, DESIGN, _result(100.0))
+    log.flush()
+    analytics = EventAnalytics(str(tmp_path))
+    analytics.refresh(force=True)
+
+    assert analytics.class_codes() == ["", "A", "B"]
+    summary = analytics.summary("A")
+    assert summary["sessions"] == 2
+    assert summary["attempts"] == [
+        {"Attempt": 1, "Simulations": 2, "Average Profit": 1500.0, "Profitable": 1.0},
+        {"Attempt": 3, "Simulations": 2, "Average Profit": 2500.0, "Profitable": 1.0}
+    ]
+    assert summary["segments"] == [{"Segment": "Budget", "Attempt 1": 1.0}, {"Segment": "Family", "Attempt 3": 1.0}]
+    assert summary["improvement"] == [{"Students": 2, "Improved": 0.5, "Average Change": 1000.0, "Median Change": 3000.0}]
+    [impact] = summary["tariff_impact"]
+    assert impact["Scenario"] == "Tariff +25%" and impact["Views"] == 1 and impact["Average Change (%)"] == -25.0
+    assert impact["-30% to -20%"] == 1
+
+    everyone = analytics.summary()
+    assert everyone["sessions"] == 4 and everyone["improvement"][0]["Students"] == 3
+    assert analytics.summary("unknown")["attempts"] == []
+
+def test_logging_is_off_when_the_directory_is_empty():
+    # conftest.py sets CAR_MARKET_EVENT_LOG_DIR to ""
+    assert event_log.EVENT_LOG_DIR == ""
+    assert event_log.get_event_log() is None
@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from leaderboard import Leaderboard
+
+SEGMENTS = ["Budget", "Family", "Luxury"]
+
+def _attempt(i):
+    design = {"Speed": 1 + i % 10, "Aesthetics": 5, "Reliability": 5, "Efficiency": 5, "Tech": 5, "Price": 20000 + i}
+    result = {"Best Market Segment": SEGMENTS[i % 3], "Profit": (i * 7919) % 100000 - 20000, "Estimated Sales": i}
+    return design, result
+
+@pytest.fixture
+def board(tmp_path):
+    return Leaderboard(str(tmp_path / "leaderboard.sqlite3"), cache_ttl=60)
+
+def test_concurrent_writers_keep_the_best_result_per_player_and_segment(board):
+    def play(player):
+        for i in range(player, 3000, 30):
+            board.record(f"student-{player}", *_attempt(i))
+
+    threads = [threading.Thread(target=play, args=(player,)) for player in range(30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    board.flush()
+
+    attempts = [(f"student-{player}", *_attempt(i)) for player in range(30) for i in range(player, 3000, 30)]
+    best = {}
+    for player, _, result in attempts:
+        best[player] = max(best.get(player, result["Profit"]), result["Profit"])
+    expected = sorted(best.values(), reverse=True)[:10]
+    assert [row["profit"] for row in board.top_players(10)] == expected
+
+    family = {}
+    for player, _, result in attempts:
+        if result["Best Market Segment"] == "Family":
+            family[player] = max(family.get(player, result["Profit"]), result["Profit"])
+    top = board.top_in_segment("Family", 5)
+    assert [row["profit"] for row in top] == sorted(family.values(), reverse=True)[:5]
+    assert {row["segment"] for row in board.segment_leaders()} == set(SEGMENTS)
+
+def test_queries_are_cached_until_the_next_write(board):
+    board.record("ann", *_attempt(1))
+    board.flush()
+    first = board.top_players()
+    assert board.top_players() is first
+    board.record("bob", *_attempt(2))
+    board.flush()
+    assert board.top_players() is not first
+    assert {row["player"] for row in board.top_players()} == {"ann", "bob"}
+
+def test_store_uses_wal_and_index_scans(board):
+    connection = sqlite3.connect(board.path)
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    plans = {
+        "best_by_player_profit": "SELECT * FROM best_by_player ORDER BY profit DESC LIMIT 10",
+        "best_by_segment_profit": "SELECT * FROM best_by_segment WHERE segment = 'Family' ORDER BY profit DESC LIMIT 10"
+    }
+    for index, sql in plans.items():
+        plan = " ".join(row[-1] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}"))
+        assert index in plan and "TEMP B-TREE" not in plan
+
+def test_top_n_stays_fast_with_many_players(board):
+    for i in range(20000):
+        board.record(f"student-{i}", *_attempt(i))
+    board.flush()
+    board.cache_ttl = 0
+    started = time.perf_counter()
+    for segment in SEGMENTS:
+        board.top_players(10)
+        board.top_in_segment(segment, 10)
+    assert (time.perf_counter() - started) / 6 < 0.05
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import market_model
+from market_model import (
+    DESIGN_COLUMNS, PRICE_MAX, PRICE_MIN, PRICE_STEP, profit_surface, segment_balance_report, simulate_market_batch, simulate_market_performance,
+    solve_optimal_designs, solve_price, solve_price_arrays, solve_price_batch
+)
+
+PRICES = np.arange(PRICE_MIN, PRICE_MAX + 1, PRICE_STEP)
+
+def _design_frame(n, seed=0, index=None):
+    rng = np.random.default_rng(seed)
+    designs = pd.DataFrame(rng.integers(1, 11, size=(n, 5)), columns=DESIGN_COLUMNS[:5], index=index)
+    designs["Price"] = rng.integers(10, 201, size=n) * 1000
+    return designs
+
+def test_batch_keeps_the_callers_index_on_the_table_path():
+    designs = _design_frame(200, index=pd.Index(np.arange(5000, 5200), name="Student"))
+    results = simulate_market_batch(designs)
+    assert results.index.equals(designs.index)
+    combined = pd.concat([designs, results], axis=1)
+    assert len(combined) == len(designs) and not combined["Profit"].isna().any()
+
+def test_batch_keeps_the_callers_index_on_the_scan_path():
+    designs = _design_frame(50, seed=1, index=pd.Index([f"s{i}" for i in range(50)]))
+    designs["Speed"] = designs["Speed"].clip(upper=9) + 0.5
+    assert simulate_market_batch(designs).index.equals(designs.index)
+
+def test_batch_matches_single_design_simulation():
+    designs = _design_frame(500, seed=2)
+    results = simulate_market_batch(designs)
+    for row, result in zip(designs.itertuples(index=False), results.to_dict("records")):
+        expected = simulate_market_performance(*row)
+        assert {key: result[key] for key in expected} == expected
+
+# Break-even range and best price of each design by pricing it at every grid price:
+# (low, high, best price, best sales, best profit), prices NaN where there are none
+def _brute_force_prices(features):
+    _, sales, profit, cost, _ = market_model.simulate_market_arrays(
+        *(np.repeat(values, len(PRICES)) for values in features), np.tile(PRICES, len(features[0]))
+    )
+    sales, profit = sales.reshape(-1, len(PRICES)), profit.reshape(-1, len(PRICES))
+    cost = cost.reshape(-1, len(PRICES))[:, 0]
+    breaks_even = (sales >= 1) & (PRICES >= cost[:, None])
+    has_range = breaks_even.any(axis=1)
+    low = np.where(has_range, PRICES[breaks_even.argmax(axis=1)], np.nan)
+    high = np.where(has_range, PRICES[len(PRICES) - 1 - breaks_even[:, ::-1].argmax(axis=1)], np.nan)
+    # argmax takes the lowest of equally profitable prices
+    best = profit.argmax(axis=1)
+    rows = np.arange(len(best))
+    best_profit = profit[rows, best]
+    profitable = best_profit > 0
+    return (
+        low, high, np.where(profitable, PRICES[best], np.nan),
+        np.where(profitable, sales[rows, best], 0), np.where(profitable, best_profit, 0)
+    )
+
+def test_price_solver_matches_brute_force_over_every_slider_design():
+    levels = np.indices((market_model.FEATURE_LEVELS,) * 5).reshape(5, -1) + 1
+    for start in range(0, levels.shape[1], 10000):
+        features = levels[:, start:start + 10000]
+        _, _, *solved = solve_price_arrays(*features)
+        for got, expected in zip(solved, _brute_force_prices(features)):
+            np.testing.assert_array_equal(got, expected)
+
+def test_price_solver_handles_fractional_features():
+    features = np.random.default_rng(3).uniform(1, 10, size=(5, 2000))
+    _, _, *solved = solve_price_arrays(*features)
+    for got, expected in zip(solved, _brute_force_prices(features)):
+        np.testing.assert_array_equal(got, expected)
+
+def test_single_design_solution_agrees_with_the_scalar_model():
+    for features in [(5, 6, 7, 6, 7), (1, 1, 1, 1, 1), (10, 10, 10, 10, 10), (3, 9, 2, 8, 4)]:
+        solution = solve_price(*features)
+        results = {price: simulate_market_performance(*features, int(price)) for price in PRICES}
+        assert solution.segment == results[PRICE_MIN]["Best Market Segment"]
+        if solution.best_price is None:
+            assert max(result["Profit"] for result in results.values()) <= 0
+        else:
+            best = results[solution.best_price]
+            assert (best["Profit"], best["Estimated Sales"]) == (solution.best_profit, solution.best_sales)
+            assert all(result["Profit"] <= solution.best_profit for result in results.values())
+        if solution.break_even_low is not None:
+            for price in (solution.break_even_low, solution.break_even_high):
+                assert results[price]["Estimated Sales"] >= 1 and price >= solution.cost
+
+def test_price_batch_keeps_the_index_and_uses_nullable_prices():
+    designs = _design_frame(300, seed=4, index=pd.Index(np.arange(100, 400), name="Student"))
+    # A design that can't break even at any price
+    designs.loc[100, DESIGN_COLUMNS[:5]] = 10
+    solved = solve_price_batch(designs)
+    assert solved.index.equals(designs.index)
+    assert str(solved["Best Price"].dtype) == "Int64" and solved["Best Price"].isna()[100]
+    _, cost, low, high, price, sales, profit = solve_price_arrays(*(designs[column].to_numpy() for column in DESIGN_COLUMNS[:5]))
+    np.testing.assert_array_equal(solved["Break-Even Low"].to_numpy(dtype=float, na_value=np.nan), low)
+    np.testing.assert_array_equal(solved["Best Price"].to_numpy(dtype=float, na_value=np.nan), price)
+    np.testing.assert_array_equal(solved["Best Profit"].to_numpy(), profit)
+
+def test_batch_rejects_designs_outside_the_slider_and_price_ranges():
+    designs = _design_frame(20, seed=5, index=pd.Index([f"s{i}" for i in range(20)]))
+    # Scored in int64, this design's profit would wrap around
+    designs.loc["s7", DESIGN_COLUMNS[:5]] = 10**11
+    with pytest.raises(ValueError, match="Speed of design s7 is 100000000000; it must be a number from 1 to 10"):
+        simulate_market_batch(designs)
+    with pytest.raises(ValueError, match="Price of design 2 is nan"):
+        simulate_market_batch(5, 6, 7, 6, 7, [30000, 40000, np.nan])
+    with pytest.raises(ValueError, match="Price of design 0 is 200001"):
+        simulate_market_batch(5, 6, 7, 6, 7, 200001)
+    assert len(simulate_market_batch([1, 10], [1, 10], [1, 10], [1, 10], [1.5, 9.5], [10000, 200000])) == 2
+
+# Top-k (design, price) points by profit from every slider design at every grid price,
+# overall (key None) and per segment name, as solve_optimal_designs orders them: highest
+# profit first, then slider order, then the lower price
+def _brute_force_optimal_designs(k):
+    levels = np.indices((market_model.FEATURE_LEVELS,) * 5).reshape(5, -1)
+    names = market_model.market_segments.names
+    found = {key: [] for key in [None, *range(len(names))]}
+    for start in range(0, levels.shape[1], 10000):
+        features = levels[:, start:start + 10000] + 1
+        best, sales, profit, cost, _ = market_model.simulate_market_arrays(
+            *(np.repeat(values, len(PRICES)) for values in features), np.tile(PRICES, features.shape[1])
+        )
+        # Position in the full grid: design row major, price minor
+        position = start * len(PRICES) + np.arange(len(profit))
+        for key in found:
+            points = np.flatnonzero(best == key) if key is not None else np.arange(len(profit))
+            points = points[np.lexsort((position[points], -profit[points]))[:k]]
+            found[key] += [(-profit[i], position[i], best[i], sales[i], cost[i]) for i in points]
+    results = {}
+    for key, points in found.items():
+        results[key if key is None else names[key]] = [
+            (*(np.unravel_index(position // len(PRICES), (market_model.FEATURE_LEVELS,) * 5)[i] + 1 for i in range(5)),
+             PRICES[position % len(PRICES)], names[best], sales, cost, -negative_profit)
+            for negative_profit, position, best, sales, cost in sorted(points, key=lambda point: point[:2])[:k]
+        ]
+    return results
+
+def test_optimal_design_solver_matches_a_brute_force_scan_of_every_point():
+    expected = _brute_force_optimal_designs(10)
+    for k in (1, 10):
+        for segment, points in expected.items():
+            solved = solve_optimal_designs(k, segment=segment)
+            assert [tuple(row) for row in solved.itertuples(index=False)] == points[:k], (k, segment)
+
+    names = market_model.market_segments.names.tolist()
+    matches = np.bincount(market_model.load_design_table().segment, minlength=len(names))
+    for row in segment_balance_report().itertuples(index=False):
+        best = expected[row.Segment][:1]
+        assert row[1] == matches[names.index(row.Segment)]
+        assert (row[2], row[3], row[4]) == ((best[0][-1], best[0][5], best[0][7]) if best else (None, None, None))
+
+def test_profit_surface_matches_the_single_design_model_at_sampled_points():
+    rng = np.random.default_rng(6)
+    designs = [tuple(rng.integers(1, 11, 5).tolist()) for _ in range(20)] + [(5.5, 6, 7.25, 6, 7), (1, 1, 1, 1, 1), (10, 10, 10, 10, 10)]
+    for n, design in enumerate(designs):
+        feature = DESIGN_COLUMNS[n % 5]
+        surface = profit_surface(*design, feature)
+        assert surface.feature == feature and surface.profit.shape == (len(surface.levels), len(PRICES))
+        np.testing.assert_array_equal(surface.prices, PRICES)
+        for row, column in zip(rng.integers(0, len(surface.levels), 25), rng.integers(0, len(PRICES), 25)):
+            swept = list(design)
+            swept[n % 5] = surface.levels[row].item()
+            result = simulate_market_performance(*swept, surface.prices[column].item())
+            assert surface.segments[row] == result["Best Market Segment"]
+            assert (surface.sales[row, column], surface.profit[row, column]) == (result["Estimated Sales"], result["Profit"])
+    with pytest.raises(ValueError, match="Can't sweep 'Price'"):
+        profit_surface(5, 6, 7, 6, 7, "Price")
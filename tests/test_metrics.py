@@ -0,0 +1,83 @@
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import metrics
+
+@pytest.fixture
+def recording(monkeypatch):
+    # Fresh, enabled metrics, without starting any exporter
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "phase_seconds", metrics.Histogram(metrics.phase_seconds.name, metrics.phase_seconds.help_text, "phase"))
+    monkeypatch.setattr(metrics, "session_state_bytes", metrics.Histogram(
+        metrics.session_state_bytes.name, metrics.session_state_bytes.help_text, "key", buckets=metrics.SESSION_BYTES_BUCKETS
+    ))
+    return metrics
+
+def test_histogram_renders_cumulative_prometheus_buckets():
+    histogram = metrics.Histogram("demo_seconds", "Demo timings.", "phase", buckets=(0.1, 1, 5))
+    # A value on a bound lands in that bound's bucket (le is inclusive)
+    for seconds in (0.05, 0.1, 0.5, 1, 7):
+        histogram.observe("results", seconds)
+    histogram.observe('say "hi"\n', 2)
+    assert histogram.render() == (
+        "# HELP demo_seconds Demo timings.\n"
+        "# TYPE demo_seconds histogram\n"
+        'demo_seconds_bucket{phase="results",le="0.1"} 2\n'
+        'demo_seconds_bucket{phase="results",le="1.0"} 4\n'
+        'demo_seconds_bucket{phase="results",le="5.0"} 4\n'
+        'demo_seconds_bucket{phase="results",le="+Inf"} 5\n'
+        'demo_seconds_sum{phase="results"} 8.65\n'
+        'demo_seconds_count{phase="results"} 5\n'
+        'demo_seconds_bucket{phase="say \\"hi\\"\\n",le="0.1"} 0\n'
+        'demo_seconds_bucket{phase="say \\"hi\\"\\n",le="1.0"} 0\n'
+        'demo_seconds_bucket{phase="say \\"hi\\"\\n",le="5.0"} 1\n'
+        'demo_seconds_bucket{phase="say \\"hi\\"\\n",le="+Inf"} 1\n'
+        'demo_seconds_sum{phase="say \\"hi\\"\\n"} 2.0\n'
+        'demo_seconds_count{phase="say \\"hi\\"\\n"} 1\n'
+    )
+    assert histogram.snapshot()["results"] == ([2, 2, 0, 1], 8.65)
+
+def test_spans_and_session_sizes_are_exported_under_their_metric_names(recording, tmp_path):
+    with recording.span("rerun"):
+        pass
+    with pytest.raises(RuntimeError):
+        with recording.span("results"):
+            raise RuntimeError("cut short")
+    recording.observe_session_memory(lambda: {"attempts": 300, "image_prefetch": 5000000})
+
+    text = recording.render_metrics()
+    assert "# TYPE car_market_phase_seconds histogram\n" in text
+    assert "# TYPE car_market_session_state_bytes histogram\n" in text
+    assert 'car_market_phase_seconds_count{phase="rerun"} 1\n' in text
+    assert 'car_market_phase_seconds_count{phase="results"} 1\n' in text
+    assert 'car_market_phase_seconds_bucket{phase="rerun",le="120.0"} 1\n' in text
+    assert 'car_market_session_state_bytes_bucket{key="attempts",le="256.0"} 0\n' in text
+    assert 'car_market_session_state_bytes_bucket{key="attempts",le="1024.0"} 1\n' in text
+    assert 'car_market_session_state_bytes_bucket{key="image_prefetch",le="4194304.0"} 0\n' in text
+    assert 'car_market_session_state_bytes_bucket{key="image_prefetch",le="+Inf"} 1\n' in text
+
+    path = tmp_path / "metrics" / "car_market.prom"
+    recording.write_metrics_file(str(path))
+    assert path.read_text(encoding="utf-8") == text
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), metrics._MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=10) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert response.read().decode("utf-8") == text
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other", timeout=10)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_spans_cost_nothing_when_metrics_are_off(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    assert metrics.span("rerun") is metrics.span("results")
+    metrics.observe_session_memory(lambda: pytest.fail("report should not be built"))
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import market_model
+import production_model
+from production_model import ProductionSettings, simulate_production
+
+SETTINGS = ProductionSettings(capacity=8000, drift=0.5, seed=3)
+YEARS = 8
+
+def _designs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.integers(1, 11, (n, 5)), rng.integers(10, 201, n) * 1000])
+
+def _volumes(n, seed=0):
+    return np.random.default_rng(seed).integers(-100, 12000, (n, YEARS))
+
+# One design at a time, straight from the formulas in production_model's header comment
+def _reference(design, volumes, settings):
+    segments = market_model.market_segments
+    preferences = segments.preferences.astype(float)
+    inventory = cumulative = 0
+    years = []
+    for year in range(1, len(volumes) + 1):
+        if year > 1:
+            rng = np.random.default_rng([settings.seed, year])
+            preferences = np.clip(preferences + rng.normal(0, settings.drift, preferences.shape), 1, market_model.FEATURE_LEVELS)
+        scores = [sum(abs(p - f) for p, f in zip(row, design[:5])) for row in preferences.tolist()]
+        best = int(np.argmin(scores))
+        avg_price, market_size = segments.avg_price[best], segments.market_size[best]
+        cost = sum(f * c for f, c in zip(design[:5], market_model.FEATURE_UNIT_COSTS))
+        demand = int(market_size * (1 - scores[best] / 50) * max(0, 1 - abs(design[5] - avg_price) / avg_price))
+        production = min(max(volumes[year - 1], 0), settings.capacity)
+        unit_cost = int(np.rint(cost * (max(cumulative, settings.learning_volume) / settings.learning_volume) ** np.log2(settings.learning_rate)))
+        sales = min(demand, inventory + production)
+        inventory = inventory + production - sales
+        holding = int(np.rint(inventory * unit_cost * settings.holding_rate))
+        cumulative += production
+        years.append((best, demand, production, sales, inventory, unit_cost, sales * design[5] - production * unit_cost - holding))
+    return years
+
+def test_year_one_at_the_demand_reproduces_the_single_period_model():
+    designs = _designs(500)
+    static = market_model.simulate_market_batch(*designs.T)
+    demand = static["Estimated Sales"].to_numpy()
+    run = simulate_production(designs, demand, 1, ProductionSettings(capacity=10**9))
+    np.testing.assert_array_equal(run.profit[0], static["Profit"].to_numpy())
+    np.testing.assert_array_equal(run.sales[0], demand)
+    assert not run.inventory.any()
+
+def test_every_year_matches_the_scalar_reference():
+    designs, volumes = _designs(300, seed=1), _volumes(300, seed=1)
+    run = simulate_production(designs, volumes, YEARS, SETTINGS)
+    for i in range(0, 300, 10):
+        got = list(zip(*(getattr(run, field)[:, i].tolist() for field in production_model._YEAR_FIELDS)))
+        assert got == _reference(designs[i].tolist(), volumes[i].tolist(), SETTINGS)
+
+def test_resumed_runs_equal_fresh_runs():
+    designs, volumes = _designs(200, seed=2), _volumes(200, seed=2)
+    run = simulate_production(designs, volumes, YEARS, SETTINGS)
+
+    changed = volumes.copy()
+    changed[5, 5] += 500
+    resumed = simulate_production(designs, changed, YEARS, SETTINGS, resume=run)
+    assert resumed.resumed == 5
+    longer = np.concatenate([volumes, volumes[:, :4]], axis=1)
+    extended = simulate_production(designs, longer, YEARS + 4, SETTINGS, resume=run)
+    assert extended.resumed == YEARS
+    for got, fresh in [(resumed, simulate_production(designs, changed, YEARS, SETTINGS)),
+                       (extended, simulate_production(designs, longer, YEARS + 4, SETTINGS))]:
+        for field in production_model.ProductionRun._fields[:-1]:
+            np.testing.assert_array_equal(getattr(got, field), getattr(fresh, field))
+
+    assert simulate_production(designs, volumes, YEARS, SETTINGS._replace(seed=4), resume=run).resumed == 0
+
+def test_checkpoints_round_trip_through_disk(tmp_path):
+    designs, volumes = _designs(50, seed=3), _volumes(50, seed=3)
+    run = simulate_production(designs, volumes, YEARS, SETTINGS)
+    path = tmp_path / "run.npz"
+    production_model.save_production_run(run, path)
+    loaded = production_model.load_production_run(path)
+    for field in production_model.ProductionRun._fields[:-1]:
+        np.testing.assert_array_equal(getattr(loaded, field), getattr(run, field))
+    assert simulate_production(designs, volumes, YEARS, SETTINGS, resume=loaded).resumed == YEARS
+
+def test_accepts_a_frame_and_broadcasts_volumes():
+    designs = _designs(40, seed=4)
+    frame = pd.DataFrame(designs, columns=market_model.DESIGN_COLUMNS)
+    run = simulate_production(frame, 5000, 5)
+    np.testing.assert_array_equal(run.profit, simulate_production(designs, np.full((40, 5), 5000), 5).profit)
+    table = production_model.production_frame(run)
+    assert len(table) == 200 and table["Profit"].tolist() == run.profit.reshape(-1).tolist()
+
+def test_volumes_of_the_wrong_shape_are_rejected():
+    with pytest.raises(ValueError, match="Expected production volumes for 10 design"):
+        simulate_production(_designs(10), np.zeros((10, 3)), 5)
+
+def test_fractional_prices_are_not_truncated():
+    design = [5, 6, 7, 6, 7, 30000.75]
+    static = market_model.simulate_market_performance(*design)
+    run = simulate_production([design], static["Estimated Sales"], 1, ProductionSettings(capacity=10**9))
+    assert run.profit.dtype == np.float64
+    assert run.profit[0, 0] == static["Profit"]
+    assert simulate_production(_designs(5), 1000, 2).profit.dtype == np.int64
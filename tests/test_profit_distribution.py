@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+import market_model
+from market_model import DESIGN_COLUMNS, Uncertainty, profit_distribution, profit_distribution_batch, simulate_market_performance
+
+DRAWS = 2000
+DESIGNS = [(5, 6, 7, 6, 7, 30000), (4, 5, 8, 7, 6, 20000), (9, 8, 6, 4, 8, 55000), (5.5, 6, 7.25, 6, 7, 30500.5)]
+
+def test_draws_are_determined_by_the_seed():
+    for design in DESIGNS:
+        first = profit_distribution(*design, draws=DRAWS, seed=7)
+        # Regenerated rather than served from the in-memory draw cache
+        market_model._market_draws.clear()
+        again = profit_distribution(*design, draws=DRAWS, seed=7)
+        np.testing.assert_array_equal(first.profit, again.profit)
+        assert first._replace(profit=None) == again._replace(profit=None)
+        assert not np.array_equal(profit_distribution(*design, draws=DRAWS, seed=8).profit, first.profit)
+
+def test_draws_too_large_to_cache_give_the_same_results(monkeypatch):
+    cached = profit_distribution(*DESIGNS[0], draws=DRAWS, seed=3)
+    monkeypatch.setattr(market_model, "DRAW_CACHE_BYTES", 0)
+    market_model._market_draws.clear()
+    assert isinstance(market_model.market_draws(DRAWS, 3), market_model._MarketDrawChunks)
+    np.testing.assert_array_equal(profit_distribution(*DESIGNS[0], draws=DRAWS, seed=3).profit, cached.profit)
+
+def test_zero_uncertainty_reproduces_the_deterministic_model():
+    certain = Uncertainty(0.0, 0.0, 0.0)
+    rng = np.random.default_rng(0)
+    designs = DESIGNS + [(*rng.integers(1, 11, 5).tolist(), int(rng.integers(10, 201)) * 1000) for _ in range(30)]
+    for design in designs:
+        result = simulate_market_performance(*design)
+        distribution = profit_distribution(*design, draws=50, seed=1, uncertainty=certain)
+        assert (distribution.profit == result["Profit"]).all()
+        assert distribution.expected_sales == result["Estimated Sales"]
+        assert distribution.std == 0 and distribution.loss_probability == (result["Profit"] < 0)
+
+def test_batch_results_do_not_depend_on_the_worker_count():
+    frame = pd.DataFrame(DESIGNS * 2, columns=DESIGN_COLUMNS, index=[f"s{i}" for i in range(8)])
+    serial = profit_distribution_batch(frame, draws=DRAWS, seed=2)
+    parallel = profit_distribution_batch(frame, draws=DRAWS, seed=2, workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert serial.index.equals(frame.index)
+    assert serial.loc["s0", "Mean Profit"] == profit_distribution(*DESIGNS[0], draws=DRAWS, seed=2).mean
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import market_model
+from market_model import FEATURE_UNIT_COSTS, SCENARIOS, Scenario, evaluate_scenarios, simulate_market_performance
+
+def _designs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [(*rng.integers(1, 11, 5).tolist(), int(rng.integers(10, 201)) * 1000) for _ in range(n)]
+
+FRACTIONAL = [(5.5, 6, 7.25, 6, 7, 30500.5), (1.1, 9.9, 2.5, 8, 4.75, 61000), (10, 10, 10, 10, 9.5, 150000)]
+
+@pytest.fixture(autouse=True)
+def fresh_memo():
+    with market_model._scenario_outcomes_lock:
+        market_model._scenario_outcomes.clear()
+
+def test_baseline_reproduces_the_single_design_model():
+    designs = _designs(200) + FRACTIONAL
+    outcomes = evaluate_scenarios(designs, [SCENARIOS[0]])
+    for j, design in enumerate(designs):
+        result = simulate_market_performance(*design)
+        assert (outcomes.sales[0, j], outcomes.cost[0, j], outcomes.profit[0, j]) == (result["Estimated Sales"], result["Cost"], result["Profit"])
+
+def test_tariff_reproduces_the_original_tariff_formula():
+    designs = _designs(200, seed=1) + FRACTIONAL
+    outcomes = evaluate_scenarios(designs, [Scenario("Tariff +25%", tariff=0.25)])
+    for j, design in enumerate(designs):
+        result = simulate_market_performance(*design)
+        sales, cost = result["Estimated Sales"], result["Cost"]
+        assert outcomes.sales[0, j] == sales
+        assert outcomes.profit[0, j] == sales * (design[5] - cost * 1.25)
+
+def test_custom_scenario_applies_every_shock():
+    scenario = Scenario("Custom", tariff=0.1, material=(0.2, 0.0, 0.0, 0.1, 0.5), currency=0.05, demand=-0.1)
+    designs = _designs(100, seed=2) + FRACTIONAL
+    outcomes = evaluate_scenarios(designs, [scenario])
+    segments = market_model.market_segments
+    for j, design in enumerate(designs):
+        segment = list(segments.names).index(simulate_market_performance(*design)["Best Market Segment"])
+        score = sum(abs(preference - level) for preference, level in zip(segments.preferences[segment].tolist(), design[:5]))
+        avg_price = segments.avg_price[segment].item()
+        cost = sum(level * unit_cost * (1 + shock) for level, unit_cost, shock in zip(design[:5], FEATURE_UNIT_COSTS, scenario.material))
+        cost *= 1.1 * 1.05
+        sales = int(segments.market_size[segment].item() * 0.9 * (1 - score / 50) * max(0, 1 - abs(design[5] - avg_price) / avg_price))
+        assert outcomes.sales[0, j] == sales
+        assert outcomes.cost[0, j] == pytest.approx(cost, rel=1e-12)
+        assert outcomes.profit[0, j] == pytest.approx(sales * (design[5] - cost), rel=1e-12)
+
+def test_partly_memoized_calls_return_the_same_matrices():
+    designs = _designs(30, seed=3) + FRACTIONAL
+    scenarios = SCENARIOS + [Scenario("Custom", tariff=0.2, demand=0.05)]
+    fresh = evaluate_scenarios(designs, scenarios)
+
+    market_model._scenario_outcomes.clear()
+    # Fill the memo with some pairs, then ask for everything in a different order
+    evaluate_scenarios(designs[::2], scenarios[1::2])
+    evaluate_scenarios(designs[5:9], scenarios[:3])
+    order = np.random.default_rng(4).permutation(len(designs))
+    shuffled = evaluate_scenarios([designs[i] for i in order], scenarios[::-1])
+    assert shuffled.scenarios == scenarios[::-1]
+    for field in ("sales", "cost", "profit"):
+        np.testing.assert_array_equal(getattr(shuffled, field), getattr(fresh, field)[::-1][:, order])
+    # A fully memoized call
+    again = evaluate_scenarios(designs, scenarios)
+    for field in ("sales", "cost", "profit"):
+        np.testing.assert_array_equal(getattr(again, field), getattr(fresh, field))
+
+def test_repeated_designs_and_scenarios_in_one_call():
+    design = _designs(1, seed=5)[0]
+    outcomes = evaluate_scenarios([design, design], [SCENARIOS[1], SCENARIOS[1]])
+    assert (outcomes.profit == outcomes.profit[0, 0]).all()
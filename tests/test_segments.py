@@ -0,0 +1,120 @@
+import csv
+
+import numpy as np
+import pytest
+
+import market_model
+from market_model import FEATURE_LEVELS, MARKET_COLUMNS, compile_market_segments, read_market_columns
+
+GRID = np.indices((FEATURE_LEVELS,) * 5).reshape(5, -1).T + 1
+
+def _write_segments(path, rows, columns=MARKET_COLUMNS):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    return str(path)
+
+# n random segments spread over `regions`, with preferences up to two levels outside the
+# slider range and every fifth row a copy of an earlier one, so exact ties are common
+def _random_rows(n, seed, regions=("Global",)):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        preferences = rng.integers(-1, FEATURE_LEVELS + 3, 5).tolist()
+        if i % 5 == 4:
+            preferences = list(rows[rng.integers(i)][3:8])
+        rows.append([f"Niche {i}", regions[i % len(regions)], int(rng.integers(15, 90)) * 1000, *preferences, int(rng.integers(1, 60)) * 1000])
+    return rows
+
+def _segments(tmp_path, rows, region=None):
+    return compile_market_segments(read_market_columns(_write_segments(tmp_path / "segments.csv", rows), region))
+
+# Brute-force L1 scan; argmin keeps the first of equally close segments
+def _argmin_scan(preferences, designs):
+    best, score = [], []
+    for start in range(0, len(designs), 5000):
+        distances = abs(designs[start:start + 5000, None, :] - preferences[None, :, :]).sum(axis=-1)
+        best.append(distances.argmin(axis=1))
+        score.append(distances.min(axis=1))
+    return np.concatenate(best), np.concatenate(score)
+
+# The original single-design model with the match taken from the scan
+def _expected(segments, best, score, design):
+    speed, aesthetics, reliability, efficiency, tech, price = design
+    avg_price, market_size = segments.avg_price[best].item(), segments.market_size[best].item()
+    cost = (speed * 2000) + (aesthetics * 1500) + (reliability * 1800) + (efficiency * 1700) + (tech * 2500)
+    sales = int(market_size * (1 - score / 50) * max(0, 1 - abs(price - avg_price) / avg_price))
+    return segments.names[best], sales, sales * (price - cost), cost
+
+@pytest.mark.parametrize("n, seed", [(1, 0), (7, 1), (40, 2), (300, 3)])
+def test_design_table_equals_the_argmin_scan(tmp_path, n, seed):
+    segments = _segments(tmp_path, _random_rows(n, seed))
+    best, score = _argmin_scan(segments.preferences, GRID)
+    table = market_model.load_design_table(segments, str(tmp_path))
+    assert table.path is not None
+    np.testing.assert_array_equal(table.segment, best)
+    np.testing.assert_array_equal(table.score, score)
+
+@pytest.mark.parametrize("n, seed, fractional", [(7, 4, False), (40, 5, False), (12, 6, True), (40, 7, True)])
+def test_simulations_equal_the_argmin_scan(tmp_path, monkeypatch, n, seed, fractional):
+    rows = _random_rows(n, seed)
+    if fractional:
+        # No design table: segments are matched by the loop or the vectorized scan
+        rows[0][3] += 0.5
+    segments = _segments(tmp_path, rows)
+    assert (segments.checksum is None) == fractional
+    monkeypatch.setattr(market_model, "market_segments", segments)
+    rng = np.random.default_rng(seed)
+    designs = GRID[rng.choice(len(GRID), 300, replace=False)].astype(float)
+    designs[::3] += rng.uniform(-0.5, 0, (100, 5)).clip(1 - designs[::3])
+    prices = rng.integers(10, 201, 300) * 1000
+    best, score = _argmin_scan(segments.preferences, designs)
+
+    for values, design_best, design_score, price in zip(designs.tolist(), best, score, prices.tolist()):
+        # Whole-number features as ints, so slider designs take the table path
+        design = (*(int(value) if value.is_integer() else value for value in values), price)
+        result = market_model.simulate_market_performance(*design)
+        expected = _expected(segments, design_best, design_score, design)
+        assert (result["Best Market Segment"], result["Estimated Sales"], result["Profit"], result["Cost"]) == expected
+
+    whole = designs[1::3].astype(np.int64)
+    batch = market_model.simulate_market_batch(*whole.T, prices[1::3])
+    names = segments.names[_argmin_scan(segments.preferences, whole)[0]]
+    assert batch["Best Market Segment"].tolist() == names.tolist()
+
+def test_region_filter_and_name_suffixes(tmp_path):
+    rows = [
+        ["Budget", "North", 20000, 4, 5, 8, 7, 6, 50000],
+        ["Budget", "South", 18000, 5, 5, 8, 7, 6, 30000],
+        ["Luxury", "", 80000, 6, 9, 8, 5, 9, 10000],
+        ["Sports", "North", 50000, 9, 8, 6, 4, 8, 15000.5]
+    ]
+    path = _write_segments(tmp_path / "segments.csv", rows)
+    everything = read_market_columns(path, None)
+    assert everything["Segment"].tolist() == ["Budget (North)", "Budget (South)", "Luxury (Global)", "Sports (North)"]
+    assert everything["Region"].tolist() == ["North", "South", "Global", "North"]
+    assert everything["Avg_Price"].dtype == np.int64 and everything["Market_Size"].dtype == np.float64
+
+    north = read_market_columns(path, "North")
+    assert north["Segment"].tolist() == ["Budget", "Sports"]
+    assert north["Avg_Price"].tolist() == [20000, 50000]
+    assert read_market_columns(path, "Global")["Segment"].tolist() == ["Luxury"]
+    with pytest.raises(ValueError, match="no segments in region 'West'"):
+        read_market_columns(path, "West")
+
+    # One region, or no Region column at all: names stay as written
+    single = _write_segments(tmp_path / "single.csv", [row[:1] + row[2:] for row in rows[:2]], [c for c in MARKET_COLUMNS if c != "Region"])
+    assert read_market_columns(single, None)["Segment"].tolist() == ["Budget", "Budget"]
+
+@pytest.mark.parametrize("columns, row, message", [
+    ([c for c in MARKET_COLUMNS if c != "Preferred_Tech"], ["Budget", "Global", 20000, 4, 5, 8, 7, 50000], "missing segment column\\(s\\): Preferred_Tech"),
+    (MARKET_COLUMNS, ["Budget", "Global", 20000, 4, "", 8, 7, 6, 50000], "has empty segment values"),
+    (MARKET_COLUMNS, ["Budget", "Global", 0, 4, 5, 8, 7, 6, 50000], "non-positive Avg_Price"),
+    (MARKET_COLUMNS, ["Budget", "Global", -5.5, 4, 5, 8, 7, 6, 50000], "non-positive Avg_Price"),
+    (MARKET_COLUMNS, ["Budget", "Global", 20000, 4, 5, "high", 7, 6, 50000], "non-numeric Preferred_Reliability"),
+])
+def test_invalid_segment_files_are_rejected(tmp_path, columns, row, message):
+    path = _write_segments(tmp_path / "segments.csv", [row], columns)
+    with pytest.raises(ValueError, match=message):
+        read_market_columns(path, None)
@@ -0,0 +1,143 @@
+import asyncio
+import http.client
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import simulation_service
+from market_model import DESIGN_COLUMNS, simulate_market_performance
+
+# The service on an ephemeral port, run on its own event loop thread
+@pytest.fixture(scope="module")
+def port():
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    holder = {}
+
+    async def run():
+        holder["stop"] = asyncio.Event()
+        server = holder["server"] = await simulation_service.start_service("127.0.0.1", 0, batch_window=0.01)
+        started.set()
+        async with server:
+            await holder["stop"].wait()
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(run(),), daemon=True)
+    thread.start()
+    assert started.wait(30)
+    yield holder["server"].sockets[0].getsockname()[1]
+    loop.call_soon_threadsafe(holder["stop"].set)
+    thread.join(10)
+    loop.close()
+
+def _call(port, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+# Send raw request bytes; returns the status code and the decoded JSON body
+def _raw(port, request):
+    with socket.create_connection(("127.0.0.1", port), timeout=30) as sock:
+        sock.sendall(request)
+        sock.shutdown(socket.SHUT_WR)
+        response = b""
+        while chunk := sock.recv(1 << 16):
+            response += chunk
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), body
+
+def _chunked(path, *chunks, sizes=None):
+    sizes = sizes or [f"{len(chunk):x}".encode() for chunk in chunks]
+    body = b"".join(size + b"\r\n" + chunk + b"\r\n" for size, chunk in zip(sizes, chunks))
+    return f"POST {path} HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: chunked\r\n\r\n".encode() + body + b"0\r\n\r\n"
+
+def _design(values):
+    return dict(zip(DESIGN_COLUMNS, values))
+
+def test_single_designs_match_the_model(port):
+    rng = np.random.default_rng(0)
+    designs = [(*rng.integers(1, 11, 5).tolist(), int(rng.integers(10, 201)) * 1000) for _ in range(40)]
+    designs += [(1, 1, 1, 1, 1, 10000), (10, 10, 10, 10, 10, 200000), (5.5, 6, 7.25, 6, 7, 30500.5)]
+    for design in designs:
+        status, body = _call(port, "POST", "/simulate", json.dumps(_design(design)))
+        assert status == 200
+        assert json.loads(body) == simulate_market_performance(*design)
+
+@pytest.mark.parametrize("design", [
+    (1e11, 1e11, 1e11, 1e11, 1e11, 35000),
+    (5, 6, 7, 6, 7, 9999),
+    (5, 6, 7, 6, 7, 200001),
+    (0.5, 6, 7, 6, 7, 30000),
+    (5, 6, 7, 6, 10.5, 30000),
+    (5, 6, -3, 6, 7, 30000),
+    (5, 6, 7, True, 7, 30000)
+])
+def test_out_of_range_designs_are_rejected(port, design):
+    status, body = _call(port, "POST", "/simulate", json.dumps(_design(design)))
+    assert status == 400
+    assert "must be a number from" in json.loads(body)["error"]
+
+def test_batch_reports_out_of_range_lines_and_scores_the_rest(port):
+    designs = [(5, 6, 7, 6, 7, 30000), (1e11, 1e11, 1e11, 1e11, 1e11, 35000), (8, 9, 6, 4, 10, 60000), (5, 6, 7, 6, 7, 1e12)]
+    status, body = _call(port, "POST", "/simulate/batch", "\n".join(json.dumps(_design(design)) for design in designs))
+    assert status == 200
+    lines = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+    assert lines[0] == simulate_market_performance(*designs[0])
+    assert lines[2] == simulate_market_performance(*designs[2])
+    assert lines[1]["line"] == 2 and "Speed must be a number from 1 to 10" in lines[1]["error"]
+    assert lines[3]["line"] == 4 and "Price must be a number from 10,000 to 200,000" in lines[3]["error"]
+
+def test_concurrent_singles_are_micro_batched(port):
+    _, before = _call(port, "GET", "/health")
+    designs = [(1 + i % 10, 5, 5, 5, 5, 20000 + 1000 * i) for i in range(32)]
+    with ThreadPoolExecutor(16) as pool:
+        responses = list(pool.map(lambda design: _call(port, "POST", "/simulate", json.dumps(_design(design))), designs))
+    assert [json.loads(body) for _, body in responses] == [simulate_market_performance(*design) for design in designs]
+    _, after = _call(port, "GET", "/health")
+    before, after = json.loads(before), json.loads(after)
+    assert after["batched_designs"] - before["batched_designs"] == 32
+    assert after["batches"] - before["batches"] < 32
+
+def test_feedback_endpoint(port):
+    status, body = _call(port, "POST", "/feedback", json.dumps({"profit": 30000, "sales": 100}))
+    assert status == 200
+    assert json.loads(body) == {"Feedback": simulation_service.market_model.get_feedback_for_profit(30000, 100)}
+
+def test_chunked_bodies_are_reassembled(port):
+    design = json.dumps(_design((5, 6, 7, 6, 7, 30000))).encode()
+    status, body = _raw(port, _chunked("/simulate", design[:10], design[10:]))
+    assert status == 200 and json.loads(body) == simulate_market_performance(5, 6, 7, 6, 7, 30000)
+
+@pytest.mark.parametrize("size, status", [(b"ffffffff", 413), (b"-1", 400), (b"zz", 400)])
+def test_bad_chunk_sizes_are_refused_before_reading(port, size, status):
+    # Only the chunk header is sent; the refusal can't wait for the declared bytes
+    request = b"POST /simulate HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: chunked\r\n\r\n" + size + b"\r\n"
+    assert _raw(port, request)[0] == status
+
+def test_chunked_bodies_count_against_the_body_limit(port):
+    # The second chunk's size takes the body over the limit; its bytes are never sent
+    half = simulation_service.MAX_BODY_BYTES // 2 + 1
+    request = _chunked("/feedback", b" " * half).removesuffix(b"0\r\n\r\n") + f"{half:x}\r\n".encode()
+    status, body = _raw(port, request)
+    assert status == 413 and "larger than" in json.loads(body)["error"]
+
+def test_negative_content_length_is_refused(port):
+    request = b"POST /simulate HTTP/1.1\r\nHost: x\r\nContent-Length: -1\r\n\r\n"
+    assert _raw(port, request)[0] == 400
+
+def test_large_batch_chunks_are_streamed(port):
+    designs = [(1 + i % 10, 1 + i // 10 % 10, 5, 5, 5, 10000 + 1000 * (i % 191)) for i in range(3000)]
+    body = "\n".join(json.dumps(_design(design)) for design in designs).encode()
+    assert len(body) > 1 << 17
+    status, response = _raw(port, _chunked("/simulate/batch", body))
+    assert status == 200
+    # The streamed response is itself chunked; its lines are whole JSON objects
+    lines = [json.loads(line) for line in response.split(b"\n") if line.startswith(b"{")]
+    assert lines == [simulate_market_performance(*design) for design in designs]